@@ -1,7 +1,46 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, validator, Field
-import joblib
-import pandas as pd
+import asyncio
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import math
+from typing import Any, List, Optional
+
+import psutil
+from fastapi import BackgroundTasks, Body, Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
+
+from api import config, fast_json
+from api.arrow_io import FILE_MEDIA_TYPE, STREAM_MEDIA_TYPE, ArrowInputError, read_ipc, score_arrow, write_ipc
+from api.batching import MicroBatcher
+from api.bundle import ModelBundle
+from api.capture import CaptureMiddleware, CaptureWriter
+from api.cache import PredictionCache, SQLiteCacheBackend, cache_key
+from api.drift import DriftMonitor, arrow_columns
+from api.executor import InferenceExecutor, Overloaded, pin_native_threads
+from api.heatmap import PROFILES, HeatmapStore
+from api.metrics import MetricsMiddleware, metrics, render_gauges
+from api.registry import ModelRegistry, UnknownVersion
+from api.scoring import (
+    MAX_SENSITIVITY_GRID,
+    Item,
+    SensitivityRequest,
+    format_price_ranges,
+    score_records,
+    score_sensitivity,
+    served_price,
+    validate_item,
+    variation_values,
+)
+from api.shadow import ShadowEvaluator
+from api.streaming import NDJSON_MEDIA_TYPE, LineTooLong, NDJSONStreamingResponse, iter_lines
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Real Estate Price Prediction API",
@@ -9,64 +48,377 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Load the model artifacts using joblib
-artifacts = joblib.load("api/models/artifacts_xg.joblib")
-
-# Unpack the artifacts
-num_features = artifacts["features"]["num_features"]
-fl_features = artifacts["features"]["fl_features"]
-cat_features = artifacts["features"]["cat_features"]
-
-imputer = artifacts["imputer"]
-enc = artifacts["enc"]
-model = artifacts["model"]
-
-class Item(BaseModel):
-    nbr_frontages: float = Field(..., example=2.0)
-    nbr_bedrooms: float = Field(..., example=3.0)
-    latitude: float = Field(..., example=50.8503)
-    longitude: float = Field(..., example=4.3517)
-    total_area_sqm: float = Field(..., example=150.0)
-    surface_land_sqm: float = Field(..., example=200.0)
-    terrace_sqm: float = Field(..., example=20.0)
-    garden_sqm: float = Field(..., example=50.0)
-    fl_terrace: int = Field(..., example=1)
-    fl_garden: int = Field(..., example=0)
-    fl_swimming_pool: int = Field(..., example=1)
-    province: str = Field(..., example="Brussels")
-    heating_type: str = Field(..., example="GAS")
-    state_building: str = Field(..., example="GOOD")
-    property_type: str = Field(..., example="APARTMENT")
-    epc: str = Field(..., example="C")
-    locality: str = Field(..., example="Brussels")
-    subproperty_type: str = Field(..., example="APARTMENT")
-    region: str = Field(..., example="Brussels-Capital")
-
-    # @validator("province")
-    # def validate_province(cls, value):
-    #     # List of valid provinces
-    #     valid_provinces = ["Brussels", "Flemish", "Walloon"]
-
-    #     # Check if the provided province is in the list of valid provinces
-    #     if value not in valid_provinces:
-    #         raise ValueError("Invalid province. Please provide a valid province.")
-    #     return value
+# Request counters, latency histograms and the optional Server-Timing header
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+# Opt-in capture of a sample of the prediction requests, for replays
+capture_writer = None
+if config.CAPTURE_DIR:
+    capture_writer = CaptureWriter(
+        config.CAPTURE_DIR,
+        max_bytes=config.CAPTURE_MAX_BYTES,
+        max_files=config.CAPTURE_MAX_FILES,
+        queue_size=config.CAPTURE_QUEUE_SIZE,
+    )
+    app.add_middleware(
+        CaptureMiddleware, writer=capture_writer, paths=config.CAPTURE_PATHS, sample_rate=config.CAPTURE_SAMPLE_RATE
+    )
+
+# Startup timing breakdown in seconds, served by /readyz
+process_start = psutil.Process().create_time()
+startup_timings = {"imports": time.time() - process_start}
+
+
+# Cleared while load_model(warm_up=False) runs: warming up starts the native
+# thread pools, which must not exist yet when the pre-forking server forks
+warm_up_on_load = True
+
+
+def load_bundle(path, version):
+    """Loads a bundle of the registry and warms it up before it can be activated."""
+    loaded = ModelBundle.load(path, version=version, engine=config.INFERENCE_ENGINE, threads=config.INFERENCE_THREADS)
+    if warm_up_on_load:
+        loaded.warm_up()
+    return loaded
+
+
+# Versioned model bundles; the active one is loaded and warmed up by
+# load_model(), not at import time, so the server can answer liveness probes
+# while the artifacts are loading
+registry = ModelRegistry(
+    directory=os.path.dirname(config.ARTIFACTS_PATH) or ".",
+    load_bundle=load_bundle,
+    default_version=os.path.splitext(os.path.basename(config.ARTIFACTS_PATH))[0],
+    poll_interval=config.MODEL_POLL_INTERVAL,
+    auto_activate=config.MODEL_AUTO_ACTIVATE,
+)
+load_error = None
+_load_lock = threading.Lock()
+
+# Opt-in shadow scoring of a sample of the /predict records with a candidate model
+shadow_evaluator = None
+if config.SHADOW_ARTIFACTS_PATH:
+    shadow_evaluator = ShadowEvaluator(
+        config.SHADOW_ARTIFACTS_PATH,
+        load_bundle,
+        sample_rate=config.SHADOW_SAMPLE_RATE,
+        queue_size=config.SHADOW_QUEUE_SIZE,
+        batch_size=config.SHADOW_BATCH_SIZE,
+    )
+
+# Sketches of the features of the validated inputs, for the active model version
+drift_monitor = None
+_drift_lock = threading.Lock()
+
+
+def get_drift_monitor(bundle: ModelBundle) -> DriftMonitor:
+    """Returns the drift monitor of ``bundle``, replacing the one of the previously active version."""
+    global drift_monitor
+    monitor = drift_monitor
+    if monitor is not None and (monitor.version, monitor.checksum) == (bundle.version, bundle.checksum):
+        return monitor
+    with _drift_lock:
+        if drift_monitor is None or (drift_monitor.version, drift_monitor.checksum) != (bundle.version, bundle.checksum):
+            previous = drift_monitor
+            drift_monitor = DriftMonitor.from_bundle(
+                bundle,
+                config.DRIFT_REFERENCE_PATH,
+                batch_size=config.DRIFT_BATCH_SIZE,
+                max_pending=config.DRIFT_MAX_PENDING,
+                heavy_hitters=config.DRIFT_HEAVY_HITTERS,
+            )
+            if previous is not None:
+                # Flushing and joining the old monitor must not hold up requests on the event loop
+                threading.Thread(target=previous.close, name="drift-monitor-close", daemon=True).start()
+        return drift_monitor
+
+
+def observe_drift(records: List[dict], bundle: Optional[ModelBundle]):
+    """Buffers validated records for the drift monitor; the sketches are updated in the background."""
+    if config.DRIFT_ENABLED and records and bundle is not None:
+        get_drift_monitor(bundle).observe(records)
+
+
+def after_predict(record: dict, result: dict, bundle: ModelBundle):
+    """Feeds a served /predict request to the drift monitor and the shadow evaluator; runs once the response is sent."""
+    observe_drift([record], bundle)
+    if shadow_evaluator is not None:
+        shadow_evaluator.submit(record, served_price(result), bundle)
+
+
+def observe_drift_table(table, bundle: ModelBundle):
+    """Adds the columns of an Arrow upload to the drift monitor."""
+    if config.DRIFT_ENABLED:
+        monitor = get_drift_monitor(bundle)
+        monitor.update_columns(arrow_columns(table, monitor), table.num_rows)
+
+
+def load_model(warm_up=True):
+    """Loads and warms up the active model version; does nothing if already loaded.
+
+    With ``warm_up=False`` the model is only loaded and no native thread pool
+    is started: the pre-forking server loads in the parent, and each worker
+    calls warm_up_model() after the fork.
+    """
+    global load_error, warm_up_on_load
+    with _load_lock:
+        if registry.active is not None:
+            return registry.active
+        warm_up_on_load = warm_up
+        try:
+            if warm_up:
+                # Pin the native thread pools so concurrent inference jobs do not oversubscribe cores
+                pin_native_threads(config.INFERENCE_THREADS)
+
+            loaded = registry.initialize()
+        except Exception as e:
+            load_error = repr(e)
+            logger.exception("Loading the model failed")
+            raise
+        finally:
+            warm_up_on_load = True
+
+        startup_timings.update(loaded.timings)
+        startup_timings["ready_since_process_start"] = time.time() - process_start
+        logger.info("Model %s %s: %s", loaded.version, "ready" if warm_up else "loaded", startup_timings)
+        return loaded
+
+
+def warm_up_model():
+    """Pins the native thread pools and warms up the preloaded model, in a forked worker."""
+    with _load_lock:
+        pin_native_threads(config.INFERENCE_THREADS)
+        loaded = registry.active
+        loaded.warm_up()
+        startup_timings.update(loaded.timings)
+        startup_timings["ready_since_process_start"] = time.time() - process_start
+        logger.info("Model %s ready: %s", loaded.version, startup_timings)
+        return loaded
+
+
+def get_bundle() -> ModelBundle:
+    """Returns the active bundle, or answers 503 while the model is still loading."""
+    bundle = registry.active
+    if bundle is None:
+        raise HTTPException(
+            status_code=503,
+            detail="The model is still loading",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+        )
+    return bundle
+
+
+# Cache of /predict responses, keyed by the normalized item and the artifact checksum
+prediction_cache = None
+if config.CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(
+        maxsize=config.CACHE_SIZE,
+        ttl=config.CACHE_TTL,
+        backend=SQLiteCacheBackend(config.CACHE_BACKEND_PATH, config.CACHE_TTL) if config.CACHE_BACKEND_PATH else None,
+    )
+
+# Maximum number of items accepted by the batch endpoint in a single call
+MAX_BATCH_SIZE = 10_000
+
+# Longest line accepted by the streaming endpoint
+MAX_STREAM_LINE_BYTES = 1 << 20
+
+# Maximum number of rows accepted by the Arrow endpoint in a single call
+MAX_ARROW_ROWS = 1_000_000
+
+# Decoder of the FAST_JSON /predict path
+item_decoder = fast_json.ItemDecoder.from_model(Item)
+
+
+def score_with_bundles(items: List[tuple]) -> list:
+    """Scores ``(record, bundle)`` pairs, each record with its own bundle, in one model call per bundle.
+
+    The records of a batch normally share one bundle; they differ only
+    around a model activation.
+    """
+    by_bundle = {}
+    for index, (record, bundle) in enumerate(items):
+        by_bundle.setdefault(id(bundle), (bundle, []))[1].append(index)
+    results = [None] * len(items)
+    for bundle, indices in by_bundle.values():
+        for index, result in zip(indices, score_records([items[index][0] for index in indices], bundle)):
+            results[index] = result
+    return results
+
 
 # Define API tags
 tags_metadata = [
     {"name": "predict", "description": "Operations related to real estate price prediction."},
+    {"name": "monitoring", "description": "Operational statistics of the API."},
+    {"name": "admin", "description": "Management of the model versions."},
 ]
 
 # Assign tags to the entire app
 app.openapi_tags = tags_metadata
 
+# Blocking inference runs in this bounded pool, keeping the event loop responsive
+inference_executor = InferenceExecutor(
+    max_workers=config.INFERENCE_WORKERS,
+    max_queue=config.INFERENCE_QUEUE_SIZE,
+    retry_after=config.RETRY_AFTER_SECONDS,
+)
+
+# Micro-batcher shared by concurrent /predict requests, started with the event loop
+micro_batcher = None
+
+
+def load_model_and_watch():
+    load_model()
+    registry.start_watching()
+
+
+@app.on_event("startup")
+async def start_loading_model():
+    # Load in the background so /healthz answers while the artifacts load
+    asyncio.get_running_loop().run_in_executor(None, load_model_and_watch)
+
+
+@app.on_event("startup")
+async def start_micro_batcher():
+    global micro_batcher
+    if config.MICRO_BATCH_MAX_SIZE > 1:
+        micro_batcher = MicroBatcher(
+            score_with_bundles,
+            inference_executor,
+            max_batch_size=config.MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=config.MICRO_BATCH_MAX_WAIT_MS,
+            max_queue=config.INFERENCE_QUEUE_SIZE * config.MICRO_BATCH_MAX_SIZE,
+        )
+        micro_batcher.start()
+
+
+@app.on_event("startup")
+async def start_shadow_evaluator():
+    if shadow_evaluator is not None:
+        shadow_evaluator.start()
+
+
+@app.on_event("shutdown")
+async def stop_micro_batcher():
+    if micro_batcher is not None:
+        await micro_batcher.stop()
+
+
+@app.on_event("shutdown")
+async def stop_watching_models():
+    registry.stop_watching()
+
+
+@app.on_event("shutdown")
+async def flush_capture():
+    if capture_writer is not None:
+        await asyncio.get_running_loop().run_in_executor(None, capture_writer.close)
+
+
+@app.on_event("shutdown")
+async def stop_drift_monitor():
+    if drift_monitor is not None:
+        drift_monitor.close()
+
+
+@app.on_event("shutdown")
+async def stop_shadow_evaluator():
+    if shadow_evaluator is not None:
+        await asyncio.get_running_loop().run_in_executor(None, shadow_evaluator.stop)
+
+
 # New route at the root path
 @app.get("/")
 async def read_root():
     return {"message": "alive"}
 
-@app.post("/predict", tags=["predict"], response_description="Predicted real estate price range")
-async def predict(item: Item):
+
+@app.get("/healthz", tags=["monitoring"])
+async def healthz():
+    """Liveness probe: answers as soon as the server process accepts requests."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz", tags=["monitoring"])
+async def readyz():
+    """Readiness probe: answers 200 only once the model is loaded and warmed up."""
+    bundle = registry.active
+    if bundle is None:
+        status = "failed" if load_error is not None else "loading"
+        raise HTTPException(status_code=503, detail={"status": status, "error": load_error})
+    return {"status": "ready", "model_version": bundle.version, "startup_timings": startup_timings}
+
+async def call_cache(method, *args):
+    """Calls a method of the prediction cache, in a thread when it reaches the shared backend's blocking IO."""
+    if prediction_cache.backend is None:
+        return method(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+async def predict_record(record: dict):
+    """Scores a validated item, through the cache and the micro-batcher when they are enabled.
+
+    Returns the response and the bundle that scored it.
+    """
+    bundle = get_bundle()
+
+    # Identical items scored by the same model are served from the cache
+    if prediction_cache is not None:
+        with metrics.stage("cache_lookup"):
+            key = cache_key(record, f"{bundle.checksum}:{bundle.version}")
+            cached = await call_cache(prediction_cache.get, key)
+        if cached is not None:
+            return cached, bundle
+
+    try:
+        # Score the item, together with concurrent requests when micro-batching is on;
+        # with the bundle of the cache key, even if another model is activated meanwhile
+        if micro_batcher is not None:
+            result = await micro_batcher.submit((record, bundle))
+        else:
+            result = (await inference_executor.run(score_records, [record], bundle))[0]
+            if isinstance(result, Exception):
+                raise result
+
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+    if prediction_cache is not None:
+        await call_cache(prediction_cache.set, key, result)
+    return result, bundle
+
+
+def is_json_request(request: Request) -> bool:
+    """Tells whether FastAPI would parse the body of ``request`` as JSON."""
+    content_type = request.headers.get("content-type")
+    if not content_type:
+        return True
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type == "application/json" or (media_type.startswith("application/") and media_type.endswith("+json"))
+
+
+def validate_item_body(body: bytes, is_json: bool) -> dict:
+    """Validates a raw ``/predict`` body with ``Item``, raising the errors FastAPI would raise."""
+    data = body
+    if is_json:
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestValidationError(
+                [{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error", "input": {}, "ctx": {"error": e.msg}}],
+                body=e.doc,
+            ) from e
+    try:
+        return Item.model_validate(data, from_attributes=True).dict()
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()], body=data
+        ) from e
+
+
+async def predict(item: Item, response: Response, background_tasks: BackgroundTasks):
     """
     Predicts real estate prices based on input features.
 
@@ -99,39 +451,598 @@ async def predict(item: Item):
     }
     ```
 
+    The version of the model that served the prediction is returned in the
+    `model_version` field and the `X-Model-Version` header.
+
     **Responses:**
     - 200 OK: Returns the predicted real estate price range.
     - 500 Internal Server Error: If an error occurs during prediction.
+    - 503 Service Unavailable: If the server is overloaded or still loading the model; retry after the `Retry-After` delay.
     """
+    metrics.mark_since_request_start("parse_validate")
+    record = item.dict()
+    try:
+        result, bundle = await predict_record(record)
+    except HTTPException:
+        # Failed inputs still count for drift, e.g. their unknown categories
+        observe_drift([record], registry.active)
+        raise
+    response.headers["X-Model-Version"] = result["model_version"]
+    background_tasks.add_task(after_predict, record, result, bundle)
+    return result
+
+
+async def predict_fast(request: Request):
+    """Same contract as ``predict``, decoding the body with ``item_decoder`` and encoding with orjson."""
+    body = await request.body()
+    record = item_decoder.decode(body) if is_json_request(request) else None
+    if record is None:
+        # Anything but a well-formed item goes through pydantic, for identical values and errors
+        record = validate_item_body(body, is_json_request(request))
+    metrics.mark_since_request_start("parse_validate")
+
     try:
-        # Create a DataFrame from the input data
-        input_data = pd.DataFrame([item.dict()])
-
-        # Apply preprocessing transformations
-        input_data[num_features] = imputer.transform(input_data[num_features])
-        input_data_cat = enc.transform(input_data[cat_features]).toarray()
-
-        # Combine the numerical and one-hot encoded categorical columns
-        input_data = pd.concat(
-            [
-                input_data[num_features + fl_features].reset_index(drop=True),
-                pd.DataFrame(input_data_cat, columns=enc.get_feature_names_out()),
-            ],
-            axis=1,
+        result, bundle = await predict_record(record)
+    except HTTPException:
+        # Failed inputs still count for drift, e.g. their unknown categories
+        observe_drift([record], registry.active)
+        raise
+    with metrics.stage("encode"):
+        return Response(
+            content=fast_json.dumps(result),
+            media_type="application/json",
+            headers={"X-Model-Version": result["model_version"]},
+            background=BackgroundTask(after_predict, record, result, bundle),
         )
 
-        # Make predictions
-        prediction = model.predict(input_data)
 
-        # Define price range
-        
-        # Calculate lower and upper bounds based on the percentage
-        lower_bound = prediction - (prediction * (5 / 100))
-        upper_bound = prediction + (prediction * (5 / 100))
+# The pydantic path is the default; FAST_JSON=1 serves /predict with the fast path
+if config.FAST_JSON:
+    app.post(
+        "/predict",
+        tags=["predict"],
+        response_description="Predicted real estate price range",
+        description=inspect.cleandoc(predict.__doc__),
+        openapi_extra={"requestBody": {"required": True, "content": {"application/json": {"schema": Item.model_json_schema()}}}},
+    )(predict_fast)
+else:
+    app.post("/predict", tags=["predict"], response_description="Predicted real estate price range")(predict)
+
+
+@app.post("/predict/batch", tags=["predict"], response_description="Predicted price range for every item")
+async def predict_batch(response: Response, items: List[Any] = Body(...)):
+    """
+    Predicts real estate prices for many properties in one call.
+
+    **How to use:**
+    - Provide a JSON array of items, each with the same fields as `/predict`.
+    - Up to 10,000 items are accepted per call.
+
+    All valid items are preprocessed and scored together in a single pass.
+    Items that fail validation do not fail the batch: they get an `error`
+    entry instead of a `price_range`, at the same index as in the request.
+
+    **Example Response:**
+    ```json
+    {
+      "results": [
+        {"index": 0, "price_range": {"lower_bound": "498,827", "upper_bound": "551,336"}},
+        {"index": 1, "error": [{"type": "missing", "loc": ["epc"], "msg": "Field required"}]}
+      ],
+      "n_predicted": 1,
+      "n_errors": 1,
+      "model_version": "artifacts_xg"
+    }
+    ```
+
+    **Responses:**
+    - 200 OK: Returns one result per item.
+    - 413 Payload Too Large: If more than 10,000 items are sent.
+    - 500 Internal Server Error: If an error occurs during prediction.
+    - 503 Service Unavailable: If the server is overloaded or still loading the model; retry after the `Retry-After` delay.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} items are accepted per batch")
+    bundle = get_bundle()
+    metrics.mark_since_request_start("parse")
+
+    results = [{"index": index} for index in range(len(items))]
+    valid_rows, valid_indices, observed = [], [], []
+
+    # Validate every item on its own so a single bad row does not fail the batch
+    with metrics.stage("validate"):
+        for index, raw_item in enumerate(items):
+            row, errors = validate_item(raw_item, bundle)
+            if row is not None:
+                observed.append(row)
+            if errors:
+                results[index]["error"] = errors
+                continue
+
+            valid_rows.append(row)
+            valid_indices.append(index)
+    observe_drift(observed, bundle)
+
+    if valid_rows:
+        try:
+            # Preprocess and score all valid rows at once
+            prediction = await inference_executor.run(bundle.predict_rows, valid_rows)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+
+        with metrics.stage("format"):
+            for index, price_range in zip(valid_indices, format_price_ranges(prediction)):
+                results[index]["price_range"] = price_range
+
+    response.headers["X-Model-Version"] = bundle.version
+    return {
+        "results": results,
+        "n_predicted": len(valid_rows),
+        "n_errors": len(items) - len(valid_rows),
+        "model_version": bundle.version,
+    }
+
+
+def split_envelope(record: Any):
+    """Splits a line of a streamed upload into ``(request_id, raw_item)``.
+
+    A line holds either an item, or an envelope with a ``request_id`` and the
+    item as ``body``, like the lines of ``requests.jsonl``.
+    """
+    if isinstance(record, dict) and "request_id" in record and "body" in record:
+        return record["request_id"], record["body"]
+    return None, record
+
+
+async def score_stream_chunk(results: List[dict], rows: list, bundle: ModelBundle) -> bytes:
+    """Scores the valid rows of a chunk and encodes the results of all its lines as NDJSON."""
+    if rows:
+        while True:
+            try:
+                scored = await inference_executor.run(score_records, [row for _, row in rows], bundle)
+                break
+            except Overloaded as e:
+                # Wait for capacity rather than failing a long upload halfway through
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                scored = [e] * len(rows)
+                break
+
+        for (result, _), outcome in zip(rows, scored):
+            if isinstance(outcome, Exception):
+                result["error"] = [{"type": "prediction_error", "loc": [], "msg": str(outcome)}]
+            else:
+                result.update(outcome)
 
-        # Return the price range
-        return {"price_range": {"lower_bound": "{:,.0f}".format(int(lower_bound[0])), "upper_bound":  "{:,.0f}".format(int(upper_bound[0]))}}
+    with metrics.stage("format"):
+        return "".join(json.dumps(result) + "\n" for result in results).encode()
 
+
+async def stream_predictions(request: Request, bundle: ModelBundle):
+    """Reads the NDJSON upload of ``request`` and yields the NDJSON results, one chunk at a time."""
+    results, rows, observed = [], [], []
+    try:
+        async for line_number, line in iter_lines(request.stream(), MAX_STREAM_LINE_BYTES):
+            result = {"line": line_number}
+            results.append(result)
+            try:
+                request_id, raw_item = split_envelope(json.loads(line))
+                if request_id is not None:
+                    result["request_id"] = request_id
+                # An envelope body may also be an item encoded as a JSON string
+                if isinstance(raw_item, str):
+                    raw_item = json.loads(raw_item)
+            except ValueError as e:
+                result["error"] = [{"type": "json_invalid", "loc": [], "msg": f"Invalid JSON: {e}"}]
+                continue
+
+            row, errors = validate_item(raw_item, bundle)
+            if row is not None:
+                observed.append(row)
+            if errors:
+                result["error"] = errors
+            else:
+                rows.append((result, row))
+
+            if len(results) >= config.STREAM_CHUNK_SIZE:
+                observe_drift(observed, bundle)
+                yield await score_stream_chunk(results, rows, bundle)
+                results, rows, observed = [], [], []
+    except LineTooLong as e:
+        # The rest of the upload cannot be split into lines reliably: stop after this chunk
+        results.append({"line": e.line_number, "error": [{"type": "line_too_long", "loc": [], "msg": str(e)}]})
+
+    if results:
+        observe_drift(observed, bundle)
+        yield await score_stream_chunk(results, rows, bundle)
+
+
+@app.post(
+    "/predict/stream",
+    tags=["predict"],
+    response_description="One NDJSON result per input line",
+    openapi_extra={"requestBody": {"required": True, "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}}}},
+)
+async def predict_stream(request: Request):
+    """
+    Predicts real estate prices for a stream of properties of any length.
+
+    **How to use:**
+    - Send newline-delimited JSON (`application/x-ndjson`), one item per line, with the same fields as `/predict`.
+    - A line may also be an envelope `{"request_id": ..., "body": {...}}` like the lines of `requests.jsonl`; the `request_id` is echoed in its result.
+
+    Lines are validated as they arrive and scored in chunks; the results of
+    a chunk are streamed back, one NDJSON line per input line and in input
+    order, as soon as it is scored. The upload is read only as fast as the
+    results are consumed, so the server holds at most one chunk in memory.
+
+    **Example Response:**
+    ```
+    {"line": 1, "request_id": "a-1", "price_range": {"lower_bound": "498,827", "upper_bound": "551,336"}, "model_version": "artifacts_xg"}
+    {"line": 2, "error": [{"type": "missing", "loc": ["epc"], "msg": "Field required"}]}
+    ```
+
+    **Responses:**
+    - 200 OK: Streams one result per non-blank input line.
+    - 503 Service Unavailable: If the model is still loading; retry after the `Retry-After` delay.
+    """
+    bundle = get_bundle()
+    return NDJSONStreamingResponse(stream_predictions(request, bundle), headers={"X-Model-Version": bundle.version})
+
+
+@app.post(
+    "/predict/arrow",
+    tags=["predict"],
+    response_class=Response,
+    response_description="Arrow IPC stream with one prediction per input row",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {media_type: {"schema": {"type": "string", "format": "binary"}} for media_type in (STREAM_MEDIA_TYPE, FILE_MEDIA_TYPE)},
+        }
+    },
+)
+async def predict_arrow(request: Request):
+    """
+    Predicts real estate prices for a columnar batch of properties in Apache Arrow format.
+
+    **How to use:**
+    - Send an Arrow IPC stream or file with one column per `/predict` field (extra columns are ignored).
+    - Numeric columns may be of any numeric type; nulls are imputed. Categorical columns may be strings or dictionary-encoded.
+    - Up to 1,000,000 rows are accepted per call.
+
+    The feature matrix is built directly from the Arrow columns, without
+    creating Python objects per row. The response is an Arrow IPC stream
+    (`application/vnd.apache.arrow.stream`) holding one record batch with the
+    columns `price`, `lower_bound`, `upper_bound` (float32, null for rows that
+    could not be scored) and `error`, in the order of the input rows.
+
+    **Responses:**
+    - 200 OK: Returns the Arrow record batch of predictions.
+    - 413 Payload Too Large: If more than 1,000,000 rows are sent.
+    - 422 Unprocessable Entity: If the body is not Arrow IPC data, or a column is missing or of the wrong type.
+    - 500 Internal Server Error: If an error occurs during prediction.
+    - 503 Service Unavailable: If the server is overloaded or still loading the model; retry after the `Retry-After` delay.
+    """
+    bundle = get_bundle()
+    try:
+        table = read_ipc(await request.body())
+    except ArrowInputError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    metrics.mark_since_request_start("parse")
+    if table.num_rows > MAX_ARROW_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ARROW_ROWS} rows are accepted per call")
+
+    try:
+        predictions = await inference_executor.run(score_arrow, bundle, table)
+    except ArrowInputError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
-        
\ No newline at end of file
+
+    return Response(
+        content=write_ipc(predictions).to_pybytes(),
+        media_type=STREAM_MEDIA_TYPE,
+        headers={"X-Model-Version": bundle.version},
+        # The columns are sketched once the response is sent
+        background=BackgroundTask(observe_drift_table, table, bundle),
+    )
+
+
+@app.post("/predict/sensitivity", tags=["predict"], response_description="Predicted price of every variant")
+async def predict_sensitivity(request: SensitivityRequest, response: Response):
+    """
+    Predicts how the price of a property changes when some of its features change.
+
+    **How to use:**
+    - Provide the property as `item`, with the same fields as `/predict`.
+    - List up to 3 `variations`, each with a `field` of the item and either the `values` to try or, for a float field, a `range` with `start`, `stop` (included) and `step`.
+
+    Every combination of the variations is scored, in a single model call:
+    the item is preprocessed once and only the varied features are rewritten
+    for each variant. Up to 10,000 variants are accepted per call. The
+    `results` table lists the variants with the values of the last variation
+    varying fastest, together with the price of the unchanged item (`base`).
+
+    **Example Request:**
+    ```json
+    {
+      "item": {"nbr_frontages": 2.0, "...": "...", "region": "Brussels-Capital"},
+      "variations": [
+        {"field": "total_area_sqm", "range": {"start": 50, "stop": 300, "step": 25}},
+        {"field": "epc", "values": ["A", "C", "F"]}
+      ]
+    }
+    ```
+
+    **Example Response:**
+    ```json
+    {
+      "fields": ["total_area_sqm", "epc"],
+      "base": {"price": 524943, "price_range": {"lower_bound": "498,695", "upper_bound": "551,190"}},
+      "results": [
+        {"total_area_sqm": 50.0, "epc": "A", "price": 301245, "price_range": {"lower_bound": "286,182", "upper_bound": "316,307"}}
+      ],
+      "n_variants": 33,
+      "model_version": "artifacts_xg"
+    }
+    ```
+
+    **Responses:**
+    - 200 OK: Returns the price of every variant.
+    - 413 Payload Too Large: If the variations make more than 10,000 variants.
+    - 422 Unprocessable Entity: If the item or a variation is invalid.
+    - 500 Internal Server Error: If an error occurs during prediction.
+    - 503 Service Unavailable: If the server is overloaded or still loading the model; retry after the `Retry-After` delay.
+    """
+    bundle = get_bundle()
+    record = request.item.dict()
+    errors = [{**error, "loc": ["body", "item", *error["loc"]]} for error in bundle.unknown_category_errors(record)]
+    pairs, variation_errors = variation_values(request.variations, bundle)
+    errors += variation_errors or []
+    if errors:
+        raise RequestValidationError(errors)
+    n_variants = math.prod(len(values) for _, values in pairs)
+    if n_variants > MAX_SENSITIVITY_GRID:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SENSITIVITY_GRID} variants are accepted per call, got {n_variants}")
+    metrics.mark_since_request_start("parse_validate")
+
+    try:
+        result = await inference_executor.run(score_sensitivity, record, pairs, bundle)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+    response.headers["X-Model-Version"] = bundle.version
+    return result
+
+
+# Precomputed price heatmaps, rebuilt in the background for a new model
+heatmap_store = HeatmapStore()
+
+
+@app.get("/heatmap/{profile}", tags=["predict"], response_description="Estimated price at every point of the map")
+async def heatmap(profile: str, grid: bool = False):
+    """
+    Returns the estimated price of a canonical property all over Belgium.
+
+    **How to use:**
+    - `profile` is one of the canonical properties, `apartment` or `house`.
+    - `grid=true` returns the points of the lat/lon grid instead of the zip code centroids, when the heatmap was built with a grid (`HEATMAP_GRID_STEP`).
+
+    The prices are precomputed with `python -m api.heatmap`. When the active
+    model has changed since, the heatmap is rebuilt in the background and
+    the previous one is served meanwhile, with `"stale": true`.
+
+    **Example Response:**
+    ```json
+    {
+      "profile": "apartment",
+      "model_version": "artifacts_xg",
+      "stale": false,
+      "points": [[50.851837, 4.354578, 445503.66], [50.885412, 4.351191, 424888.5]]
+    }
+    ```
+
+    **Responses:**
+    - 200 OK: Returns the `[latitude, longitude, price]` points.
+    - 404 Not Found: If the profile is unknown, or the heatmap has no grid.
+    - 503 Service Unavailable: If the model is still loading or the heatmap is being built; retry after the `Retry-After` delay.
+    """
+    if profile not in PROFILES:
+        raise HTTPException(status_code=404, detail=f"Unknown profile {profile!r}, expected one of {list(PROFILES)}")
+    bundle = get_bundle()
+    loop = asyncio.get_running_loop()
+    # Reopening the arrays after a rebuild and building a layer block: keep them off the event loop
+    stale = not await loop.run_in_executor(None, heatmap_store.is_current, bundle.checksum)
+    if stale:
+        heatmap_store.rebuild_in_background(bundle)
+
+    points = await loop.run_in_executor(None, heatmap_store.layer, profile, grid)
+    if points is None:
+        if heatmap_store.manifest is not None and profile in heatmap_store.manifest["profiles"]:
+            raise HTTPException(status_code=404, detail="The heatmap was built without a grid")
+        raise HTTPException(
+            status_code=503,
+            detail="The heatmap is being built",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+        )
+    result = {"profile": profile, "model_version": heatmap_store.manifest["model_version"], "stale": stale, "points": points}
+    return Response(content=fast_json.dumps(result), media_type="application/json")
+
+
+@app.get("/cache/stats", tags=["monitoring"])
+async def cache_stats():
+    """Returns the hit, miss and eviction counters of the prediction cache."""
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+
+@app.get("/capture/stats", tags=["monitoring"])
+async def capture_stats():
+    """Returns the counts of captured, dropped and written requests."""
+    if capture_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **capture_writer.stats()}
+
+
+@app.get("/shadow/report", tags=["monitoring"])
+async def shadow_report(min_count: int = 1):
+    """
+    Compares the shadow model with the active model on a sample of the live `/predict` traffic.
+
+    Set `SHADOW_ARTIFACTS_PATH` to a candidate bundle to enable shadow
+    scoring. A share `SHADOW_SAMPLE_RATE` of the `/predict` records is scored
+    in the background by both models, after the response is sent; records
+    are dropped rather than queued when the shadow worker falls behind.
+
+    The report holds the counts of submitted, dropped and scored records, and
+    the histograms of the absolute error (euros) and relative error of the
+    shadow prices, overall and per `region` and `property_type` with at
+    least `min_count` records. A positive `mean_signed_relative_error` means
+    the shadow model prices higher. The report covers this worker process.
+    """
+    if shadow_evaluator is None:
+        return {"enabled": False}
+    return Response(content=fast_json.dumps({"enabled": True, **shadow_evaluator.report(min_count)}), media_type="application/json")
+
+
+@app.get("/drift/snapshot", tags=["monitoring"])
+async def drift_snapshot(sketches: bool = False):
+    """
+    Returns the distribution of the features of the validated inputs since the active model was loaded.
+
+    Numeric features get their quantiles (within 1%), mean, range and
+    missing rate; categorical features their most frequent values and the
+    rate of values the model has never seen, with the most frequent of
+    those. Inputs rejected for an unknown category are included. With
+    `sketches=true` the sketches themselves are returned too; saved as
+    `<version>.drift.json` next to the artifacts, such a snapshot becomes the
+    reference of `/drift/report`. The snapshot covers this worker process.
+    """
+    if not config.DRIFT_ENABLED:
+        return {"enabled": False}
+    monitor = get_drift_monitor(get_bundle())
+    snapshot = await asyncio.get_running_loop().run_in_executor(None, monitor.snapshot, sketches)
+    return Response(content=fast_json.dumps({"enabled": True, **snapshot}), media_type="application/json")
+
+
+@app.get("/drift/report", tags=["monitoring"])
+async def drift_report():
+    """
+    Compares the current feature distribution with the reference of the active model.
+
+    The reference is built from the training data with
+    `python -m api.drift reference`. Without it, the artifacts only tell the
+    mean imputed for every number and the known categories, so the report
+    is limited to the shifts of the means and the unknown-category rates.
+    With it, every feature also gets a population stability index (PSI)
+    over the deciles or the frequent values of the reference, and the
+    shifts of its quantiles. Features whose PSI exceeds
+    `DRIFT_PSI_THRESHOLD`, or whose unknown-category rate grew by more than
+    `DRIFT_UNKNOWN_RATE_THRESHOLD`, are listed in `drifted`.
+    """
+    if not config.DRIFT_ENABLED:
+        return {"enabled": False}
+    monitor = get_drift_monitor(get_bundle())
+    report = await asyncio.get_running_loop().run_in_executor(
+        None, monitor.report, config.DRIFT_PSI_THRESHOLD, config.DRIFT_UNKNOWN_RATE_THRESHOLD
+    )
+    return Response(content=fast_json.dumps({"enabled": True, **report}), media_type="application/json")
+
+
+@app.get("/batching/stats", tags=["monitoring"])
+async def batching_stats():
+    """Returns the number and mean size of the micro-batches scored so far."""
+    if micro_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **micro_batcher.stats()}
+
+
+@app.get("/executor/stats", tags=["monitoring"])
+async def executor_stats():
+    """Returns the queue depth, in-flight and rejected job counts of the inference pool."""
+    return inference_executor.stats()
+
+
+@app.get("/metrics", tags=["monitoring"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, stage and queue metrics in the Prometheus text format."""
+    lines = render_gauges("immo_executor", "Inference executor", inference_executor.stats())
+    if prediction_cache is not None:
+        lines += render_gauges("immo_cache", "Prediction cache", prediction_cache.stats())
+    if micro_batcher is not None:
+        lines += render_gauges("immo_batching", "Micro-batching", micro_batcher.stats())
+    if shadow_evaluator is not None:
+        lines += render_gauges("immo_shadow", "Shadow evaluation", shadow_evaluator.stats())
+    return metrics.render(lines)
+
+
+def require_admin(authorization: str = Header(default="")):
+    """Checks the bearer token of admin requests when ADMIN_TOKEN is configured."""
+    if config.ADMIN_TOKEN is not None and authorization != f"Bearer {config.ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token")
+
+
+@app.get("/admin/models", tags=["admin"], dependencies=[Depends(require_admin)])
+async def list_models():
+    """Lists the model versions found in the models directory and which one is active."""
+
+    # The scan stats the directory and may hash bundles: keep it off the event loop
+    def listing():
+        return {"versions": registry.versions(), "history": registry.read_pointer()["history"]}
+
+    return await asyncio.get_running_loop().run_in_executor(None, listing)
+
+
+@app.post("/admin/models/{version}/activate", tags=["admin"], dependencies=[Depends(require_admin)])
+async def activate_model(version: str):
+    """
+    Loads, warms up and activates a model version without downtime.
+
+    Requests in flight finish on the previous version. All workers sharing the
+    models directory switch to the new version within one poll interval.
+    """
+    try:
+        bundle = await asyncio.get_running_loop().run_in_executor(None, registry.activate, version)
+    except UnknownVersion as e:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version!r}") from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Activating {version!r} failed: {e}") from e
+    return {"active": bundle.version}
+
+
+@app.post("/admin/shadow/reset", tags=["admin"], dependencies=[Depends(require_admin)])
+async def reset_shadow_report():
+    """Clears the divergence histograms of the shadow report, e.g. after activating another model."""
+    if shadow_evaluator is None:
+        raise HTTPException(status_code=404, detail="Shadow evaluation is not enabled")
+    shadow_evaluator.reset()
+    return {"reset": True}
+
+
+@app.post("/admin/drift/reset", tags=["admin"], dependencies=[Depends(require_admin)])
+async def reset_drift_monitor():
+    """Clears the sketches of the drift monitor, e.g. to watch the traffic after a change."""
+    if not config.DRIFT_ENABLED:
+        raise HTTPException(status_code=404, detail="The drift monitor is not enabled")
+    get_drift_monitor(get_bundle()).reset()
+    return {"reset": True}
+
+
+@app.post("/admin/models/rollback", tags=["admin"], dependencies=[Depends(require_admin)])
+async def rollback_model():
+    """Re-activates the model version that was active before the current one."""
+    try:
+        bundle = await asyncio.get_running_loop().run_in_executor(None, registry.rollback)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rollback failed: {e}") from e
+    return {"active": bundle.version}
@@ -0,0 +1,137 @@
+"""Dynamic micro-batching of concurrent single-item predictions.
+
+Requests put their record on an asyncio queue and wait on a future. A
+background worker collects up to ``max_batch_size`` records, waiting at most
+``max_wait_ms`` after the first one arrives, scores them with one vectorized
+call on the inference executor and resolves every future with its own row.
+
+Up to one batch per executor worker is in flight; the worker keeps
+collecting while they run, and once every worker is busy the records wait
+in the queue, so the next batches are larger.
+"""
+import asyncio
+
+from api.executor import Overloaded
+
+
+class MicroBatcher:
+    """Groups records submitted concurrently into batches for ``score_batch``.
+
+    ``score_batch`` receives a list of records and must return one result per
+    record, in order; results that are exceptions are raised to the caller
+    that submitted the record. Batches run on ``executor``, an
+    ``api.executor.InferenceExecutor``. At most ``max_queue`` records may wait
+    for a batch; further submissions raise ``Overloaded``.
+    """
+
+    def __init__(self, score_batch, executor, max_batch_size=64, max_wait_ms=2.0, max_queue=1024):
+        self.score_batch = score_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.rejected = 0
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._arrival = None
+        self._worker = None
+        self._slots = None
+        self._in_flight = set()
+
+    def start(self):
+        """Starts the worker task; must be called from the running event loop."""
+        self._queue = asyncio.Queue()
+        self._arrival = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.executor.max_workers)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Let the batches already dispatched resolve their callers
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def submit(self, record):
+        """Queues a record and returns its result once its batch is scored."""
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.executor.retry_after)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((record, future))
+        self._arrival.set()
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued before waiting for more
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            # Wait on an event rather than on the queue, so a timeout never drops a record
+            self._arrival.clear()
+            try:
+                await asyncio.wait_for(self._arrival.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # Wait for a free executor worker before collecting, so records
+            # arriving meanwhile join the next batch
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._score(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _score(self, batch):
+        records = [record for record, _ in batch]
+        try:
+            results = await self.executor.run(self.score_batch, records)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # The caller went away (e.g. the client disconnected)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": len(self._in_flight),
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
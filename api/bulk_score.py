@@ -0,0 +1,498 @@
+"""Offline bulk scoring of CSV, Parquet or JSONL files.
+
+The input is read in chunks of a fixed number of rows. Each chunk is scored
+in a process pool whose workers load the artifact bundle once, with the same
+preprocessing and model as the API. Results are appended to the output
+(CSV or JSONL, chosen by its extension) in input order as soon as they are
+ready. Only a bounded window of chunks is in flight, so memory stays flat
+whatever the input size.
+
+Progress is checkpointed next to the output in ``<output>.progress`` after
+every written chunk. After an interruption, ``--resume`` truncates the
+output to the last checkpoint and continues with the next chunk.
+
+Missing numeric values are imputed like in the API. With ``--zip-column``,
+missing regions, provinces and coordinates are first filled in from the zip
+code of the row. Rows that cannot be scored (e.g. an unknown category) get
+an ``error`` instead of a price.
+
+Usage:
+    python -m api.bulk_score input.parquet output.csv --chunk-size 50000 --workers 4
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+INPUT_FORMATS = ("csv", "parquet", "jsonl")
+OUTPUT_FORMATS = ("csv", "jsonl")
+
+# Seconds between two progress messages
+LOG_INTERVAL = 5.0
+
+# Bundle loaded once by each worker process
+_bundle = None
+
+
+def detect_format(path, formats):
+    suffix = Path(path).suffix.lower().lstrip(".")
+    suffix = {"pq": "parquet", "ndjson": "jsonl"}.get(suffix, suffix)
+    if suffix not in formats:
+        raise ValueError(f"Cannot tell the format of {path}, expected one of {formats}")
+    return suffix
+
+
+def _to_ipc(table):
+    """Serializes an Arrow table for a worker; unlike pickling, only the sliced rows are written."""
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _rechunk(batches, chunk_size):
+    """Regroups Arrow record batches of any size into tables of exactly ``chunk_size`` rows."""
+    import pyarrow as pa
+
+    pending, n_pending = [], 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        n_pending += batch.num_rows
+        while n_pending >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size)
+            rest = table.slice(chunk_size)
+            pending, n_pending = rest.to_batches(), rest.num_rows
+    if n_pending:
+        yield pa.Table.from_batches(pending)
+
+
+def read_chunks(path, input_format, chunk_size, column_types=None):
+    """Yields the input as ``(kind, payload)`` chunks of ``chunk_size`` rows.
+
+    Arrow formats are sent to the workers as IPC streams; JSONL chunks are
+    sent as raw lines so that the workers, not the parent, parse them.
+    """
+    if input_format == "jsonl":
+        with open(path, "rb") as f:
+            lines = []
+            for line in f:
+                if not line.strip():
+                    continue
+                lines.append(line)
+                if len(lines) == chunk_size:
+                    yield "jsonl", lines
+                    lines = []
+            if lines:
+                yield "jsonl", lines
+        return
+
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+    else:
+        import pyarrow.csv as pa_csv
+
+        batches = pa_csv.open_csv(
+            path,
+            read_options=pa_csv.ReadOptions(block_size=16 << 20),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types or {}),
+        )
+    for table in _rechunk(batches, chunk_size):
+        yield "arrow", _to_ipc(table)
+
+
+def _init_worker(artifacts_path, engine):
+    global _bundle
+    from api.bundle import ModelBundle
+    from api.executor import pin_native_threads
+
+    # One native thread per worker: the pool provides the parallelism
+    pin_native_threads(1)
+    _bundle = ModelBundle.load(artifacts_path, engine=engine, threads=1)
+
+
+def _column_values(table, name):
+    """Returns a column of an Arrow table as a list, or Nones if the table lacks it."""
+    if name in table.column_names:
+        return table.column(name).to_pylist()
+    return [None] * table.num_rows
+
+
+def _score_columns(bundle, columns, n_rows):
+    """Scores a chunk given as value lists; returns the prices, bounds and error messages per row.
+
+    If a value cannot be converted, the rows are scored one by one to isolate it.
+    """
+    try:
+        prediction, errors = bundle.score_columns(columns, n_rows)
+    except (TypeError, ValueError):
+        predictions, errors = [], []
+        for index in range(n_rows):
+            row = {name: values[index:index + 1] for name, values in columns.items()}
+            try:
+                prediction, (error,) = bundle.score_columns(row, 1)
+            except (TypeError, ValueError) as e:
+                prediction, error = (), e
+            predictions.extend(prediction)
+            errors.append(error)
+        prediction = np.asarray(predictions, dtype=np.float32)
+
+    # Same float32 arithmetic as the API's price ranges
+    lower_bounds = prediction - (prediction * (5 / 100))
+    upper_bounds = prediction + (prediction * (5 / 100))
+    scored = iter(zip(prediction.tolist(), lower_bounds.tolist(), upper_bounds.tolist()))
+    results = [next(scored) if error is None else (None, None, None) for error in errors]
+    prices, lowers, uppers = zip(*results) if results else ((), (), ())
+    return prices, lowers, uppers, [None if error is None else str(error) for error in errors]
+
+
+def _coerce_numeric(table, names):
+    """Casts the string columns ``names`` of an Arrow table to float64; returns the table and the row errors.
+
+    CSV numeric columns are read as strings so that a malformed cell does
+    not abort the whole read. The usual null markers ("", "NA", ...) become
+    nulls. A column that does not cast is converted value by value: the
+    cells that are not numbers become nulls, and their rows get an error
+    message in the returned ``{row index: message}``.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    null_values = pa.array(pa_csv.ConvertOptions().null_values, pa.string())
+    errors = {}
+    for name in names:
+        if name not in table.column_names or not pa.types.is_string(table.column(name).type):
+            continue
+        column = table.column(name)
+        column = pc.if_else(pc.is_in(column, value_set=null_values), pa.scalar(None, pa.string()), column)
+        try:
+            converted = pc.cast(column, pa.float64())
+        except pa.ArrowInvalid:
+            values = []
+            for index, value in enumerate(column.to_pylist()):
+                try:
+                    values.append(None if value is None else float(value))
+                except ValueError:
+                    values.append(None)
+                    errors.setdefault(index, f"Invalid number {value!r} for feature '{name}'")
+            converted = pa.array(values, pa.float64())
+        table = table.set_column(table.column_names.index(name), name, converted)
+    return table, errors
+
+
+def _score_table(bundle, table):
+    """Scores a chunk given as an Arrow table, straight from its columns; returns the same as ``_score_columns``."""
+    from api.arrow_io import score_arrow
+
+    predictions = score_arrow(bundle, table)
+    return tuple(predictions.column(name).to_pylist() for name in ("price", "lower_bound", "upper_bound", "error"))
+
+
+def _enrich_table(table, zip_column):
+    """Fills the missing region, province and coordinates of an Arrow table from its zip codes."""
+    import pyarrow as pa
+
+    from api.zipcode_index import FIELDS, get_index
+
+    columns = {name: table.column(name).to_pylist() for name in FIELDS if name in table.column_names}
+    get_index().fill_missing(columns, _column_values(table, zip_column))
+    for name in FIELDS:
+        array = pa.array(columns[name])
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, array)
+        else:
+            table = table.append_column(name, array)
+    return table
+
+
+def _score_chunk(kind, payload, first_row, keep_columns, output_format, zip_column=None):
+    """Scores one chunk in a worker; returns the serialized output rows, the row and error counts."""
+    bundle = _bundle
+    input_features = bundle.num_features + bundle.fl_features + bundle.cat_features
+
+    if kind == "jsonl":
+        records = [json.loads(line) for line in payload]
+        n_rows = len(records)
+        names = input_features + keep_columns + ([zip_column] if zip_column else [])
+        columns = {name: [record.get(name) for record in records] for name in names}
+        if zip_column:
+            from api.zipcode_index import get_index
+
+            get_index().fill_missing(columns, columns[zip_column])
+        scored = _score_columns(bundle, columns, n_rows)
+    else:
+        import pyarrow as pa
+
+        from api.arrow_io import ArrowInputError
+
+        table = pa.ipc.open_stream(payload).read_all()
+        n_rows = table.num_rows
+        columns = {name: _column_values(table, name) for name in keep_columns}
+        table, conversion_errors = _coerce_numeric(table, bundle.num_features + bundle.fl_features)
+        if zip_column:
+            table = _enrich_table(table, zip_column)
+        try:
+            scored = _score_table(bundle, table)
+        except ArrowInputError:
+            # A missing column or values of the wrong type: fall back to scoring value by value
+            columns.update((name, _column_values(table, name)) for name in input_features)
+            scored = _score_columns(bundle, columns, n_rows)
+        if conversion_errors:
+            scored = tuple(list(values) for values in scored)
+            for index, error in conversion_errors.items():
+                scored[0][index] = scored[1][index] = scored[2][index] = None
+                scored[3][index] = error
+
+    rows = []
+    for index, (price, lower, upper, error) in enumerate(zip(*scored)):
+        row = {"row": first_row + index}
+        row.update((name, columns[name][index]) for name in keep_columns)
+        if error is None:
+            row.update(price=price, lower_bound=int(lower), upper_bound=int(upper), error=None)
+        else:
+            row.update(price=None, lower_bound=None, upper_bound=None, error=error)
+        rows.append(row)
+
+    if output_format == "jsonl":
+        text = "".join(json.dumps(row) + "\n" for row in rows)
+    else:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(row.values() for row in rows)
+        text = buffer.getvalue()
+    return text, n_rows, sum(row["error"] is not None for row in rows)
+
+
+def output_fields(keep_columns):
+    return ["row", *keep_columns, "price", "lower_bound", "upper_bound", "error"]
+
+
+class Checkpoint:
+    """Progress of a run, saved atomically next to the output after every chunk."""
+
+    def __init__(self, output_path, fingerprint):
+        self.path = Path(f"{output_path}.progress")
+        self.fingerprint = fingerprint
+        self.chunks = 0
+        self.rows = 0
+        self.errors = 0
+        self.offset = 0
+
+    def load(self):
+        """Restores the saved progress; returns False if there is none for this input and settings."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        if state["fingerprint"] != self.fingerprint:
+            raise SystemExit(f"{self.path} was written for another input or other settings, refusing to resume")
+        self.chunks, self.rows, self.errors, self.offset = (
+            state["chunks"], state["rows"], state["errors"], state["offset"]
+        )
+        return True
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "chunks": self.chunks,
+                    "rows": self.rows,
+                    "errors": self.errors,
+                    "offset": self.offset,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest finished child, in MB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / (1 << 20) if sys.platform == "darwin" else 1 / 1024
+    return own * scale, children * scale
+
+
+def bulk_score(
+    input_path,
+    output_path,
+    artifacts_path,
+    chunk_size=50_000,
+    workers=None,
+    engine="xgboost",
+    keep_columns=(),
+    zip_column=None,
+    resume=False,
+    overwrite=False,
+    log=print,
+):
+    """Scores ``input_path`` into ``output_path``; returns a summary dict."""
+    from api.split_artifacts import read_features
+
+    input_format = detect_format(input_path, INPUT_FORMATS)
+    output_format = detect_format(output_path, OUTPUT_FORMATS)
+    keep_columns = list(keep_columns)
+    workers = workers or os.cpu_count() or 1
+
+    stat = os.stat(input_path)
+    checkpoint = Checkpoint(
+        output_path,
+        {
+            "input": os.path.abspath(input_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunk_size": chunk_size,
+            "keep_columns": keep_columns,
+            "zip_column": zip_column,
+            "artifacts": os.path.abspath(artifacts_path),
+        },
+    )
+    resumed = resume and checkpoint.load()
+    if not resumed and os.path.exists(output_path) and not overwrite:
+        raise SystemExit(f"{output_path} exists, pass --overwrite to replace it or --resume to continue it")
+
+    # Read the feature lists only: the model itself is loaded by the workers
+    features = read_features(artifacts_path)
+    column_types = {}
+    if input_format == "csv":
+        import pyarrow as pa
+
+        # Numbers are read as strings and cast by the workers, so that a malformed cell is a row error
+        column_types.update(
+            (name, pa.string()) for name in features["num_features"] + features["fl_features"] + features["cat_features"]
+        )
+
+    # Writes are kept in input order; at most this many chunks are read but not yet written
+    window = 2 * workers
+    start = time.perf_counter()
+    rows_at_start = checkpoint.rows
+
+    mode = "r+" if resumed else "w"
+    with open(output_path, mode, newline="") as out, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(artifacts_path, engine)
+    ) as pool:
+        if resumed:
+            # Drop anything written after the last checkpoint
+            out.seek(checkpoint.offset)
+            out.truncate()
+            log(f"Resuming after {checkpoint.chunks} chunks ({checkpoint.rows} rows)")
+        elif output_format == "csv":
+            csv.writer(out, lineterminator="\n").writerow(output_fields(keep_columns))
+            checkpoint.offset = out.tell()
+
+        pending = {}
+        next_to_write = checkpoint.chunks
+        last_log = start
+
+        def write_next():
+            nonlocal next_to_write, last_log
+            text, n_rows, n_errors = pending.pop(next_to_write).result()
+            out.write(text)
+            out.flush()
+            checkpoint.chunks += 1
+            checkpoint.rows += n_rows
+            checkpoint.errors += n_errors
+            checkpoint.offset = out.tell()
+            checkpoint.save()
+            next_to_write += 1
+            now = time.perf_counter()
+            if now - last_log >= LOG_INTERVAL:
+                last_log = now
+                log(f"{checkpoint.rows:,} rows written, {(checkpoint.rows - rows_at_start) / (now - start):,.0f} rows/s")
+
+        for index, (kind, payload) in enumerate(read_chunks(input_path, input_format, chunk_size, column_types)):
+            if index < checkpoint.chunks:
+                continue
+            pending[index] = pool.submit(
+                _score_chunk, kind, payload, index * chunk_size, keep_columns, output_format, zip_column
+            )
+            while len(pending) >= window:
+                write_next()
+        while pending:
+            write_next()
+
+    elapsed = time.perf_counter() - start
+    checkpoint.remove()
+    parent_rss, worker_rss = peak_rss_mb()
+    scored_rows = checkpoint.rows - rows_at_start
+    return {
+        "rows": checkpoint.rows,
+        "rows_this_run": scored_rows,
+        "errors": checkpoint.errors,
+        "seconds": elapsed,
+        "rows_per_second": scored_rows / elapsed if elapsed else 0.0,
+        "peak_rss_mb": parent_rss,
+        "peak_worker_rss_mb": worker_rss,
+    }
+
+
+def main():
+    from api import config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV, Parquet or JSONL file")
+    parser.add_argument("output", help="CSV or JSONL file")
+    parser.add_argument("--artifacts", default=config.ARTIFACTS_PATH)
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes, defaults to the number of cores")
+    parser.add_argument("--engine", default=config.INFERENCE_ENGINE, choices=("xgboost", "numpy"))
+    parser.add_argument("--keep", nargs="*", default=[], metavar="COLUMN",
+                        help="input columns copied to the output, e.g. an identifier")
+    parser.add_argument("--zip-column", default=None, metavar="COLUMN",
+                        help="fill missing region, province and coordinates from this zip code column")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing output")
+    parser.add_argument("--quiet", action="store_true", help="only print the final report")
+    args = parser.parse_args()
+
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    try:
+        summary = bulk_score(
+            args.input,
+            args.output,
+            args.artifacts,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            engine=args.engine,
+            keep_columns=args.keep,
+            zip_column=args.zip_column,
+            resume=args.resume,
+            overwrite=args.overwrite,
+            log=log,
+        )
+    except KeyboardInterrupt:
+        print("Interrupted, run again with --resume to continue", file=sys.stderr)
+        sys.exit(130)
+    print(
+        f"Scored {summary['rows_this_run']:,} rows ({summary['rows']:,} in total, {summary['errors']:,} errors) "
+        f"in {summary['seconds']:.1f} s: {summary['rows_per_second']:,.0f} rows/s, "
+        f"peak RSS {summary['peak_rss_mb']:.0f} MB (parent), {summary['peak_worker_rss_mb']:.0f} MB (largest worker)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Loading of a model artifact bundle and the preprocessing built on it.
+
+A ``ModelBundle`` holds everything needed to score items with one artifact:
+the feature lists, the imputer, the one-hot encoder, the model, the
+precompiled ``FeatureAssembler`` and the selected inference engine.
+"""
+import contextlib
+import time
+from pathlib import Path
+
+import numpy as np
+
+from api.cache import file_checksum
+from api.features import FeatureAssembler
+from api.metrics import metrics
+from api.split_artifacts import is_split, load_split_artifacts
+
+ENGINES = ("xgboost", "numpy")
+
+
+def _untimed(name):
+    return contextlib.nullcontext()
+
+
+class ModelBundle:
+    """A loaded artifact bundle, ready to score feature matrices."""
+
+    def __init__(self, artifacts, checksum, path, version=None, engine="xgboost", threads=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown inference engine {engine!r}, expected one of {ENGINES}")
+
+        self.path = path
+        self.checksum = checksum
+        self.version = version or Path(path).stem
+        self.engine = engine
+        # Seconds spent loading and warming up this bundle
+        self.timings = {}
+
+        # Unpack the artifacts
+        self.num_features = artifacts["features"]["num_features"]
+        self.fl_features = artifacts["features"]["fl_features"]
+        self.cat_features = artifacts["features"]["cat_features"]
+
+        self.imputer = artifacts["imputer"]
+        self.enc = artifacts["enc"]
+        # None for a split directory loaded for the NumPy engine
+        self.model = artifacts["model"]
+
+        # Pin XGBoost's thread count so concurrent inference jobs do not oversubscribe cores
+        if threads is not None and self.model is not None:
+            self.model.set_params(n_jobs=threads)
+
+        # Precompiled feature assembler used by the single item hot path
+        self.assembler = FeatureAssembler.from_artifacts(artifacts)
+        self.feature_names_out = self.enc.get_feature_names_out()
+
+        # Known categories per categorical feature, used to reject unknown values row by row
+        self.known_categories = {
+            feature: set(categories) for feature, categories in zip(self.cat_features, self.enc.categories_)
+        }
+
+        # Select the inference engine
+        if engine == "numpy":
+            from api.tree_engine import TreeEnsemble
+
+            ensemble = artifacts.get("tree_ensemble") or TreeEnsemble.from_booster(self.model)
+            self.predict_features = ensemble.predict
+        else:
+            self.predict_features = self.model.predict
+
+    @classmethod
+    def load(cls, path, version=None, engine="xgboost", threads=None):
+        """Loads a joblib artifact bundle or a split directory from ``path``.
+
+        The version defaults to the file name, without its suffix.
+        """
+        start = time.perf_counter()
+        if is_split(path):
+            # The booster is only needed by the xgboost engine
+            artifacts, checksum = load_split_artifacts(path, booster=engine == "xgboost")
+        else:
+            import joblib
+
+            artifacts, checksum = joblib.load(path), file_checksum(path)
+        bundle = cls(artifacts, checksum, path, version=version, engine=engine, threads=threads)
+        bundle.timings["artifact_load"] = time.perf_counter() - start
+        return bundle
+
+    def preprocess(self, input_data):
+        """Turns a DataFrame of raw input rows into the feature matrix expected by the model."""
+        import pandas as pd
+
+        # Apply preprocessing transformations
+        with metrics.stage("impute"):
+            input_data[self.num_features] = self.imputer.transform(input_data[self.num_features])
+        with metrics.stage("encode"):
+            input_data_cat = self.enc.transform(input_data[self.cat_features]).toarray()
+
+        # Combine the numerical and one-hot encoded categorical columns
+        with metrics.stage("concat"):
+            return pd.concat(
+                [
+                    input_data[self.num_features + self.fl_features].reset_index(drop=True),
+                    pd.DataFrame(input_data_cat, columns=self.feature_names_out),
+                ],
+                axis=1,
+            )
+
+    def predict_rows(self, rows):
+        """Preprocesses validated rows with the pandas pipeline and predicts their prices."""
+        import pandas as pd
+
+        with metrics.stage("build_frame"):
+            input_data = pd.DataFrame(rows)
+        input_data = self.preprocess(input_data)
+        with metrics.stage("predict"):
+            return self.predict_features(input_data)
+
+    def score(self, records, record_metrics=True):
+        """Scores validated records with a single model call.
+
+        Returns the predictions of the records whose features could be built,
+        and a list holding, per record, None or the exception raised while
+        building its features. With ``record_metrics=False`` no stage timings
+        are recorded, for scoring that is not part of a request.
+        """
+        stage = metrics.stage if record_metrics else _untimed
+        with stage("assemble"):
+            input_data = np.empty((len(records), self.assembler.n_features))
+            errors = [None] * len(records)
+            valid = []
+            for index, record in enumerate(records):
+                try:
+                    self.assembler.assemble(record, out=input_data[index:index + 1])
+                    valid.append(index)
+                except Exception as e:
+                    errors[index] = e
+
+        if not valid:
+            return np.empty(0, dtype=np.float32), errors
+        with stage("predict"):
+            return self.predict_features(input_data[valid]), errors
+
+    def score_columns(self, columns, n_rows):
+        """Scores ``n_rows`` records given column by column, like ``score``."""
+        with metrics.stage("assemble"):
+            input_data, errors = self.assembler.assemble_columns(columns, n_rows)
+            valid = [index for index, error in enumerate(errors) if error is None]
+
+        if not valid:
+            return np.empty(0, dtype=np.float32), errors
+        if len(valid) < n_rows:
+            input_data = input_data[valid]
+        with metrics.stage("predict"):
+            return self.predict_features(input_data), errors
+
+    def score_grid(self, record, variations):
+        """Scores ``record`` and every combination of ``variations`` applied to it in one model call.
+
+        Returns the price of the record and the prices of the combinations,
+        in the order of ``FeatureAssembler.assemble_grid``.
+        """
+        with metrics.stage("assemble"):
+            input_data = np.concatenate([self.assembler.assemble(record), self.assembler.assemble_grid(record, variations)])
+        with metrics.stage("predict"):
+            prediction = self.predict_features(input_data)
+        return prediction[0], prediction[1:]
+
+    def unknown_category_errors(self, record):
+        """Lists the categorical values of a record that the encoder has never seen."""
+        return [
+            {
+                "type": "unknown_category",
+                "loc": [feature],
+                "msg": "Input should be one of the categories seen during training",
+                "input": record[feature],
+            }
+            for feature in self.cat_features
+            if record[feature] not in self.known_categories[feature]
+        ]
+
+    def sample_record(self):
+        """Builds a valid synthetic record, used to warm the model up."""
+        record = dict(zip(self.num_features, self.assembler.statistics.tolist()))
+        record.update({feature: 0 for feature in self.fl_features})
+        record.update({feature: str(categories[0]) for feature, categories in zip(self.cat_features, self.enc.categories_)})
+        return record
+
+    def warm_up(self):
+        """Runs synthetic predictions through both preprocessing paths; returns the elapsed seconds."""
+        start = time.perf_counter()
+        record = self.sample_record()
+        self.score([record])
+        self.predict_rows([record])
+        self.timings["warm_up"] = time.perf_counter() - start
+        return self.timings["warm_up"]
@@ -0,0 +1,163 @@
+"""Content-addressed prediction cache.
+
+Responses are cached under a SHA-256 of the normalized input record and the
+checksum of the model artifact, so resubmitting the same item skips
+preprocessing and inference, and swapping the artifact invalidates every
+entry without any explicit flush.
+"""
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# path -> (mtime, size, checksum), to hash each unchanged file only once
+_file_checksums = {}
+
+
+def cached_file_checksum(path):
+    """Returns the SHA-256 hex digest of a file, hashing it again only when its mtime or size changed."""
+    path = os.fspath(path)
+    stat = os.stat(path)
+    cached = _file_checksums.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+        cached = _file_checksums[path] = (stat.st_mtime, stat.st_size, file_checksum(path))
+    return cached[2]
+
+
+def cache_key(record, artifact_checksum):
+    """Hashes a validated record together with the checksum of the model that scores it."""
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{artifact_checksum}:{canonical}".encode()).hexdigest()
+
+
+class SQLiteCacheBackend:
+    """Shared cache store in a SQLite file, usable by several worker processes."""
+
+    # Expired rows are purged once every this many writes
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        # next() on a count is atomic, so the threads that call set() share it without a lock
+        self._writes = itertools.count(1)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM predictions WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO predictions (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl),
+        )
+        if next(self._writes) % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM predictions WHERE expires <= ?", (now,))
+
+
+class PredictionCache:
+    """Bounded in-process LRU cache with a time-to-live per entry.
+
+    An optional shared ``backend`` (see ``SQLiteCacheBackend``) is consulted
+    on local misses and written on every ``set``.
+    """
+
+    def __init__(self, maxsize, ttl, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the cached value for ``key``, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Caches ``value`` under ``key``, evicting the least recently used entries."""
+        self._store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared_backend": self.backend is not None,
+            }
@@ -0,0 +1,206 @@
+"""Sampled capture of the prediction requests, for replaying real traffic.
+
+``CaptureMiddleware`` records a sample of the requests to ``CAPTURE_PATHS``:
+the body, the status, the latency and the model version that served it.
+Requests that are not sampled go through untouched. Sampled ones only pay
+for copying the body chunks and putting one tuple on a bounded queue; when
+the queue is full, the capture is dropped rather than slowing the request.
+
+A ``CaptureWriter`` thread per process drains the queue, decodes the bodies
+and appends them in batches, one JSON line per request, to
+``requests-<pid>.jsonl`` in ``CAPTURE_DIR``. When the file reaches
+``CAPTURE_MAX_BYTES`` it is renamed with a timestamp and a new one is
+started; only the newest ``CAPTURE_MAX_FILES`` rotated files are kept.
+
+The lines are envelopes like those of ``requests.jsonl``, so a capture can
+be sent as is to ``/predict/stream`` or replayed with ``benchmarks.replay``:
+
+    {"request_id": "4242-17", "body": {...}, "method": "POST", "path": "/predict",
+     "ts": 1718000000.123, "status": 200, "latency_ms": 3.21, "model_version": "artifacts_xg"}
+"""
+import glob
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from api import fast_json
+
+logger = logging.getLogger(__name__)
+
+# Lines written per write() call at most
+WRITE_BATCH_SIZE = 1000
+
+
+class CaptureWriter:
+    """Background writer of the captured requests, batching appends and rotating files."""
+
+    def __init__(self, directory, max_bytes=64 * 2**20, max_files=10, queue_size=10000, flush_interval=1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._file = None
+        self._size = 0
+        self._sequence = 0
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.rotations = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"requests-{self._pid}.jsonl")
+
+    def _ensure_started(self):
+        # Forked workers inherit the writer of the parent without its thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, method, path, body, status, latency, model_version):
+        """Queues one request for writing; never blocks, drops it if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), method, path, body, status, latency, model_version))
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.captured += 1
+
+    def _encode(self, ts, method, path, body, status, latency, model_version):
+        self._sequence += 1
+        try:
+            decoded = fast_json.loads(body) if body else None
+        except ValueError:
+            decoded = body.decode("utf-8", "replace")
+        return fast_json.dumps({
+            "request_id": f"{self._pid}-{self._sequence}",
+            "body": decoded,
+            "method": method,
+            "path": path,
+            "ts": round(ts, 3),
+            "status": status,
+            "latency_ms": round(latency * 1e3, 3),
+            "model_version": model_version,
+        })
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(b"".join(self._encode(*entry) + b"\n" for entry in batch))
+                self.written += len(batch)
+            except Exception:
+                logger.exception("Writing %d captured requests failed", len(batch))
+        self._close_file()
+
+    def _write(self, data):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._close_file()
+        rotated = os.path.join(self.directory, f"requests-{self._pid}-{time.strftime('%Y%m%dT%H%M%S')}-{self.rotations}.jsonl")
+        os.replace(self.path, rotated)
+        self.rotations += 1
+        pattern = os.path.join(self.directory, f"requests-{self._pid}-*.jsonl")
+        for old in sorted(glob.glob(pattern), key=os.path.getmtime)[:-self.max_files or None]:
+            os.remove(old)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self, timeout=5.0):
+        """Writes the queued requests and stops the thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "written": self.written,
+            "queued": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
+
+
+class CaptureMiddleware:
+    """ASGI middleware that submits a sample of the requests to ``paths`` to a ``CaptureWriter``."""
+
+    def __init__(self, app, writer, paths, sample_rate=1.0, max_body_bytes=2**20):
+        self.app = app
+        self.writer = writer
+        self.paths = frozenset(paths)
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        size = 0
+        status = 500
+        model_version = None
+        start = time.perf_counter()
+
+        async def receive_and_copy():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size <= self.max_body_bytes:
+                body = message.get("body", b"")
+                size += len(body)
+                chunks.append(body)
+            return message
+
+        async def send_and_record(message):
+            nonlocal status, model_version
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"x-model-version":
+                        model_version = value.decode()
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_copy, send_and_record)
+        finally:
+            # Bodies too large to be worth keeping are left out
+            if size <= self.max_body_bytes:
+                self.writer.submit(
+                    scope["method"], scope["path"], b"".join(chunks), status, time.perf_counter() - start, model_version
+                )
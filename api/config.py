@@ -0,0 +1,104 @@
+"""Runtime configuration of the API, read from environment variables."""
+import os
+
+# Inference engine used by the prediction endpoints: "xgboost" calls
+# model.predict, "numpy" evaluates the trees with api.tree_engine, which
+# loads faster from split artifacts but scores batches more slowly
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "xgboost")
+
+# Path of the model artifact bundle
+ARTIFACTS_PATH = os.environ.get("ARTIFACTS_PATH", "api/models/artifacts_xg.joblib")
+
+# Zip code reference data (zip code, region, province, coordinates)
+ZIPCODES_PATH = os.environ.get("ZIPCODES_PATH", "streamlit/zipcodes.csv")
+
+# Localities of the zip codes, and the farthest a point can be from the
+# nearest zip code centroid for its location fields to be filled in
+# (see api/geocoding.py)
+LOCALITIES_PATH = os.environ.get("LOCALITIES_PATH", "streamlit/localities.json")
+GEOCODE_MAX_DISTANCE_KM = float(os.environ.get("GEOCODE_MAX_DISTANCE_KM", "20"))
+
+# Prediction cache: maximum number of entries (0 disables it), time-to-live in
+# seconds, and an optional SQLite file shared by all workers
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "3600"))
+CACHE_BACKEND_PATH = os.environ.get("CACHE_BACKEND_PATH") or None
+
+# Micro-batching of concurrent /predict requests: up to MICRO_BATCH_MAX_SIZE
+# items are scored together, waiting at most MICRO_BATCH_MAX_WAIT_MS for a
+# batch to fill. A max size of 0 or 1 scores every request on its own.
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "0"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# FAST_JSON=1 decodes /predict bodies and encodes its responses with orjson,
+# validating well-formed items without pydantic (see api/fast_json.py)
+FAST_JSON = os.environ.get("FAST_JSON", "0") == "1"
+
+# Number of lines of a /predict/stream upload scored together
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "500"))
+
+# Inference executor: concurrent inference jobs, jobs allowed to wait before
+# requests are rejected with 503, native (BLAS/OpenMP/XGBoost) threads per
+# job, and the Retry-After value sent with a 503
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "64"))
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "1"))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+
+# Production server (api/serve.py): number of forked workers, and requests
+# after which a worker is recycled (0 never recycles)
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", "0"))
+
+# Model registry: the directory of ARTIFACTS_PATH holds one <version>.joblib
+# bundle or <version>.split directory (see api/split_artifacts.py) per
+# version and is polled every MODEL_POLL_INTERVAL seconds (0 stops
+# watching); new versions are activated automatically with
+# MODEL_AUTO_ACTIVATE. ADMIN_TOKEN, when set, protects the /admin endpoints.
+MODEL_POLL_INTERVAL = float(os.environ.get("MODEL_POLL_INTERVAL", "5"))
+MODEL_AUTO_ACTIVATE = os.environ.get("MODEL_AUTO_ACTIVATE", "1") == "1"
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") or None
+
+# Metrics: METRICS_ENABLED=0 turns off all timers and the request middleware;
+# SERVER_TIMING=1 reports the per-stage durations in a Server-Timing header
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+# Precomputed price heatmaps (see api/heatmap.py): output directory, and the
+# step in degrees of the optional lat/lon grid (0 only scores the zip codes)
+HEATMAP_DIR = os.environ.get("HEATMAP_DIR", "api/heatmaps")
+HEATMAP_GRID_STEP = float(os.environ.get("HEATMAP_GRID_STEP", "0"))
+
+# Request capture (see api/capture.py), off unless CAPTURE_DIR is set: the
+# share of the requests to CAPTURE_PATHS that is recorded, the size at which
+# a capture file is rotated, the rotated files kept per worker, and the
+# requests allowed to wait for the writer before captures are dropped
+CAPTURE_DIR = os.environ.get("CAPTURE_DIR") or None
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", "1"))
+CAPTURE_PATHS = os.environ.get("CAPTURE_PATHS", "/predict,/predict/batch,/predict/sensitivity").split(",")
+CAPTURE_MAX_BYTES = int(os.environ.get("CAPTURE_MAX_BYTES", str(64 * 2**20)))
+CAPTURE_MAX_FILES = int(os.environ.get("CAPTURE_MAX_FILES", "10"))
+CAPTURE_QUEUE_SIZE = int(os.environ.get("CAPTURE_QUEUE_SIZE", "10000"))
+
+# Shadow evaluation (see api/shadow.py), off unless SHADOW_ARTIFACTS_PATH is
+# set: the share of the /predict requests also scored by the shadow bundle,
+# the records allowed to wait before new ones are dropped, and the records
+# scored per batch
+SHADOW_ARTIFACTS_PATH = os.environ.get("SHADOW_ARTIFACTS_PATH") or None
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", "1000"))
+SHADOW_BATCH_SIZE = int(os.environ.get("SHADOW_BATCH_SIZE", "256"))
+
+# Drift monitor (see api/drift.py): DRIFT_ENABLED=0 turns it off; records
+# buffered before the sketches are updated, and at most before new ones are
+# dropped; values tracked per categorical feature; the PSI and increase of
+# the unknown-category rate over the reference above which a feature is
+# reported as drifted; the reference snapshot, by default
+# <version>.drift.json next to the artifacts
+DRIFT_ENABLED = os.environ.get("DRIFT_ENABLED", "1") == "1"
+DRIFT_BATCH_SIZE = int(os.environ.get("DRIFT_BATCH_SIZE", "256"))
+DRIFT_MAX_PENDING = int(os.environ.get("DRIFT_MAX_PENDING", "16384"))
+DRIFT_HEAVY_HITTERS = int(os.environ.get("DRIFT_HEAVY_HITTERS", "64"))
+DRIFT_PSI_THRESHOLD = float(os.environ.get("DRIFT_PSI_THRESHOLD", "0.2"))
+DRIFT_UNKNOWN_RATE_THRESHOLD = float(os.environ.get("DRIFT_UNKNOWN_RATE_THRESHOLD", "0.01"))
+DRIFT_REFERENCE_PATH = os.environ.get("DRIFT_REFERENCE_PATH") or None
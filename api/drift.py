@@ -0,0 +1,622 @@
+"""Constant-memory monitor of the distribution of the scored features.
+
+A ``DriftMonitor`` keeps one sketch per feature of the active bundle:
+
+- numeric and flag features: a ``QuantileSketch``, log-spaced buckets with
+  a 1% relative accuracy (like DDSketch), plus the count of missing values
+  and the mean
+- categorical features: the most frequent values (``HeavyHitters``, the
+  Misra-Gries summary), the count of values the encoder has never seen,
+  and the most frequent of those unknown values
+
+Every sketch has a fixed size whatever the traffic. ``observe`` only
+appends the records to a buffer; every ``batch_size`` records the buffer is
+turned into columns and added to the sketches at once with NumPy.
+``/predict`` calls it from a background task once the response is sent,
+with the bundle that scored the record; the batch, stream and Arrow
+endpoints feed it the valid rows of each request.
+
+``snapshot`` returns the summaries, and with ``sketches=True`` the sketches
+themselves, so that a snapshot can be saved and used as a reference.
+``compare`` compares a snapshot with the reference of the model: the
+``<version>.drift.json`` file next to its artifacts, built from the
+training data with ``python -m api.drift reference``, or else what the
+artifacts themselves tell about the training data, the mean (or median)
+imputed for each number and the known categories. Numeric and categorical
+features get a population stability index (PSI) over the deciles or the
+frequent values of the reference, when the reference has sketches.
+
+Usage:
+    python -m api.drift reference training.csv --artifacts api/models/artifacts_xg.joblib
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+REFERENCE_SUFFIX = ".drift.json"
+
+# Relative accuracy of the quantiles, and the smallest and largest magnitudes
+# with their own bucket; smaller ones count as zero, larger ones go to the last bucket
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-3
+MAX_VALUE = 1e9
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+# Quantiles of the reference bounding the PSI bins of a numeric feature
+PSI_QUANTILES = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+# Floor of the bin shares in the PSI, so that empty bins do not make it infinite
+PSI_EPSILON = 1e-4
+
+
+def reference_path(artifacts_path):
+    """The reference snapshot of a joblib bundle or split directory: ``<version>.drift.json`` next to it."""
+    path = Path(artifacts_path)
+    return str(path.with_name(path.stem + REFERENCE_SUFFIX))
+
+
+class QuantileSketch:
+    """Streaming quantiles with a relative accuracy, in log-spaced buckets of fixed range."""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.offset = math.ceil(math.log(MIN_VALUE) / self._log_gamma)
+        size = math.ceil(math.log(MAX_VALUE) / self._log_gamma) - self.offset + 1
+        self.positive = np.zeros(size, dtype=np.int64)
+        # Allocated on the first negative value
+        self.negative = None
+        self.zero = 0
+        self.count = 0
+        self.missing = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _indices(self, magnitudes):
+        indices = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64) - self.offset
+        return np.clip(indices, 0, len(self.positive) - 1)
+
+    def update(self, values):
+        """Adds an array of values; NaNs count as missing."""
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.missing += len(values) - len(present)
+        if not len(present):
+            return
+        self.count += len(present)
+        self.sum += float(present.sum())
+        self.min = min(self.min, float(present.min()))
+        self.max = max(self.max, float(present.max()))
+
+        small = np.abs(present) < MIN_VALUE
+        self.zero += int(small.sum())
+        positive = present[(present > 0) & ~small]
+        if len(positive):
+            self.positive += np.bincount(self._indices(positive), minlength=len(self.positive))
+        negative = present[(present < 0) & ~small]
+        if len(negative):
+            if self.negative is None:
+                self.negative = np.zeros_like(self.positive)
+            self.negative += np.bincount(self._indices(-negative), minlength=len(self.negative))
+
+    def _bucket_value(self, index):
+        return 2 * self.gamma ** (index + self.offset) / (self.gamma + 1)
+
+    def _ordered(self):
+        """The bucket counts from the lowest to the highest value, with the value of each bucket."""
+        indices = np.nonzero(self.positive)[0]
+        counts = [self.zero] + self.positive[indices].tolist()
+        values = [0.0] + [self._bucket_value(index) for index in indices]
+        if self.negative is not None:
+            negative = np.nonzero(self.negative)[0][::-1]
+            counts = self.negative[negative].tolist() + counts
+            values = [-self._bucket_value(index) for index in negative] + values
+        return np.asarray(counts), np.asarray(values)
+
+    def quantiles(self, qs):
+        """Estimates the quantiles ``qs``, within the relative accuracy; None without values."""
+        if not self.count:
+            return [None] * len(qs)
+        counts, values = self._ordered()
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs) * (self.count - 1)
+        estimates = values[np.searchsorted(cumulative, ranks, side="right")]
+        # The extremes are known exactly
+        return [float(np.clip(value, self.min, self.max)) for value in estimates]
+
+    def shares(self, edges):
+        """The share of the values in each bin between ``edges`` (len(edges) + 1 bins), by bucket."""
+        counts, values = self._ordered()
+        bins = np.searchsorted(np.asarray(edges), values, side="left")
+        return np.bincount(bins, weights=counts, minlength=len(edges) + 1) / max(self.count, 1)
+
+    def to_dict(self):
+        data = {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "missing": self.missing,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero": self.zero,
+            # JSON object keys are strings
+            "positive": {str(index): int(self.positive[index]) for index in np.nonzero(self.positive)[0]},
+        }
+        if self.negative is not None:
+            data["negative"] = {str(index): int(self.negative[index]) for index in np.nonzero(self.negative)[0]}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.count, sketch.missing, sketch.sum, sketch.zero = data["count"], data["missing"], data["sum"], data["zero"]
+        if data["count"]:
+            sketch.min, sketch.max = data["min"], data["max"]
+        for index, count in data["positive"].items():
+            sketch.positive[int(index)] = count
+        if "negative" in data:
+            sketch.negative = np.zeros_like(sketch.positive)
+            for index, count in data["negative"].items():
+                sketch.negative[int(index)] = count
+        return sketch
+
+    def summary(self):
+        total = self.count + self.missing
+        return {
+            "count": self.count,
+            "missing_rate": round(self.missing / total, 6) if total else None,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "quantiles": dict(zip((f"p{round(q * 100)}" for q in QUANTILES), self.quantiles(QUANTILES))),
+        }
+
+
+class HeavyHitters:
+    """The most frequent values of a stream in ``size`` counters (Misra-Gries).
+
+    The count of every value is underestimated by at most ``error``, and
+    every value more frequent than ``total / (size + 1)`` is kept.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.counters = {}
+        self.total = 0
+        self.error = 0
+
+    def update(self, counts):
+        """Adds a mapping of values to their counts in a batch."""
+        counters = self.counters
+        for value, count in counts.items():
+            counters[value] = counters.get(value, 0) + count
+            self.total += count
+        if len(counters) > self.size:
+            # Decrementing every counter by the (size + 1)-th largest count keeps at most size of them
+            cut = sorted(counters.values(), reverse=True)[self.size]
+            self.counters = {value: count - cut for value, count in counters.items() if count > cut}
+            self.error += cut
+
+    def top(self, n=None):
+        return sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def to_dict(self):
+        return {"size": self.size, "total": self.total, "error": self.error, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["size"])
+        sketch.total, sketch.error, sketch.counters = data["total"], data["error"], dict(data["counters"])
+        return sketch
+
+
+class CategorySketch:
+    """Frequent values and unknown-category rate of a categorical feature."""
+
+    def __init__(self, known, size=64, unknown_size=16):
+        self.known = frozenset(known)
+        self.values = HeavyHitters(size)
+        self.unknown_values = HeavyHitters(unknown_size)
+        self.unknown = 0
+
+    def update(self, counts):
+        self.values.update(counts)
+        unknown = {value: count for value, count in counts.items() if value not in self.known}
+        if unknown:
+            self.unknown += sum(unknown.values())
+            self.unknown_values.update(unknown)
+
+    @property
+    def unknown_rate(self):
+        return self.unknown / self.values.total if self.values.total else None
+
+    def to_dict(self):
+        return {"unknown": self.unknown, "values": self.values.to_dict(), "unknown_values": self.unknown_values.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data, known=()):
+        sketch = cls(known)
+        sketch.unknown = data["unknown"]
+        sketch.values = HeavyHitters.from_dict(data["values"])
+        sketch.unknown_values = HeavyHitters.from_dict(data["unknown_values"])
+        return sketch
+
+    def summary(self, n=10):
+        return {
+            "count": self.values.total,
+            "unknown_rate": round(self.unknown_rate, 6) if self.unknown_rate is not None else None,
+            "top": [[value, count] for value, count in self.values.top(n)],
+            "top_unknown": [[value, count] for value, count in self.unknown_values.top(n)],
+            "count_error": self.values.error,
+        }
+
+
+def _to_floats(values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # A value that is not a number counts as missing
+        return np.asarray([value if isinstance(value, (int, float)) else None for value in values], dtype=np.float64)
+
+
+class DriftMonitor:
+    """Sketches of the features scored by one model, updated in batches by a background thread."""
+
+    def __init__(self, numeric_features, categorical_features, known_categories, version=None, checksum=None,
+                 batch_size=256, max_pending=16384, heavy_hitters=64, reference=None, flush_interval=1.0):
+        self.version = version
+        self.checksum = checksum
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.heavy_hitters = heavy_hitters
+        self.flush_interval = flush_interval
+        self.reference = reference
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.known_categories = known_categories
+        # _pending_lock guards the buffer, _lock the sketches
+        self._pending_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.observed = 0
+        self.dropped = 0
+        self.reset()
+
+    @classmethod
+    def from_bundle(cls, bundle, reference_file=None, **kwargs):
+        """Creates the monitor of a bundle, with the reference snapshot of its artifacts."""
+        return cls(
+            bundle.num_features + bundle.fl_features,
+            bundle.cat_features,
+            bundle.known_categories,
+            version=bundle.version,
+            checksum=bundle.checksum,
+            reference=load_reference(bundle, reference_file),
+            **kwargs,
+        )
+
+    def reset(self):
+        with self._pending_lock, self._lock:
+            self._pending = []
+            self.started = time.time()
+            self.numeric = {feature: QuantileSketch() for feature in self.numeric_features}
+            self.categorical = {
+                feature: CategorySketch(self.known_categories.get(feature, ()), self.heavy_hitters)
+                for feature in self.categorical_features
+            }
+
+    def _ensure_started(self):
+        # Forked workers inherit the monitor of the parent without its thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+                self._thread.start()
+
+    def observe(self, records):
+        """Buffers validated records for the sketches; never blocks on them, drops records if the buffer is full."""
+        self._ensure_started()
+        with self._pending_lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += len(records)
+                return
+            self._pending.extend(records)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Adds the buffered records to the sketches."""
+        with self._pending_lock:
+            records, self._pending = self._pending, []
+        if records:
+            self.update_records(records)
+
+    def close(self, timeout=5.0):
+        """Adds the buffered records and stops the thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout)
+        self.flush()
+
+    def update_records(self, records):
+        """Adds a batch of records to the sketches right away."""
+        self.update_columns({
+            feature: [record.get(feature) for record in records]
+            for feature in self.numeric_features + self.categorical_features
+        }, len(records))
+
+    def update_columns(self, columns, n_rows):
+        """Adds a batch given as columns: value sequences or, for categorical features, ``{value: count}`` mappings.
+
+        Features missing from ``columns`` are left unchanged.
+        """
+        with self._lock:
+            self._update_columns(columns)
+            self.observed += n_rows
+
+    def _update_columns(self, columns):
+        for feature, sketch in self.numeric.items():
+            if feature in columns:
+                sketch.update(_to_floats(columns[feature]))
+        for feature, sketch in self.categorical.items():
+            if feature in columns:
+                values = columns[feature]
+                counts = dict(values) if isinstance(values, dict) else Counter(values)
+                # Missing values are not a category
+                counts.pop(None, None)
+                sketch.update(counts)
+
+    def snapshot(self, sketches=False):
+        """Summaries of every feature; with ``sketches``, the sketches too, as needed by a reference."""
+        self.flush()
+        with self._lock:
+            snapshot = {
+                "format": FORMAT,
+                "model_version": self.version,
+                "started": self.started,
+                "created": time.time(),
+                "observed": self.observed,
+                "dropped": self.dropped,
+                "numeric": {feature: sketch.summary() for feature, sketch in self.numeric.items()},
+                "categorical": {feature: sketch.summary() for feature, sketch in self.categorical.items()},
+            }
+            if sketches:
+                snapshot["sketches"] = {
+                    "numeric": {feature: sketch.to_dict() for feature, sketch in self.numeric.items()},
+                    "categorical": {feature: sketch.to_dict() for feature, sketch in self.categorical.items()},
+                }
+        return snapshot
+
+    def report(self, psi_threshold=0.2, unknown_rate_threshold=0.01):
+        """The current summaries compared with the reference."""
+        snapshot = self.snapshot(sketches=True)
+        comparison = compare(snapshot, self.reference, psi_threshold, unknown_rate_threshold)
+        snapshot.pop("sketches")
+        return {
+            **comparison,
+            "reference": self.reference["source"] if self.reference else None,
+            "snapshot": snapshot,
+        }
+
+
+def load_reference(bundle, path=None):
+    """Loads the reference snapshot of a bundle, or builds one from its artifacts if there is no file."""
+    if path is not None and not os.path.isfile(path):
+        logger.warning("The drift reference %s does not exist, using the artifacts of %s", path, bundle.version)
+    path = path or reference_path(bundle.path)
+    if os.path.isfile(path):
+        with open(path) as f:
+            reference = json.load(f)
+        reference["source"] = path
+        return reference
+
+    # The artifacts only tell the value imputed for each number and the known categories
+    statistic = getattr(bundle.imputer, "strategy", "mean")
+    numeric = {
+        feature: {statistic: float(value)}
+        for feature, value in zip(bundle.num_features, bundle.assembler.statistics.tolist())
+        if statistic in ("mean", "median")
+    }
+    return {
+        "format": FORMAT,
+        "source": "artifacts",
+        "model_version": bundle.version,
+        "numeric": numeric,
+        "categorical": {feature: {"unknown_rate": 0.0} for feature in bundle.cat_features},
+    }
+
+
+def psi(expected, actual):
+    """Population stability index between two arrays of bin shares."""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), PSI_EPSILON)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def _relative_shift(current, reference):
+    if current is None or reference is None or reference == 0:
+        return None
+    return round(current / reference - 1, 6)
+
+
+def _compare_numeric(summary, current, reference):
+    result = {"count": summary["count"]}
+    if not current.count:
+        return result
+    if "mean" in reference:
+        result["mean_shift"] = _relative_shift(summary["mean"], reference["mean"])
+    if "median" in reference:
+        result["median_shift"] = _relative_shift(summary["quantiles"]["p50"], reference["median"])
+    if "quantiles" in reference:
+        result["quantile_shifts"] = {
+            name: _relative_shift(summary["quantiles"][name], value) for name, value in reference["quantiles"].items()
+        }
+        result["missing_rate_change"] = round(summary["missing_rate"] - reference["missing_rate"], 6)
+    sketch = reference.get("sketch")
+    if sketch is not None and sketch.count:
+        edges = np.unique(sketch.quantiles(PSI_QUANTILES))
+        result["psi"] = round(psi(sketch.shares(edges), current.shares(edges)), 6)
+    return result
+
+
+def _compare_categorical(summary, current, reference):
+    result = {"count": summary["count"], "unknown_rate": summary["unknown_rate"]}
+    if not current.values.total:
+        return result
+    result["unknown_rate_change"] = round(summary["unknown_rate"] - reference.get("unknown_rate", 0.0), 6)
+    sketch = reference.get("sketch")
+    if sketch is not None and sketch.values.total:
+        # Bins: the frequent values of the reference, and everything else
+        values = list(sketch.values.counters)
+        expected = [sketch.values.counters[value] / sketch.values.total for value in values]
+        actual = [current.values.counters.get(value, 0) / current.values.total for value in values]
+        result["psi"] = round(psi(expected + [max(1 - sum(expected), 0)], actual + [max(1 - sum(actual), 0)]), 6)
+        # Frequent now, but not among the frequent values of the reference
+        result["new_frequent_values"] = [
+            value for value, count in current.values.top(10)
+            if value not in sketch.values.counters and count / current.values.total >= 0.01
+        ]
+    return result
+
+
+def _reference_features(reference, kind):
+    """The reference of every feature of a kind, with its sketch rebuilt if the reference has them."""
+    features = {feature: dict(values) for feature, values in reference.get(kind, {}).items()}
+    sketch_class = QuantileSketch if kind == "numeric" else CategorySketch
+    for feature, data in reference.get("sketches", {}).get(kind, {}).items():
+        features.setdefault(feature, {})["sketch"] = sketch_class.from_dict(data)
+    return features
+
+
+def compare(snapshot, reference, psi_threshold=0.2, unknown_rate_threshold=0.01):
+    """Compares a snapshot holding sketches with a reference; lists the features that drifted."""
+    current_numeric = {feature: QuantileSketch.from_dict(data) for feature, data in snapshot["sketches"]["numeric"].items()}
+    current_categorical = {
+        feature: CategorySketch.from_dict(data) for feature, data in snapshot["sketches"]["categorical"].items()
+    }
+
+    reference = reference or {}
+    numeric_reference = _reference_features(reference, "numeric")
+    categorical_reference = _reference_features(reference, "categorical")
+    features, drifted = {}, []
+    for feature, sketch in current_numeric.items():
+        result = _compare_numeric(snapshot["numeric"][feature], sketch, numeric_reference.get(feature, {}))
+        features[feature] = result
+        if result.get("psi", 0) > psi_threshold:
+            drifted.append(feature)
+    for feature, sketch in current_categorical.items():
+        result = _compare_categorical(snapshot["categorical"][feature], sketch, categorical_reference.get(feature, {}))
+        features[feature] = result
+        if result.get("psi", 0) > psi_threshold or (result.get("unknown_rate_change") or 0) > unknown_rate_threshold:
+            drifted.append(feature)
+    return {"drifted": drifted, "features": features}
+
+
+def _reference_summary(snapshot):
+    """Turns a snapshot with sketches into a reference: the summaries the comparisons read, and the sketches."""
+    reference = {key: snapshot[key] for key in ("format", "model_version", "created", "observed", "sketches")}
+    reference["numeric"] = {
+        feature: {
+            "mean": summary["mean"],
+            "quantiles": summary["quantiles"],
+            "missing_rate": summary["missing_rate"],
+        }
+        for feature, summary in snapshot["numeric"].items()
+    }
+    reference["categorical"] = {
+        feature: {"unknown_rate": summary["unknown_rate"]} for feature, summary in snapshot["categorical"].items()
+    }
+    return reference
+
+
+def arrow_columns(table, monitor):
+    """The columns of an Arrow table that ``monitor`` sketches, in the form ``update_columns`` takes.
+
+    Categorical columns are counted by Arrow, so no Python object is
+    created per row. Columns that cannot be read as numbers are left out.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = {}
+    for feature in monitor.numeric_features:
+        if feature in table.column_names:
+            try:
+                columns[feature] = pc.cast(table.column(feature), pa.float64()).to_numpy()
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                continue
+    for feature in monitor.categorical_features:
+        if feature in table.column_names:
+            column = table.column(feature)
+            if pa.types.is_dictionary(column.type):
+                column = pc.cast(column, column.type.value_type)
+            counts = pc.value_counts(column)
+            columns[feature] = dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()))
+    return columns
+
+
+def build_reference(artifacts_path, input_path, out=None, chunk_size=50_000):
+    """Builds the reference snapshot of a bundle from a data file (CSV, Parquet or JSONL) and writes it."""
+    import pyarrow as pa
+
+    from api import fast_json
+    from api.bulk_score import INPUT_FORMATS, detect_format, read_chunks
+    from api.bundle import ModelBundle
+
+    bundle = ModelBundle.load(artifacts_path)
+    monitor = DriftMonitor.from_bundle(bundle)
+    for kind, payload in read_chunks(input_path, detect_format(input_path, INPUT_FORMATS), chunk_size):
+        if kind == "jsonl":
+            monitor.update_records([fast_json.loads(line) for line in payload])
+        else:
+            table = pa.ipc.open_stream(payload).read_all()
+            monitor.update_columns(arrow_columns(table, monitor), table.num_rows)
+
+    reference = _reference_summary(monitor.snapshot(sketches=True))
+    out = out or reference_path(artifacts_path)
+    with open(out, "w") as f:
+        json.dump(reference, f, ensure_ascii=False)
+    return out, reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    reference = subparsers.add_parser("reference", help="build the reference snapshot from the training data")
+    reference.add_argument("input", help="CSV, Parquet or JSONL file with one row per property")
+    reference.add_argument("--artifacts", required=True, help="joblib bundle or split directory")
+    reference.add_argument("--out", help="output file (default: <version>.drift.json next to the artifacts)")
+    args = parser.parse_args()
+
+    out, reference = build_reference(args.artifacts, args.input, args.out)
+    print(f"Wrote {out} from {reference['observed']} rows")
+
+
+if __name__ == "__main__":
+    main()
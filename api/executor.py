@@ -0,0 +1,91 @@
+"""Bounded thread pool that runs blocking inference off the event loop.
+
+At most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+wait; any job beyond that is rejected immediately with ``Overloaded`` so the
+API can answer 503 instead of letting latency grow without limit.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from threadpoolctl import threadpool_limits
+
+from api.metrics import metrics
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("The server is overloaded, please retry later")
+        self.retry_after = retry_after
+
+
+def pin_native_threads(threads):
+    """Limits the BLAS and OpenMP thread pools of this process to ``threads`` threads."""
+    threadpool_limits(limits=threads)
+
+
+class InferenceExecutor:
+    """Sized thread pool with a bounded admission queue and usage counters."""
+
+    def __init__(self, max_workers, max_queue, retry_after=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Runs ``fn(*args)`` in the pool, or raises ``Overloaded`` if the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.retry_after)
+            self._pending += 1
+        # Run in a copy of the caller's context so per-request stage timings are kept
+        context = contextvars.copy_context()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, context.run, self._call, fn, args, time.perf_counter()
+            )
+        except BaseException:
+            # Not submitted (e.g. the pool is shut down): _call will not release the slot
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await future
+
+    def _call(self, fn, args, submitted):
+        if metrics.enabled:
+            metrics.record_stage("queue_wait", time.perf_counter() - submitted)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return fn(*args)
+        finally:
+            # Accounted here rather than in run(), so jobs whose caller went away still count
+            with self._lock:
+                self._in_flight -= 1
+                self._pending -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._pending - self._in_flight,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
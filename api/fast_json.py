@@ -0,0 +1,67 @@
+"""Fast decoding of ``/predict`` request bodies and encoding of responses.
+
+``ItemDecoder`` handles the common case of a well-formed item with a
+compiled JSON decoder and one type check per field: every float field holds
+a JSON number, every int field a JSON integer and every str field a string.
+Anything else (numbers given as strings or booleans, fractional integers,
+wrong types, missing fields, invalid JSON) is left to pydantic, so the
+accepted values and the validation errors are exactly those of the model.
+Fields the model does not declare, like the ``equipped_kitchen`` sent by
+the Streamlit client, are ignored just as the model ignores them.
+
+orjson is used when it is installed, the standard ``json`` module otherwise.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    dumps = orjson.dumps
+else:
+    loads = json.loads
+
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":")).encode()
+
+
+class ItemDecoder:
+    """Decodes JSON bodies straight into the record dict of a pydantic model with float, int and str fields."""
+
+    def __init__(self, fields):
+        # (name, type) pairs in the model's field order
+        self.fields = [(name, field_type) for name, field_type in fields]
+        for name, field_type in self.fields:
+            if field_type not in (float, int, str):
+                raise TypeError(f"Field {name!r} has unsupported type {field_type!r}")
+
+    @classmethod
+    def from_model(cls, model):
+        return cls((name, field.annotation) for name, field in model.model_fields.items())
+
+    def decode(self, body):
+        """Returns the record of a well-formed body, or None if pydantic must validate it."""
+        try:
+            data = loads(body)
+        except ValueError:
+            return None
+        if type(data) is not dict:
+            return None
+
+        record = {}
+        try:
+            for name, field_type in self.fields:
+                value = data[name]
+                value_type = type(value)
+                if value_type is field_type:
+                    record[name] = value
+                elif field_type is float and value_type is int:
+                    record[name] = float(value)
+                else:
+                    return None
+        except (KeyError, OverflowError):
+            return None
+        return record
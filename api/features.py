@@ -0,0 +1,167 @@
+"""Pandas-free feature assembly for the prediction hot path.
+
+``FeatureAssembler`` is built once from the model artifacts and turns a
+single input record into the model's feature row with plain NumPy, giving
+the same values as the imputer -> one-hot encoder -> ``pd.concat`` pipeline
+used in ``api/app.py`` without building any DataFrame.
+"""
+import math
+
+import numpy as np
+
+
+class UnknownCategoryError(ValueError):
+    """Raised when a record holds a category the encoder has never seen."""
+
+    def __init__(self, feature, value):
+        super().__init__(f"Found unknown category {value!r} for feature '{feature}' during transform")
+        self.feature = feature
+        self.value = value
+
+
+class FeatureAssembler:
+    """Writes input records straight into preallocated model feature rows.
+
+    Column order is the one produced by the pandas pipeline: numeric
+    features, then flag features, then one-hot encoded categorical features
+    in ``enc.get_feature_names_out()`` order.
+    """
+
+    def __init__(self, num_features, fl_features, cat_features, statistics, categories):
+        self.num_features = list(num_features)
+        self.fl_features = list(fl_features)
+        self.cat_features = list(cat_features)
+        self.statistics = np.asarray(statistics, dtype=np.float64)
+
+        # Numeric and flag features occupy the first columns, in order
+        self.num_columns = list(enumerate(self.num_features))
+        offset = len(self.num_features)
+        self.fl_columns = [(offset + i, feature) for i, feature in enumerate(self.fl_features)]
+        offset += len(self.fl_features)
+
+        # One dict per categorical feature mapping each category to its one-hot column
+        self.cat_columns = []
+        self.feature_names = self.num_features + self.fl_features
+        for feature, feature_categories in zip(self.cat_features, categories):
+            lookup = {}
+            for category in feature_categories:
+                lookup[category] = offset
+                self.feature_names.append(f"{feature}_{category}")
+                offset += 1
+            self.cat_columns.append((feature, lookup))
+
+        self.n_features = offset
+        self.numeric_columns = {feature: column for column, feature in self.num_columns + self.fl_columns}
+        self.category_columns = dict(self.cat_columns)
+
+    @classmethod
+    def from_artifacts(cls, artifacts):
+        """Builds the assembler from the dict stored in ``artifacts_xg.joblib``."""
+        features = artifacts["features"]
+        return cls(
+            num_features=features["num_features"],
+            fl_features=features["fl_features"],
+            cat_features=features["cat_features"],
+            statistics=artifacts["imputer"].statistics_,
+            categories=artifacts["enc"].categories_,
+        )
+
+    def new_row(self):
+        """Allocates an empty feature matrix holding a single row."""
+        return np.zeros((1, self.n_features), dtype=np.float64)
+
+    def assemble(self, record, out=None):
+        """Fills a ``(1, n_features)`` row from a record dict and returns it.
+
+        Missing numeric values (NaN) are replaced by the imputer's statistics.
+        ``out`` may be passed to reuse a row from ``new_row``; it is reset
+        before being filled.
+        """
+        if out is None:
+            out = self.new_row()
+        else:
+            out.fill(0.0)
+        row = out[0]
+
+        statistics = self.statistics
+        for column, feature in self.num_columns:
+            value = float(record[feature])
+            row[column] = statistics[column] if math.isnan(value) else value
+
+        for column, feature in self.fl_columns:
+            row[column] = record[feature]
+
+        for feature, lookup in self.cat_columns:
+            value = record[feature]
+            column = lookup.get(value)
+            if column is None:
+                raise UnknownCategoryError(feature, value)
+            row[column] = 1.0
+
+        return out
+
+    def assemble_columns(self, columns, n_rows):
+        """Builds the feature matrix of many records given column by column.
+
+        ``columns`` maps each input feature to a sequence of ``n_rows``
+        values; numeric values may be None or NaN and are then imputed.
+        Returns the ``(n_rows, n_features)`` matrix and a list holding, per
+        row, None or the ``UnknownCategoryError`` of its first unknown
+        category. Rows with an error are left as zeros.
+        """
+        out = np.zeros((n_rows, self.n_features), dtype=np.float64)
+
+        for column, feature in self.num_columns:
+            values = np.asarray(columns[feature], dtype=np.float64)
+            out[:, column] = np.where(np.isnan(values), self.statistics[column], values)
+
+        for column, feature in self.fl_columns:
+            out[:, column] = np.asarray(columns[feature], dtype=np.float64)
+
+        errors = [None] * n_rows
+        rows = np.arange(n_rows)
+        for feature, lookup in self.cat_columns:
+            values = columns[feature]
+            codes = np.fromiter((lookup.get(value, -1) for value in values), dtype=np.intp, count=n_rows)
+            unknown = codes < 0
+            for index in np.flatnonzero(unknown).tolist():
+                if errors[index] is None:
+                    errors[index] = UnknownCategoryError(feature, values[index])
+            out[rows[~unknown], codes[~unknown]] = 1.0
+
+        invalid = [index for index, error in enumerate(errors) if error is not None]
+        out[invalid] = 0.0
+        return out, errors
+
+    def assemble_grid(self, record, variations):
+        """Builds the feature matrix of every combination of ``variations`` applied to ``record``.
+
+        ``variations`` is a list of ``(feature, values)`` pairs. The matrix
+        has one row per combination, in C order (the values of the last
+        feature vary fastest). The record is assembled once and its row
+        broadcast; each varied feature then only rewrites its own columns.
+        Raises ``UnknownCategoryError`` for an unknown category.
+        """
+        shape = tuple(len(values) for _, values in variations)
+        n_rows = math.prod(shape)
+        out = np.repeat(self.assemble(record), n_rows, axis=0)
+        rows = np.arange(n_rows)
+
+        # Position of every row along each axis of the grid
+        for positions, (feature, values) in zip(np.indices(shape).reshape(len(shape), n_rows), variations):
+            if feature in self.numeric_columns:
+                column = self.numeric_columns[feature]
+                values = np.asarray(values, dtype=np.float64)
+                if column < len(self.num_features):
+                    values = np.where(np.isnan(values), self.statistics[column], values)
+                out[:, column] = values[positions]
+            else:
+                lookup = self.category_columns[feature]
+                codes = []
+                for value in values:
+                    if value not in lookup:
+                        raise UnknownCategoryError(feature, value)
+                    codes.append(lookup[value])
+                out[:, list(lookup.values())] = 0.0
+                out[rows, np.asarray(codes, dtype=np.intp)[positions]] = 1.0
+        return out
@@ -0,0 +1,141 @@
+"""Reverse geocoding: the nearest known zip code of a point.
+
+``ZipcodeLocator`` builds a KD-tree (``scipy.spatial.cKDTree``) over the
+centroids of ``streamlit/zipcodes.csv``. Coordinates are projected to a
+plane first, with longitudes scaled by the cosine of the mean latitude, so
+that Euclidean distances in the tree are close to distances on the ground
+over an area the size of Belgium. A query then costs microseconds for a
+single point and is vectorized over arrays of points.
+
+``fill_location`` fills the ``province``, ``region`` and ``locality`` of an
+item from its coordinates, which lets clients send only a latitude and a
+longitude. ``get_locator()`` returns the locator of the configured files,
+built on first use only.
+"""
+import functools
+import json
+import math
+from typing import NamedTuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from api import config
+from api.zipcode_index import ZipcodeIndex, ZipcodeRecord, get_index
+
+# Length of one degree of latitude
+KM_PER_DEGREE = 111.195
+
+# Item fields filled in from the coordinates by ``fill_location``
+LOCATION_FIELDS = ("province", "region", "locality")
+
+
+class NearestZipcode(NamedTuple):
+    record: ZipcodeRecord
+    locality: str  # None when the zip code has no known locality
+    distance_km: float
+
+
+def load_localities(path):
+    """Reads ``localities.json`` (locality -> zip codes) into a zip code -> locality dict."""
+    with open(path, encoding="utf-8") as f:
+        localities = json.load(f)
+    return {zip_code: locality for locality, zip_codes in localities.items() for zip_code in zip_codes}
+
+
+class ZipcodeLocator:
+    """Nearest zip code of points given as latitude and longitude."""
+
+    def __init__(self, index: ZipcodeIndex, localities=None, max_distance_km=math.inf):
+        # Zip codes without coordinates cannot be located
+        known = ~(np.isnan(index.columns["latitude"]) | np.isnan(index.columns["longitude"]))
+        self.zip_codes = index.zip_codes[known]
+        latitudes = index.columns["latitude"][known]
+        longitudes = index.columns["longitude"][known]
+
+        self.index = index
+        self.localities = localities or {}
+        self.max_distance_km = max_distance_km
+        self._lon_scale = math.cos(math.radians(float(latitudes.mean())))
+        self._tree = cKDTree(self._project(latitudes, longitudes))
+
+    def __len__(self):
+        return len(self.zip_codes)
+
+    def _project(self, latitudes, longitudes):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        return np.column_stack((latitudes, longitudes * self._lon_scale))
+
+    def query(self, latitudes, longitudes):
+        """Locates arrays of points at once.
+
+        Returns the nearest zip code of every point and its distance in km.
+        Points farther than ``max_distance_km`` from any zip code, or with
+        NaN coordinates, get zip code -1 and an infinite distance.
+        """
+        points = self._project(latitudes, longitudes)
+        zip_codes = np.full(len(points), -1, dtype=np.int64)
+        distances = np.full(len(points), np.inf)
+
+        valid = np.isfinite(points).all(axis=1)
+        if valid.any():
+            found_distances, positions = self._tree.query(
+                points[valid], distance_upper_bound=self.max_distance_km / KM_PER_DEGREE
+            )
+            # Points out of range get the position len(tree)
+            found = positions < len(self.zip_codes)
+            rows = np.flatnonzero(valid)[found]
+            zip_codes[rows] = self.zip_codes[positions[found]]
+            distances[rows] = found_distances[found] * KM_PER_DEGREE
+        return zip_codes, distances
+
+    def nearest(self, latitude, longitude):
+        """Returns the ``NearestZipcode`` of a point, or None if it is out of range."""
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return None
+        distance, position = self._tree.query(
+            (latitude, longitude * self._lon_scale), distance_upper_bound=self.max_distance_km / KM_PER_DEGREE
+        )
+        if position == len(self.zip_codes):
+            return None
+        zip_code = int(self.zip_codes[position])
+        return NearestZipcode(self.index[zip_code], self.localities.get(zip_code), float(distance) * KM_PER_DEGREE)
+
+
+@functools.lru_cache(maxsize=None)
+def get_locator():
+    """Returns the locator of ``ZIPCODES_PATH`` and ``LOCALITIES_PATH``, built once per process."""
+    return ZipcodeLocator(
+        get_index(),
+        load_localities(config.LOCALITIES_PATH),
+        max_distance_km=config.GEOCODE_MAX_DISTANCE_KM,
+    )
+
+
+def _coordinate(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    return None
+
+
+def fill_location(data, locator=None):
+    """Returns ``data`` with its missing ``LOCATION_FIELDS`` filled in from its coordinates.
+
+    A field is missing when it is absent or None. ``data`` is returned
+    unchanged when nothing is missing, when its coordinates are not numbers
+    or when no zip code is in range, so that validation reports the
+    missing fields as usual.
+    """
+    missing = [name for name in LOCATION_FIELDS if data.get(name) is None]
+    if not missing:
+        return data
+    latitude, longitude = _coordinate(data.get("latitude")), _coordinate(data.get("longitude"))
+    if latitude is None or longitude is None:
+        return data
+
+    nearest = (locator or get_locator()).nearest(latitude, longitude)
+    if nearest is None:
+        return data
+    found = {"province": nearest.record.province, "region": nearest.record.region, "locality": nearest.locality}
+    return {**data, **{name: found[name] for name in missing if found[name] is not None}}
@@ -0,0 +1,364 @@
+"""Precomputed price heatmaps over the Belgian zip codes.
+
+For a few canonical property profiles (``PROFILES``), the price of the
+profile is predicted at the centroid of every zip code of ``zipcodes.csv``,
+and optionally on a regular latitude/longitude grid, in one batch per
+profile. The results are stored in ``HEATMAP_DIR``:
+
+- ``prices-<build>.npy``: float32 array of shape (profiles, zip codes), NaN
+  where a zip code has no coordinates or could not be scored
+- ``grid-<build>.npy``: float32 array of shape (profiles, latitudes,
+  longitudes), only with a grid; NaN for points out of range of any zip code
+- ``manifest.json``: the checksum and version of the model, the zip codes,
+  the row and checksum of every profile, the grid, and the names of the
+  array files of the build
+
+The arrays are plain ``.npy`` files, opened memory-mapped by
+``HeatmapStore``, which serves a profile's layer in milliseconds. Every
+file is written under a unique temporary name and renamed into place; the
+arrays of a build have their own names and the manifest is replaced last,
+so a reader always pairs a manifest with the arrays it describes. Builds
+take an exclusive lock on the directory: when the forked workers of
+``api.serve`` all notice a new model, one scores it and the others then
+find the heatmap up to date.
+
+``build_heatmap`` is incremental: the rows of the profiles that are
+unchanged since the last build, scored by the same model, are copied over
+instead of being scored again. A new model checksum makes every row
+stale. The API rebuilds in the background when the active model no longer
+matches the manifest.
+
+Usage:
+    python -m api.heatmap [--grid-step 0.05]
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from api import config
+from api.geocoding import get_locator
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+LOCK = ".build.lock"
+# Array files of the builds written before they had their own names
+PRICES = "prices.npy"
+GRID = "grid.npy"
+
+# Canonical properties; the location fields come from each zip code
+PROFILES = {
+    "apartment": {
+        "property_type": "APARTMENT",
+        "subproperty_type": "APARTMENT",
+        "nbr_bedrooms": 2.0,
+        "total_area_sqm": 90.0,
+        "surface_land_sqm": 0.0,
+        "nbr_frontages": 2.0,
+        "terrace_sqm": 10.0,
+        "garden_sqm": 0.0,
+        "fl_terrace": 1,
+        "fl_garden": 0,
+        "fl_swimming_pool": 0,
+        "heating_type": "GAS",
+        "state_building": "GOOD",
+        "epc": "C",
+    },
+    "house": {
+        "property_type": "HOUSE",
+        "subproperty_type": "HOUSE",
+        "nbr_bedrooms": 3.0,
+        "total_area_sqm": 160.0,
+        "surface_land_sqm": 500.0,
+        "nbr_frontages": 3.0,
+        "terrace_sqm": 20.0,
+        "garden_sqm": 200.0,
+        "fl_terrace": 1,
+        "fl_garden": 1,
+        "fl_swimming_pool": 0,
+        "heating_type": "GAS",
+        "state_building": "GOOD",
+        "epc": "C",
+    },
+}
+
+
+def profile_checksum(profile):
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()
+
+
+def _score_points(bundle, profile, latitudes, longitudes, zip_codes, locator):
+    """Scores ``profile`` at the given points, located in the given zip codes (-1: none).
+
+    Returns a float32 array of prices, NaN for the points that have no
+    coordinates, no known zip code or could not be scored.
+    """
+    prices = np.full(len(latitudes), np.nan, dtype=np.float32)
+    matches = locator.index.lookup_many(zip_codes)
+    rows = np.flatnonzero(matches["found"] & ~np.isnan(latitudes) & ~np.isnan(longitudes))
+    if not len(rows):
+        return prices
+
+    n_rows = len(rows)
+    columns = {feature: [value] * n_rows for feature, value in profile.items()}
+    columns.update(
+        latitude=latitudes[rows],
+        longitude=longitudes[rows],
+        province=matches["province"][rows].tolist(),
+        region=matches["region"][rows].tolist(),
+        locality=[locator.localities.get(zip_code) for zip_code in zip_codes[rows].tolist()],
+    )
+    prediction, errors = bundle.score_columns(columns, n_rows)
+    prices[rows[[error is None for error in errors]]] = prediction
+    return prices
+
+
+def grid_points(locator, step):
+    """Returns the latitudes and longitudes of a regular grid over the zip code centroids."""
+    latitudes = locator.index.columns["latitude"]
+    longitudes = locator.index.columns["longitude"]
+    lat_axis = np.arange(np.nanmin(latitudes), np.nanmax(latitudes) + step, step)
+    lon_axis = np.arange(np.nanmin(longitudes), np.nanmax(longitudes) + step, step)
+    return lat_axis, lon_axis
+
+
+def _write_atomic(directory, name, write, mode="wb"):
+    """Writes a file through a uniquely named temporary file, renamed into place once complete."""
+    with tempfile.NamedTemporaryFile(mode, dir=directory, prefix=name + ".", suffix=".tmp", delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, os.path.join(directory, name))
+
+
+@contextmanager
+def _build_lock(directory):
+    """Holds an exclusive lock on ``directory`` across processes while a build runs."""
+    with open(os.path.join(directory, LOCK), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _array_files(manifest):
+    """The names of the prices and grid files of a build (None without a grid)."""
+    files = manifest.get("files", {"prices": PRICES, "grid": GRID})
+    return files["prices"], files["grid"] if manifest["grid"] else None
+
+
+def build_heatmap(bundle, directory=None, profiles=None, grid_step=None, locator=None):
+    """Scores the profiles that are missing or stale in ``directory`` and rewrites its files.
+
+    Waits for a build running in another process first. Returns the list
+    of the profiles that were scored.
+    """
+    directory = directory or config.HEATMAP_DIR
+    profiles = PROFILES if profiles is None else profiles
+    grid_step = config.HEATMAP_GRID_STEP if grid_step is None else grid_step
+    locator = locator or get_locator()
+    os.makedirs(directory, exist_ok=True)
+    with _build_lock(directory):
+        return _build(bundle, directory, profiles, grid_step, locator)
+
+
+def _build(bundle, directory, profiles, grid_step, locator):
+    zip_codes = locator.index.zip_codes
+    latitudes = locator.index.columns["latitude"]
+    longitudes = locator.index.columns["longitude"]
+    grid = None
+    if grid_step:
+        lat_axis, lon_axis = grid_points(locator, grid_step)
+        grid_lat, grid_lon = (axis.ravel() for axis in np.meshgrid(lat_axis, lon_axis, indexing="ij"))
+        grid_zip_codes, _ = locator.query(grid_lat, grid_lon)
+        grid = {"lat0": float(lat_axis[0]), "lon0": float(lon_axis[0]), "step": grid_step, "shape": [len(lat_axis), len(lon_axis)]}
+
+    # Rows of the previous build that can be reused as they are
+    previous = read_manifest(directory)
+    reusable = {}
+    if (
+        previous is not None
+        and previous["model_checksum"] == bundle.checksum
+        and previous["zip_codes"] == zip_codes.tolist()
+        and previous.get("grid") == grid
+    ):
+        prices_file, grid_file = _array_files(previous)
+        old_prices = np.load(os.path.join(directory, prices_file))
+        old_grid = np.load(os.path.join(directory, grid_file)) if grid else None
+        for name, entry in previous["profiles"].items():
+            if name in profiles and entry["checksum"] == profile_checksum(profiles[name]):
+                reusable[name] = (old_prices[entry["row"]], old_grid[entry["row"]] if grid else None)
+
+    prices = np.empty((len(profiles), len(zip_codes)), dtype=np.float32)
+    grid_prices = np.empty((len(profiles), *grid["shape"]), dtype=np.float32) if grid else None
+    scored = []
+    for row, (name, profile) in enumerate(profiles.items()):
+        if name in reusable:
+            prices[row], grid_row = reusable[name]
+            if grid:
+                grid_prices[row] = grid_row
+            continue
+        prices[row] = _score_points(bundle, profile, latitudes, longitudes, zip_codes, locator)
+        if grid:
+            grid_prices[row] = _score_points(bundle, profile, grid_lat, grid_lon, grid_zip_codes, locator).reshape(grid["shape"])
+        scored.append(name)
+
+    if not scored and previous is not None and set(previous["profiles"]) == set(profiles):
+        return scored
+
+    build = uuid.uuid4().hex[:12]
+    files = {"prices": f"prices-{build}.npy", "grid": f"grid-{build}.npy" if grid else None}
+    _write_atomic(directory, files["prices"], lambda f: np.save(f, prices))
+    if grid:
+        _write_atomic(directory, files["grid"], lambda f: np.save(f, grid_prices))
+    manifest = {
+        "model_checksum": bundle.checksum,
+        "model_version": bundle.version,
+        "created": time.time(),
+        "zip_codes": zip_codes.tolist(),
+        "profiles": {name: {"row": row, "checksum": profile_checksum(profile)} for row, (name, profile) in enumerate(profiles.items())},
+        "grid": grid,
+        "files": files,
+    }
+    # The manifest is replaced last: readers see either the old or the new build
+    _write_atomic(directory, MANIFEST, lambda f: json.dump(manifest, f), mode="w")
+
+    # Keep the arrays of the previous build for the readers that just read its manifest
+    keep = set(files.values()) | (set(_array_files(previous)) if previous is not None else set())
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and name not in keep:
+            os.remove(os.path.join(directory, name))
+    logger.info("Heatmap of %s scored with model %s", ", ".join(scored), bundle.version)
+    return scored
+
+
+class HeatmapStore:
+    """Read access to the heatmap files of a directory, memory-mapped and reloaded when rebuilt."""
+
+    def __init__(self, directory=None, locator=None):
+        self.directory = directory or config.HEATMAP_DIR
+        self.locator = locator
+        self.manifest = None
+        self._mtime = None
+        self._prices = None
+        self._grid = None
+        self._layers = {}
+        self._lock = threading.Lock()
+        # Background rebuild, one at a time
+        self._building = False
+
+    def _refresh(self):
+        """Reopens the files if the manifest changed; returns False if there is no heatmap yet."""
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if mtime != self._mtime:
+                # The arrays are the ones the manifest names, whatever was built since the stat
+                manifest = read_manifest(self.directory)
+                prices_file, grid_file = _array_files(manifest)
+                self._prices = np.load(os.path.join(self.directory, prices_file), mmap_mode="r")
+                self._grid = np.load(os.path.join(self.directory, grid_file), mmap_mode="r") if grid_file else None
+                self.manifest, self._mtime, self._layers = manifest, mtime, {}
+        return True
+
+    def is_current(self, checksum):
+        return self._refresh() and self.manifest["model_checksum"] == checksum
+
+    def profiles(self):
+        return list(self.manifest["profiles"]) if self._refresh() else []
+
+    def layer(self, profile, grid=False):
+        """Returns the ``[latitude, longitude, price]`` points of a profile, or None if unknown.
+
+        Points without a price are left out.
+        """
+        if not self._refresh() or profile not in self.manifest["profiles"] or (grid and self._grid is None):
+            return None
+        key = (profile, grid)
+        layer = self._layers.get(key)
+        if layer is None:
+            row = self.manifest["profiles"][profile]["row"]
+            if grid:
+                spec = self.manifest["grid"]
+                prices = np.asarray(self._grid[row]).ravel()
+                lat, lon = np.meshgrid(
+                    spec["lat0"] + spec["step"] * np.arange(spec["shape"][0]),
+                    spec["lon0"] + spec["step"] * np.arange(spec["shape"][1]),
+                    indexing="ij",
+                )
+                latitudes, longitudes = lat.ravel(), lon.ravel()
+            else:
+                prices = np.asarray(self._prices[row])
+                index = (self.locator or get_locator()).index
+                zip_codes = np.asarray(self.manifest["zip_codes"])
+                matches = index.lookup_many(zip_codes)
+                latitudes, longitudes = matches["latitude"], matches["longitude"]
+            known = ~np.isnan(prices)
+            points = np.column_stack((latitudes[known], longitudes[known], prices[known].astype(np.float64))).round(6)
+            layer = points.tolist()
+            self._layers[key] = layer
+        return layer
+
+    def rebuild_in_background(self, bundle, **kwargs):
+        """Starts ``build_heatmap`` for ``bundle`` in a thread, unless a build is already running."""
+        with self._lock:
+            if self._building:
+                return False
+            self._building = True
+
+        def run():
+            try:
+                build_heatmap(bundle, self.directory, **kwargs)
+            except Exception:
+                logger.exception("Building the heatmap failed")
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name="heatmap-build", daemon=True).start()
+        return True
+
+
+def main():
+    from api.bundle import ModelBundle
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifacts", default=config.ARTIFACTS_PATH, help="model artifact bundle")
+    parser.add_argument("--out", default=config.HEATMAP_DIR, help="output directory")
+    parser.add_argument("--grid-step", type=float, default=config.HEATMAP_GRID_STEP,
+                        help="also score a lat/lon grid with this step in degrees (0: no grid)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    start = time.perf_counter()
+    bundle = ModelBundle.load(args.artifacts)
+    scored = build_heatmap(bundle, args.out, grid_step=args.grid_step)
+    print(f"Scored {len(scored)} of {len(PROFILES)} profiles in {time.perf_counter() - start:.2f} s"
+          + (f": {', '.join(scored)}" if scored else " (up to date)"))
+
+
+if __name__ == "__main__":
+    main()
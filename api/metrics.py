@@ -0,0 +1,214 @@
+"""Low-overhead request metrics in the Prometheus text format.
+
+Code paths wrap their stages in ``metrics.stage("name")``; each stage's
+duration feeds a histogram and, when ``Server-Timing`` is enabled, is
+reported back to the client. ``MetricsMiddleware`` counts requests by route
+and status code and times them. With metrics disabled, ``stage`` returns a
+shared no-op context manager and the middleware passes requests straight
+through.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from api import config
+
+# Upper bounds in seconds, from 50 microseconds to 10 seconds
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Per-request state: the stage timings collected so far and the request start time
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+_request_start = contextvars.ContextVar("request_start", default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative histogram with one series per combination of label values."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_values=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per combination of label values."""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class _NullStage:
+    """Context manager that does nothing, used when metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """The metrics of the API process."""
+
+    def __init__(self, enabled=True, server_timing=False):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self.stage_seconds = Histogram(
+            "immo_stage_duration_seconds", "Duration of the stages of request processing.", ["stage"]
+        )
+        self.request_seconds = Histogram(
+            "immo_request_duration_seconds", "Duration of HTTP requests.", ["method", "route"]
+        )
+        self.requests = Counter("immo_requests_total", "HTTP requests by route and status code.", ["method", "route", "status"])
+
+    def stage(self, name):
+        """Times the enclosed block as stage ``name``."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record_stage(self, name, seconds):
+        self.stage_seconds.observe(seconds, (name,))
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, seconds))
+
+    def mark_since_request_start(self, name):
+        """Records the time elapsed since the request started as stage ``name``."""
+        start = _request_start.get()
+        if self.enabled and start is not None:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def render(self, extra_lines=()):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in (self.requests, self.request_seconds, self.stage_seconds):
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix, documentation, values):
+    """Renders the numeric values of a stats dict as Prometheus gauges."""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.extend([f"# HELP {name} {documentation} ({key}).", f"# TYPE {name} gauge", f"{name} {value}"])
+    return lines
+
+
+class MetricsMiddleware:
+    """ASGI middleware that counts and times requests and adds the Server-Timing header."""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stages = []
+        stages_token = _request_stages.set(stages)
+        start = time.perf_counter()
+        start_token = _request_start.set(start)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.metrics.server_timing:
+                    timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in stages]
+                    timings.append(f"total;dur={(time.perf_counter() - start) * 1000:.3f}")
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"server-timing", ", ".join(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            self.metrics.request_seconds.observe(time.perf_counter() - start, (scope["method"], route))
+            self.metrics.requests.inc((scope["method"], route, str(status)))
+            _request_stages.reset(stages_token)
+            _request_start.reset(start_token)
+
+
+# Metrics of this process
+metrics = Metrics(enabled=config.METRICS_ENABLED, server_timing=config.SERVER_TIMING)
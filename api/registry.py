@@ -0,0 +1,280 @@
+"""Registry of versioned model bundles with zero-downtime activation.
+
+Every ``<version>.joblib`` file in the models directory is a version, and
+so is every ``<version>.split`` directory (see ``api/split_artifacts.py``).
+When both exist, the split directory is loaded as long as it was converted
+from that joblib file; once the joblib file is replaced, the registry falls
+back to it until the split directory is converted again. The registry
+loads and warms a version before atomically swapping it in as the active
+bundle; requests that already hold the previous bundle finish on it.
+
+The active version and the activation history are persisted in
+``active_model.json`` in the same directory, so every worker process
+watching the directory converges on the same version, and an activation or
+rollback made through one worker is picked up by all of them. Updates of
+the pointer file hold an exclusive lock on ``active_model.lock``: when the
+workers all auto-activate a new file at once, the first one records it and
+the others find it already active.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from api.cache import cached_file_checksum
+from api.split_artifacts import MANIFEST, SUFFIX, check_sklearn_version, is_split, read_manifest
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = "active_model.json"
+POINTER_LOCK = "active_model.lock"
+
+# Versions kept in memory besides the active one, for fast rollbacks
+KEEP_LOADED = 1
+
+
+class UnknownVersion(KeyError):
+    """Raised when activating a version that is not in the models directory."""
+
+
+class ModelRegistry:
+    """Discovers, loads and activates the model bundles of a directory.
+
+    ``load_bundle(path, version)`` must return a loaded and warmed bundle.
+    """
+
+    def __init__(self, directory, load_bundle, default_version, poll_interval=5.0, auto_activate=True):
+        self.directory = Path(directory)
+        self.load_bundle = load_bundle
+        self.default_version = default_version
+        self.poll_interval = poll_interval
+        self.auto_activate = auto_activate
+
+        self.active = None
+        self._versions = {}  # version -> {"path", "mtime", "size", "status", "error", "loaded_at"}
+        self._bundles = {}  # version -> loaded bundle
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    @property
+    def pointer_path(self):
+        return self.directory / POINTER_FILE
+
+    def _split_is_current(self, directory, joblib_path):
+        """Tells whether a split directory was converted from the joblib file of the same version.
+
+        A directory converted with another scikit-learn version is not current either.
+        """
+        try:
+            manifest = read_manifest(directory)
+            check_sklearn_version(directory, manifest)
+            return manifest["checksum"] == cached_file_checksum(joblib_path)
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def scan(self):
+        """Refreshes the list of versions; returns the ones that are new or changed."""
+        changed = []
+        found = {path.stem: path for path in self.directory.glob("*.joblib")}
+        # A split directory takes precedence: it is the faster format of the same model
+        for path in self.directory.glob("*" + SUFFIX):
+            if not is_split(path):
+                continue
+            joblib_path = found.get(path.stem)
+            if joblib_path is not None and not self._split_is_current(path, joblib_path):
+                if self._versions.get(path.stem, {}).get("path") != str(joblib_path):
+                    logger.warning("%s is stale, loading %s until it is converted again", path, joblib_path)
+                continue
+            found[path.stem] = path
+        with self._lock:
+            for version, path in found.items():
+                # The manifest of a split directory is written last
+                stat = (path / MANIFEST if path.is_dir() else path).stat()
+                known = self._versions.get(version)
+                current = (str(path), stat.st_mtime, stat.st_size)
+                if known is not None and (known["path"], known["mtime"], known["size"]) == current:
+                    continue
+                if known is not None and version in self._bundles:
+                    # The file was replaced: the loaded bundle is stale
+                    self._bundles.pop(version)
+                self._versions[version] = {
+                    "path": str(path),
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "status": "available",
+                    "error": None,
+                    "loaded_at": None,
+                }
+                changed.append(version)
+            for version in set(self._versions) - set(found):
+                self._versions.pop(version)
+                self._bundles.pop(version, None)
+        return changed
+
+    def read_pointer(self):
+        try:
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": None, "history": []}
+
+    @contextmanager
+    def _pointer_lock(self):
+        """Serializes the read-modify-write of the pointer file across processes."""
+        with open(self.directory / POINTER_LOCK, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_pointer(self, active, history):
+        tmp_path = self.pointer_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"active": active, "history": history}, f)
+        os.replace(tmp_path, self.pointer_path)
+
+    def _load(self, version):
+        with self._lock:
+            if version in self._bundles:
+                return self._bundles[version]
+            if version not in self._versions:
+                self.scan()
+            if version not in self._versions:
+                raise UnknownVersion(version)
+            info = self._versions[version]
+            info["status"] = "loading"
+
+        # Load and warm up outside the lock: the active bundle keeps serving meanwhile
+        try:
+            bundle = self.load_bundle(info["path"], version)
+        except Exception as e:
+            with self._lock:
+                info["status"] = "failed"
+                info["error"] = repr(e)
+            raise
+
+        with self._lock:
+            info["status"] = "loaded"
+            info["loaded_at"] = time.time()
+            self._bundles[version] = bundle
+        return bundle
+
+    def _swap(self, version, bundle):
+        with self._lock:
+            previous = self.active
+            self.active = bundle
+            self._versions[version]["status"] = "active"
+            if previous is not None and previous.version != version and previous.version in self._versions:
+                self._versions[previous.version]["status"] = "loaded"
+
+            # Drop bundles that are neither active nor kept for rollbacks
+            history = self.read_pointer()["history"]
+            keep = {version, *history[-KEEP_LOADED:]}
+            for loaded in list(self._bundles):
+                if loaded not in keep:
+                    self._bundles.pop(loaded)
+                    self._versions[loaded]["status"] = "available"
+        logger.info("Activated model version %s", version)
+
+    def activate(self, version, record=True):
+        """Loads, warms and atomically activates ``version``; returns its bundle.
+
+        With ``record`` the activation is written to the pointer file, so the
+        other workers follow.
+        """
+        bundle = self._load(version)
+        with self._lock:
+            if record:
+                with self._pointer_lock():
+                    pointer = self.read_pointer()
+                    history = pointer["history"]
+                    current = pointer["active"] or (self.active.version if self.active is not None else None)
+                    if current is not None and current != version:
+                        history.append(current)
+                    self._write_pointer(version, history)
+            self._swap(version, bundle)
+        return bundle
+
+    def rollback(self):
+        """Re-activates the version that was active before the current one."""
+        with self._lock:
+            pointer = self.read_pointer()
+            if not pointer["history"]:
+                raise LookupError("There is no previous version to roll back to")
+            version = pointer["history"][-1]
+        bundle = self._load(version)
+        with self._lock:
+            with self._pointer_lock():
+                # Another worker may have changed the pointer while the version was loading
+                history = self.read_pointer()["history"]
+                if history and history[-1] == version:
+                    history.pop()
+                self._write_pointer(version, history)
+            self._swap(version, bundle)
+        return bundle
+
+    def initialize(self):
+        """Activates the persisted version, or the default one; returns the bundle."""
+        self.scan()
+        version = self.read_pointer()["active"] or self.default_version
+        try:
+            return self.activate(version, record=False)
+        except UnknownVersion:
+            if version == self.default_version:
+                raise
+            logger.error("Persisted model version %s not found, using %s", version, self.default_version)
+            return self.activate(self.default_version, record=False)
+
+    def sync(self):
+        """Follows the pointer file and auto-activates new versions; called by the watcher."""
+        changed = self.scan()
+        pointer = self.read_pointer()
+        active_version = self.active.version if self.active is not None else None
+
+        if pointer["active"] is not None and pointer["active"] != active_version:
+            self.activate(pointer["active"], record=False)
+        elif active_version in changed:
+            # The active version's file was replaced in place
+            self.activate(active_version, record=False)
+        elif self.auto_activate and changed:
+            with self._lock:
+                newest = max(changed, key=lambda version: self._versions[version]["mtime"])
+            self.activate(newest)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Model registry sync failed")
+
+    def start_watching(self):
+        """Starts polling the directory in a background thread."""
+        if self.poll_interval > 0 and self._watcher is None:
+            # Versions present at startup are not "new"
+            self.scan()
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def versions(self):
+        """Lists the known versions with their status."""
+        with self._lock:
+            self.scan()
+            active_version = self.active.version if self.active is not None else None
+            return [
+                {"version": version, "active": version == active_version, **info}
+                for version, info in sorted(self._versions.items())
+            ]
@@ -0,0 +1,213 @@
+"""Request models and scoring of validated records, shared by the API and its in-process clients.
+
+Nothing here builds the FastAPI app or loads a model: the functions take
+the ``ModelBundle`` to score with, so the Streamlit fallback can use them
+with a bundle of its own.
+"""
+import itertools
+import math
+from typing import Any, List, Optional, Union
+
+from pydantic import BaseModel, ValidationError, Field, model_validator, StrictFloat, StrictInt, StrictStr
+
+from api import geocoding
+from api.bundle import ModelBundle
+from api.metrics import metrics
+
+# Maximum number of variants scored by the sensitivity endpoint in a single call
+MAX_SENSITIVITY_GRID = 10_000
+
+
+class Item(BaseModel):
+    nbr_frontages: float = Field(..., example=2.0)
+    nbr_bedrooms: float = Field(..., example=3.0)
+    latitude: float = Field(..., example=50.8503)
+    longitude: float = Field(..., example=4.3517)
+    total_area_sqm: float = Field(..., example=150.0)
+    surface_land_sqm: float = Field(..., example=200.0)
+    terrace_sqm: float = Field(..., example=20.0)
+    garden_sqm: float = Field(..., example=50.0)
+    fl_terrace: int = Field(..., example=1)
+    fl_garden: int = Field(..., example=0)
+    fl_swimming_pool: int = Field(..., example=1)
+    province: str = Field(..., example="Brussels")
+    heating_type: str = Field(..., example="GAS")
+    state_building: str = Field(..., example="GOOD")
+    property_type: str = Field(..., example="APARTMENT")
+    epc: str = Field(..., example="C")
+    locality: str = Field(..., example="Brussels")
+    subproperty_type: str = Field(..., example="APARTMENT")
+    region: str = Field(..., example="Brussels-Capital")
+
+    @model_validator(mode="before")
+    @classmethod
+    def fill_location(cls, data: Any) -> Any:
+        """Fills a missing province, region or locality from the nearest zip code of the coordinates."""
+        if isinstance(data, dict):
+            return geocoding.fill_location(data)
+        return data
+
+    # @validator("province")
+    # def validate_province(cls, value):
+    #     # List of valid provinces
+    #     valid_provinces = ["Brussels", "Flemish", "Walloon"]
+
+    #     # Check if the provided province is in the list of valid provinces
+    #     if value not in valid_provinces:
+    #         raise ValueError("Invalid province. Please provide a valid province.")
+    #     return value
+
+
+class NumericRange(BaseModel):
+    start: float = Field(..., example=50.0)
+    stop: float = Field(..., example=300.0)
+    step: float = Field(..., gt=0, example=25.0)
+
+
+class Variation(BaseModel):
+    field: str = Field(..., example="total_area_sqm")
+    values: Optional[List[Union[StrictInt, StrictFloat, StrictStr]]] = Field(None, min_length=1, example=None)
+    range: Optional[NumericRange] = None
+
+
+class SensitivityRequest(BaseModel):
+    item: Item
+    variations: List[Variation] = Field(..., min_length=1, max_length=3)
+
+
+def format_price_ranges(prediction) -> List[dict]:
+    """Converts an array of predicted prices into formatted +/- 5% price ranges."""
+    # Calculate lower and upper bounds based on the percentage
+    lower_bound = prediction - (prediction * (5 / 100))
+    upper_bound = prediction + (prediction * (5 / 100))
+
+    return [
+        {"lower_bound": "{:,.0f}".format(int(lower)), "upper_bound": "{:,.0f}".format(int(upper))}
+        for lower, upper in zip(lower_bound, upper_bound)
+    ]
+
+
+def served_price(result: dict) -> float:
+    """Recovers the price of a response from its price range, to within a euro (the bounds are truncated)."""
+    bounds = result["price_range"]
+    return (int(bounds["lower_bound"].replace(",", "")) + int(bounds["upper_bound"].replace(",", ""))) / 2
+
+
+def score_records(records: List[dict], bundle: ModelBundle) -> list:
+    """Scores validated records with a single model call.
+
+    Returns one result per record: a response dict with the price range and
+    the model version, or the exception raised while building that record's
+    features.
+    """
+    prediction, errors = bundle.score(records)
+    with metrics.stage("format"):
+        price_ranges = iter(format_price_ranges(prediction))
+        return [
+            {"price_range": next(price_ranges), "model_version": bundle.version} if error is None else error
+            for error in errors
+        ]
+
+
+def validate_item(raw_item: Any, bundle: ModelBundle):
+    """Validates a raw item against ``Item`` and the known categories.
+
+    Returns ``(row, None)`` for a valid item, or ``(row, errors)`` with the
+    errors in the pydantic format; ``row`` is None unless the item only has
+    unknown categories.
+    """
+    try:
+        item = Item.model_validate(raw_item)
+    except ValidationError as e:
+        return None, e.errors(include_url=False, include_context=False)
+
+    row = item.dict()
+    errors = bundle.unknown_category_errors(row)
+    if errors:
+        return row, errors
+    return row, None
+
+
+# Pydantic's error type and wording for a value of the wrong type, per field type
+TYPE_ERRORS = {float: ("float_type", "a valid number"), int: ("int_type", "a valid integer"), str: ("string_type", "a valid string")}
+
+
+def variation_values(variations: List[Variation], bundle: ModelBundle):
+    """Checks the variations of a sensitivity request and lists their ``(field, values)`` pairs.
+
+    Returns ``(pairs, None)``, or ``(None, errors)`` with the errors in the
+    pydantic format, located in the request body.
+    """
+    model_features = set(bundle.num_features + bundle.fl_features + bundle.cat_features)
+    pairs, errors, seen = [], [], set()
+
+    def error(index, loc, error_type, msg, value):
+        errors.append({"type": error_type, "loc": ["body", "variations", index, *loc], "msg": msg, "input": value})
+
+    for index, variation in enumerate(variations):
+        field = variation.field
+        if field not in model_features or field not in Item.model_fields:
+            error(index, ["field"], "unknown_field", "Input should be a feature of the model", field)
+            continue
+        if field in seen:
+            error(index, ["field"], "duplicate_field", "Each field may be varied only once", field)
+            continue
+        seen.add(field)
+        field_type = Item.model_fields[field].annotation
+
+        if (variation.values is None) == (variation.range is None):
+            error(index, [], "values_or_range", "Exactly one of values and range should be given", None)
+            continue
+        if variation.range is not None:
+            if field_type is not float:
+                error(index, ["range"], "range_not_numeric", "Ranges are only accepted for float fields", field)
+                continue
+            start, stop, step = variation.range.start, variation.range.stop, variation.range.step
+            if stop < start:
+                error(index, ["range", "stop"], "less_than_start", "Input should be greater than or equal to start", stop)
+                continue
+            # The stop is included when it falls on a step, up to rounding errors
+            count = math.floor((stop - start) / step + 1e-9) + 1
+            if count > MAX_SENSITIVITY_GRID:
+                error(index, ["range"], "too_many_values", f"A range should have at most {MAX_SENSITIVITY_GRID} values", count)
+                continue
+            pairs.append((field, [round(start + position * step, 10) for position in range(count)]))
+            continue
+
+        values = []
+        for position, value in enumerate(variation.values):
+            if field_type is float and isinstance(value, (int, float)):
+                values.append(float(value))
+            elif field_type is int and isinstance(value, int):
+                values.append(value)
+            elif field_type is str and isinstance(value, str):
+                if value not in bundle.known_categories[field]:
+                    error(index, ["values", position], "unknown_category", "Input should be one of the categories seen during training", value)
+                values.append(value)
+            else:
+                error_type, description = TYPE_ERRORS[field_type]
+                error(index, ["values", position], error_type, f"Input should be {description}", value)
+        pairs.append((field, values))
+
+    if errors:
+        return None, errors
+    return pairs, None
+
+
+def score_sensitivity(record: dict, pairs: list, bundle: ModelBundle) -> dict:
+    """Scores a record and all the combinations of its variations, and builds the response table."""
+    base_price, prices = bundle.score_grid(record, pairs)
+    with metrics.stage("format"):
+        fields = [field for field, _ in pairs]
+        price_ranges = format_price_ranges(prices)
+        results = [
+            {**dict(zip(fields, combination)), "price": int(price), "price_range": price_range}
+            for combination, price, price_range in zip(itertools.product(*(values for _, values in pairs)), prices.tolist(), price_ranges)
+        ]
+        return {
+            "fields": fields,
+            "base": {"price": int(base_price), "price_range": format_price_ranges(base_price[None])[0]},
+            "results": results,
+            "n_variants": len(results),
+            "model_version": bundle.version,
+        }
@@ -0,0 +1,209 @@
+"""Production entry point: preload the model once, then fork uvicorn workers.
+
+The parent process imports ``api.app``, loads the artifacts, freezes the
+garbage collector so the preloaded objects are never written to again, and
+forks the workers. The model, encoder and imputer pages are therefore shared
+copy-on-write between all workers instead of being loaded once per worker.
+
+The parent never runs the model: warming up starts the OpenMP and BLAS thread
+pools, and a libgomp pool does not survive a fork (the children hang in their
+first parallel region). Each worker pins its thread pools and warms the model
+up right after the fork, before it accepts connections.
+
+The parent restarts workers that exit (e.g. after ``--max-requests``),
+performs a rolling restart on SIGHUP, and stops all workers gracefully on
+SIGTERM or SIGINT.
+
+Usage:
+    python -m api.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+logger = logging.getLogger("api.serve")
+
+
+class Arbiter:
+    """Forks, monitors and recycles the worker processes."""
+
+    def __init__(self, app, sock, workers, max_requests, graceful_timeout, post_fork=None):
+        self.app = app
+        self.post_fork = post_fork
+        self.sock = sock
+        self.n_workers = workers
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}  # pid -> ready flag
+        self.stopping = False
+        self.reload_requested = False
+        self.ready_read, self.ready_write = os.pipe()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = False
+            return pid
+        self._run_worker()
+
+    def _run_worker(self):
+        """Runs uvicorn in a forked child; never returns."""
+        os.close(self.ready_read)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+
+        ready_write = self.ready_write
+
+        async def notify_ready():
+            os.write(ready_write, f"{os.getpid()}\n".encode())
+
+        self.app.router.on_startup.append(notify_ready)
+
+        # Spread recycling over time so workers do not all restart at once
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, max(1, self.max_requests // 10))
+
+        config = uvicorn.Config(
+            self.app,
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            log_level="info",
+        )
+        exit_code = 0
+        try:
+            if self.post_fork is not None:
+                self.post_fork()
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except BaseException:
+            logger.exception("Worker %s crashed", os.getpid())
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _read_ready(self, timeout):
+        readable, _, _ = select.select([self.ready_read], [], [], timeout)
+        if readable:
+            for line in os.read(self.ready_read, 4096).decode().split():
+                pid = int(line)
+                if pid in self.workers:
+                    self.workers[pid] = True
+                    logger.info("Worker %s ready", pid)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None:
+                logger.info("Worker %s exited with status %s", pid, os.waitstatus_to_exitcode(status))
+
+    def _wait_ready(self, pid, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and pid in self.workers and not self.workers[pid]:
+            self._read_ready(0.1)
+            self._reap()
+        return self.workers.get(pid, False)
+
+    def rolling_restart(self):
+        """Replaces every worker one by one, waiting for each replacement to be ready."""
+        for old_pid in list(self.workers):
+            new_pid = self.spawn()
+            if not self._wait_ready(new_pid):
+                logger.error("Replacement worker %s did not become ready, keeping %s", new_pid, old_pid)
+                continue
+            os.kill(old_pid, signal.SIGTERM)
+
+    def stop(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self._reap()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        for _ in range(self.n_workers):
+            self.spawn()
+
+        while not self.stopping:
+            self._read_ready(0.5)
+            self._reap()
+            if self.reload_requested:
+                self.reload_requested = False
+                logger.info("Rolling restart of %d workers", len(self.workers))
+                self.rolling_restart()
+            # Respawn workers that exited (crash or --max-requests recycling)
+            while not self.stopping and len(self.workers) < self.n_workers:
+                self.spawn()
+
+        logger.info("Stopping %d workers", len(self.workers))
+        self.stop()
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+
+def main():
+    from api import config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS, help="defaults to the number of cores")
+    parser.add_argument("--max-requests", type=int, default=config.SERVER_MAX_REQUESTS,
+                        help="recycle a worker after about this many requests (0 disables)")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds a stopping worker may spend finishing in-flight requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    # Load the artifacts once in the parent, then keep them out of the garbage
+    # collector so the workers never touch (and copy) their pages. The workers
+    # warm the model up after the fork
+    start = time.perf_counter()
+    from api.app import app, load_model, warm_up_model
+    load_model(warm_up=False)
+    logger.info("Application loaded in %.2f s", time.perf_counter() - start)
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logger.info("Listening on http://%s:%d with %d workers", args.host, args.port, args.workers)
+
+    Arbiter(app, sock, args.workers, args.max_requests, args.graceful_timeout, post_fork=warm_up_model).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
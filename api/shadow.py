@@ -0,0 +1,239 @@
+"""Shadow evaluation of a candidate model on live traffic.
+
+A ``ShadowEvaluator`` receives a sample of the ``/predict`` records after
+their response is sent, with the price that was served and the bundle that
+scored it, and puts them on a bounded queue; when the queue is full, the
+record is dropped rather than slowing the request. A thread per process
+loads the shadow bundle (``SHADOW_ARTIFACTS_PATH``, a joblib bundle or a
+split directory), drains the queue in batches and scores each batch with
+the shadow bundle only. The served price is recovered from the price range
+of the response, so divergences below a euro are rounding.
+
+The divergence of every record feeds fixed-bucket histograms of the
+absolute error (in euros) and of the relative error (to the primary price),
+per ``region`` and ``property_type`` and overall. ``report`` returns them
+with the counts, means and bias of each group. The report is kept per
+process, like the cache statistics.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket holds everything above
+ABSOLUTE_ERROR_BUCKETS = (1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000)
+RELATIVE_ERROR_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+GROUP_FIELDS = ("region", "property_type")
+
+
+def _score(bundle, records):
+    """Predicts the prices of ``records``; returns them with the mask of the records that could be scored."""
+    predictions, errors = bundle.score(records, record_metrics=False)
+    valid = np.array([error is None for error in errors], dtype=bool)
+    prices = np.full(len(records), np.nan)
+    prices[valid] = predictions
+    return prices, valid
+
+
+class Divergence:
+    """Error histograms and sums of one group of records."""
+
+    __slots__ = ("count", "absolute", "relative", "sum_absolute", "sum_relative", "sum_signed_relative", "max_absolute")
+
+    def __init__(self):
+        self.count = 0
+        self.absolute = np.zeros(len(ABSOLUTE_ERROR_BUCKETS) + 1, dtype=np.int64)
+        self.relative = np.zeros(len(RELATIVE_ERROR_BUCKETS) + 1, dtype=np.int64)
+        self.sum_absolute = 0.0
+        self.sum_relative = 0.0
+        self.sum_signed_relative = 0.0
+        self.max_absolute = 0.0
+
+    def add(self, primary, shadow):
+        """Adds the divergence of the ``shadow`` prices from the ``primary`` prices."""
+        difference = shadow - primary
+        absolute = np.abs(difference)
+        signed_relative = difference / primary
+        relative = np.abs(signed_relative)
+        self.count += len(primary)
+        self.absolute += np.bincount(np.searchsorted(ABSOLUTE_ERROR_BUCKETS, absolute), minlength=len(self.absolute))
+        self.relative += np.bincount(np.searchsorted(RELATIVE_ERROR_BUCKETS, relative), minlength=len(self.relative))
+        self.sum_absolute += float(absolute.sum())
+        self.sum_relative += float(relative.sum())
+        self.sum_signed_relative += float(signed_relative.sum())
+        self.max_absolute = max(self.max_absolute, float(absolute.max()))
+
+    def summary(self):
+        count = max(self.count, 1)
+        return {
+            "count": self.count,
+            "mean_absolute_error": round(self.sum_absolute / count, 2),
+            "mean_relative_error": round(self.sum_relative / count, 6),
+            # Positive when the shadow model prices higher than the primary one
+            "mean_signed_relative_error": round(self.sum_signed_relative / count, 6),
+            "max_absolute_error": round(self.max_absolute, 2),
+            "absolute_error_histogram": _histogram(ABSOLUTE_ERROR_BUCKETS, self.absolute),
+            "relative_error_histogram": _histogram(RELATIVE_ERROR_BUCKETS, self.relative),
+        }
+
+
+def _histogram(buckets, counts):
+    """Lists the buckets as ``{"le": upper bound, "count": records}``, the last one with ``"le": None`` for +Inf."""
+    return [{"le": bound, "count": int(count)} for bound, count in zip(buckets + (None,), counts)]
+
+
+class ShadowEvaluator:
+    """Scores a sample of the primary traffic with a shadow bundle in the background."""
+
+    def __init__(self, path, load_bundle, sample_rate=1.0, queue_size=1000, batch_size=256, flush_interval=1.0):
+        self.path = path
+        self.load_bundle = load_bundle
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.bundle = None
+        self.load_error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._groups = {}
+        self._overall = Divergence()
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.errors = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        # Records compared per version of the primary model
+        self._primary_versions = {}
+
+    def start(self):
+        """Starts the worker of this process, which loads the shadow bundle first; does nothing if started."""
+        # Forked workers inherit the evaluator of the parent without its thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="shadow-evaluator", daemon=True)
+                self._thread.start()
+
+    def submit(self, record, price, primary_bundle):
+        """Samples a served request for shadow scoring; never blocks, drops it if the queue is full.
+
+        ``price`` is the price that was served and ``primary_bundle`` the bundle that scored it.
+        """
+        if random.random() >= self.sample_rate:
+            return
+        self.start()
+        try:
+            self._queue.put_nowait((record, price, primary_bundle.version))
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.submitted += 1
+
+    def _run(self):
+        try:
+            self.bundle = self.load_bundle(self.path, None)
+            logger.info("Shadow model %s loaded from %s", self.bundle.version, self.path)
+        except Exception as e:
+            self.load_error = repr(e)
+            logger.exception("Loading the shadow model %s failed", self.path)
+            return
+
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            start = time.perf_counter()
+            try:
+                self._evaluate(batch)
+            except Exception:
+                self.errors += len(batch)
+                logger.exception("Shadow scoring of %d records failed", len(batch))
+            self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+
+    def _evaluate(self, batch):
+        records = [record for record, _, _ in batch]
+        primary = np.array([price for _, price, _ in batch], dtype=np.float64)
+        shadow, valid = _score(self.bundle, records)
+        valid &= primary > 0
+        self.errors += int(len(records) - valid.sum())
+        if not valid.any():
+            return
+        primary, shadow = primary[valid], shadow[valid]
+        keys = [tuple(record.get(field) for field in GROUP_FIELDS) for record, ok in zip(records, valid) if ok]
+        versions = [version for (_, _, version), ok in zip(batch, valid) if ok]
+
+        groups = {}
+        for index, key in enumerate(keys):
+            groups.setdefault(key, []).append(index)
+        with self._lock:
+            self._overall.add(primary, shadow)
+            for key, indices in groups.items():
+                divergence = self._groups.get(key)
+                if divergence is None:
+                    divergence = self._groups[key] = Divergence()
+                divergence.add(primary[indices], shadow[indices])
+            for version in versions:
+                self._primary_versions[version] = self._primary_versions.get(version, 0) + 1
+            self.scored += len(keys)
+
+    def stop(self, timeout=5.0):
+        """Scores the queued records and stops the worker."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._thread.join(timeout)
+
+    def reset(self):
+        """Clears the histograms, e.g. after the primary or shadow model changed."""
+        with self._lock:
+            self._groups = {}
+            self._overall = Divergence()
+            self._primary_versions = {}
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "shadow_version": self.bundle.version if self.bundle is not None else None,
+            "load_error": self.load_error,
+            "sample_rate": self.sample_rate,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "scored": self.scored,
+            "errors": self.errors,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    def report(self, min_count=1):
+        """Returns the stats and the divergence overall and per group with at least ``min_count`` records."""
+        with self._lock:
+            overall = self._overall.summary()
+            primary_versions = dict(self._primary_versions)
+            groups = [
+                {**dict(zip(GROUP_FIELDS, key)), **divergence.summary()}
+                for key, divergence in self._groups.items()
+                if divergence.count >= min_count
+            ]
+        groups.sort(key=lambda group: group["count"], reverse=True)
+        return {**self.stats(), "primary_versions": primary_versions, "overall": overall, "groups": groups}
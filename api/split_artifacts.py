@@ -0,0 +1,313 @@
+"""Split artifact format: a directory that loads without unpickling.
+
+``joblib.load`` of ``artifacts_xg.joblib`` imports scikit-learn's pickled
+classes, unpickles the imputer, the encoder and the XGBoost model, and
+copies everything into the private heap of every process. ``split_artifacts``
+converts such a bundle into a ``<version>.split`` directory:
+
+- ``manifest.json``: format, checksum, scikit-learn version, feature lists,
+  encoder categories and imputer settings, and the SHA-256 of every other
+  file
+- ``imputer_statistics.npy``: the values imputed for missing numbers
+- ``model.ubj``: the XGBoost model in its native UBJSON format
+- ``trees/*.npy``: the trees compiled to flat arrays for the NumPy engine
+  (``api/tree_engine.py``)
+
+``load_split_artifacts`` rebuilds the artifacts dict of the joblib file
+from it. The arrays are opened with ``np.load(mmap_mode="r")``: their pages
+come from the page cache, shared by every worker and container of the
+host. With the NumPy engine the booster is not loaded at all, so a worker
+holds nothing of the model in private memory. The XGBoost engine still
+parses ``model.ubj`` into the booster's own memory.
+
+The manifest keeps the checksum of the joblib file it was converted from,
+so that caches keyed by the model checksum stay valid across formats. A
+split directory next to a ``<version>.joblib`` file whose checksum differs
+is stale: the bundle was retrained after the conversion, and
+``load_split_artifacts`` refuses to load it.
+
+The imputer and the encoder are rebuilt by setting the fitted attributes
+scikit-learn would have set, some of them private. The manifest records the
+scikit-learn version the directory was converted with, and a directory
+converted with another version is refused instead of being rebuilt with
+attributes that version may not use; the registry loads the joblib bundle
+until it is converted again.
+
+Usage:
+    python -m api.split_artifacts api/models/artifacts_xg.joblib [--out api/models/artifacts_xg.split]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+FORMAT = 3
+SUFFIX = ".split"
+MANIFEST = "manifest.json"
+BOOSTER_FILE = "model.ubj"
+STATISTICS_FILE = "imputer_statistics.npy"
+TREE_ARRAYS = ("feature", "threshold", "left", "default_left", "value", "roots")
+
+
+class UnsupportedArtifacts(ValueError):
+    """The bundle uses a preprocessing option the split format does not store."""
+
+
+class StaleSplit(ValueError):
+    """The split directory was converted from another version of its joblib bundle."""
+
+
+class IncompatibleSplit(ValueError):
+    """The split directory was converted with another scikit-learn version."""
+
+
+def is_split(path):
+    """Tells whether ``path`` is a split artifact directory."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{directory} has split format {manifest.get('format')!r}, expected {FORMAT}")
+    return manifest
+
+
+def source_path(directory):
+    """The joblib bundle a split directory is converted from: ``<version>.joblib`` next to it."""
+    return Path(directory).with_suffix(".joblib")
+
+
+def check_source(directory, manifest=None):
+    """Raises StaleSplit if the joblib bundle next to ``directory`` is not the one it was converted from."""
+    from api.cache import cached_file_checksum
+
+    source = source_path(directory)
+    if not source.is_file():
+        return
+    manifest = manifest or read_manifest(directory)
+    checksum = cached_file_checksum(source)
+    if manifest["checksum"] != checksum:
+        raise StaleSplit(
+            f"{directory} was converted from a bundle with checksum {manifest['checksum'][:12]}, "
+            f"but {source} has checksum {checksum[:12]}"
+        )
+
+
+def check_sklearn_version(directory, manifest=None):
+    """Raises IncompatibleSplit unless ``directory`` was converted with the installed scikit-learn."""
+    import sklearn
+
+    manifest = manifest or read_manifest(directory)
+    if manifest["sklearn_version"] != sklearn.__version__:
+        raise IncompatibleSplit(
+            f"{directory} was converted with scikit-learn {manifest['sklearn_version']}, "
+            f"but {sklearn.__version__} is installed"
+        )
+
+
+def read_features(path):
+    """Returns the feature lists of a joblib bundle or a split directory."""
+    if is_split(path):
+        return read_manifest(path)["features"]
+    import joblib
+
+    return joblib.load(path)["features"]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_supported(imputer, enc):
+    """Raises UnsupportedArtifacts unless the preprocessing is fully described by the manifest."""
+    problems = []
+    if not (isinstance(imputer.missing_values, float) and math.isnan(imputer.missing_values)):
+        problems.append(f"imputer missing_values={imputer.missing_values!r}")
+    if imputer.add_indicator:
+        problems.append("imputer add_indicator=True")
+    if enc.drop is not None:
+        problems.append(f"encoder drop={enc.drop!r}")
+    if getattr(enc, "_infrequent_enabled", False):
+        problems.append("encoder infrequent categories")
+    if problems:
+        raise UnsupportedArtifacts("Cannot split these artifacts: " + ", ".join(problems))
+
+
+def _model_params(model):
+    """The scikit-learn parameters of the model that are set, without NaN (the default ``missing``)."""
+    return {
+        name: value
+        for name, value in model.get_params().items()
+        if value is not None and not (isinstance(value, float) and math.isnan(value))
+    }
+
+
+def split_artifacts(artifacts, directory, checksum):
+    """Writes the artifacts dict of a joblib bundle to ``directory`` in the split format.
+
+    ``checksum`` identifies the model, normally the SHA-256 of the joblib
+    file. The directory is written next to its final place and renamed
+    into it, replacing any previous version.
+    """
+    import sklearn
+
+    from api.tree_engine import TreeEnsemble
+
+    imputer, enc, model = artifacts["imputer"], artifacts["enc"], artifacts["model"]
+    _check_supported(imputer, enc)
+    features = artifacts["features"]
+
+    directory = Path(directory)
+    tmp = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    (tmp / "trees").mkdir(parents=True)
+
+    np.save(tmp / STATISTICS_FILE, np.asarray(imputer.statistics_, dtype=np.float64))
+    model.save_model(tmp / BOOSTER_FILE)
+    ensemble = TreeEnsemble.from_booster(model)
+    for name in TREE_ARRAYS:
+        np.save(tmp / "trees" / f"{name}.npy", getattr(ensemble, name))
+
+    files = sorted(str(path.relative_to(tmp)) for path in tmp.rglob("*") if path.is_file())
+    manifest = {
+        "format": FORMAT,
+        "checksum": checksum,
+        "created": time.time(),
+        "sklearn_version": sklearn.__version__,
+        "features": features,
+        "imputer": {
+            "strategy": imputer.strategy,
+            "fill_value": imputer.fill_value,
+            "statistics": STATISTICS_FILE,
+        },
+        "encoder": {
+            "categories": [[str(value) for value in categories] for categories in enc.categories_],
+            "handle_unknown": enc.handle_unknown,
+            "dtype": np.dtype(enc.dtype).name,
+        },
+        "model": {"class": type(model).__name__, "file": BOOSTER_FILE, "params": _model_params(model)},
+        "trees": {
+            "arrays": {name: f"trees/{name}.npy" for name in TREE_ARRAYS},
+            "base_score": float(ensemble.base_score),
+            "max_depth": ensemble.max_depth,
+        },
+        "files": {name: _sha256(tmp / name) for name in files},
+    }
+    with open(tmp / MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+    if directory.exists():
+        old = directory.with_name(directory.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old)
+    else:
+        os.replace(tmp, directory)
+    return manifest
+
+
+def _build_imputer(settings, statistics, num_features):
+    from sklearn.impute import SimpleImputer
+
+    imputer = SimpleImputer(strategy=settings["strategy"], fill_value=settings["fill_value"])
+    imputer.statistics_ = statistics
+    imputer.n_features_in_ = len(num_features)
+    imputer.feature_names_in_ = np.asarray(num_features, dtype=object)
+    imputer._fit_dtype = np.dtype(np.float64)
+    imputer.indicator_ = None
+    return imputer
+
+
+def _build_encoder(settings, cat_features):
+    from sklearn.preprocessing import OneHotEncoder
+
+    enc = OneHotEncoder(handle_unknown=settings["handle_unknown"], dtype=np.dtype(settings["dtype"]).type)
+    enc.categories_ = [np.asarray(categories, dtype=object) for categories in settings["categories"]]
+    enc.n_features_in_ = len(cat_features)
+    enc.feature_names_in_ = np.asarray(cat_features, dtype=object)
+    enc._infrequent_enabled = False
+    enc.drop_idx_ = None
+    enc._drop_idx_after_grouping = None
+    enc._n_features_outs = [len(categories) for categories in enc.categories_]
+    return enc
+
+
+def load_split_artifacts(directory, booster=True, verify=False):
+    """Loads a split directory; returns the artifacts dict and the model checksum.
+
+    The dict has the keys of the joblib bundle, plus ``tree_ensemble``, a
+    ``TreeEnsemble`` over memory-mapped arrays. With ``booster=False``
+    ``model`` is None and ``model.ubj`` is not read. Raises StaleSplit if
+    the joblib bundle next to the directory has changed since the
+    conversion, and IncompatibleSplit if another scikit-learn version is
+    installed. ``verify`` also checks the SHA-256 of every file against
+    the manifest.
+    """
+    from api.tree_engine import TreeEnsemble
+
+    manifest = read_manifest(directory)
+    check_source(directory, manifest)
+    check_sklearn_version(directory, manifest)
+    if verify:
+        for name, digest in manifest["files"].items():
+            if _sha256(os.path.join(directory, name)) != digest:
+                raise ValueError(f"{os.path.join(directory, name)} does not match its checksum in the manifest")
+
+    features = manifest["features"]
+    statistics = np.load(os.path.join(directory, manifest["imputer"]["statistics"]), mmap_mode="r")
+    trees = manifest["trees"]
+    arrays = {name: np.load(os.path.join(directory, path), mmap_mode="r") for name, path in trees["arrays"].items()}
+
+    model = None
+    if booster:
+        import xgboost
+
+        model = getattr(xgboost, manifest["model"]["class"])()
+        model.load_model(os.path.join(directory, manifest["model"]["file"]))
+        # load_model fills in parameters the original model left unset, such
+        # as base_score rounded to 7 digits; set_params would push them into
+        # the booster and shift every prediction
+        params = manifest["model"]["params"]
+        model.set_params(**{name: params.get(name) for name in model.get_params() if name != "missing"})
+
+    artifacts = {
+        "features": features,
+        "imputer": _build_imputer(manifest["imputer"], statistics, features["num_features"]),
+        "enc": _build_encoder(manifest["encoder"], features["cat_features"]),
+        "model": model,
+        "tree_ensemble": TreeEnsemble(base_score=trees["base_score"], max_depth=trees["max_depth"], **arrays),
+    }
+    return artifacts, manifest["checksum"]
+
+
+def main():
+    import joblib
+
+    from api.cache import file_checksum
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("artifacts", help="joblib artifact bundle")
+    parser.add_argument("--out", help="output directory (default: the bundle path with a .split suffix)")
+    args = parser.parse_args()
+
+    out = args.out or str(Path(args.artifacts).with_suffix(SUFFIX))
+    manifest = split_artifacts(joblib.load(args.artifacts), out, file_checksum(args.artifacts))
+    size = sum(os.path.getsize(os.path.join(out, name)) for name in manifest["files"])
+    print(f"Wrote {out}: {len(manifest['files']) + 1} files, {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
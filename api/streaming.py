@@ -0,0 +1,66 @@
+"""Helpers for streaming newline-delimited JSON (NDJSON) in and out of the API.
+
+``NDJSONStreamingResponse`` lets a response generator read the request body
+while the response is being sent. Both directions are pulled one piece at a
+time: the next piece of the upload is only read once the previous results
+were handed to the server, so a slow reader slows the upload down instead of
+making the server buffer results.
+"""
+from starlette.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class LineTooLong(ValueError):
+    """Raised when an NDJSON line exceeds the maximum size."""
+
+    def __init__(self, line_number, max_bytes):
+        super().__init__(f"Line {line_number} is longer than {max_bytes} bytes")
+        self.line_number = line_number
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """Streaming response whose body iterator may consume the request body.
+
+    ``StreamingResponse`` listens for the client disconnecting by calling
+    ``receive()`` concurrently with the body iterator, which would swallow
+    the request body. Here only the body iterator calls ``receive()`` (via
+    ``request.stream()``), and a disconnect surfaces there as
+    ``ClientDisconnect``.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_lines(chunks, max_line_bytes):
+    """Splits an async iterator of byte chunks into ``(line_number, line)`` pairs.
+
+    Line numbers start at 1 and count blank lines, which are skipped. At most
+    one partial line is buffered; ``LineTooLong`` is raised if it grows
+    beyond ``max_line_bytes``.
+    """
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in chunks:
+        # The buffered partial line holds no newline: only search the new chunk
+        search = len(buffer)
+        buffer += chunk
+        start = 0
+        end = buffer.find(b"\n", search)
+        while end >= 0:
+            line_number += 1
+            line = bytes(buffer[start:end])
+            if line.strip():
+                yield line_number, line
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(line_number + 1, max_line_bytes)
+    if buffer.strip():
+        yield line_number + 1, bytes(buffer)
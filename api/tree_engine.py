@@ -0,0 +1,134 @@
+"""NumPy evaluator for the XGBoost tree ensemble.
+
+The booster's trees are flattened once into parallel arrays (split feature,
+threshold, left child, default direction for missing values and leaf value)
+and rows are evaluated by walking all trees at once with vectorized
+indexing, one depth level per step. Predictions match
+``XGBRegressor.predict`` for the ``reg:squarederror`` gbtree models this
+API ships with.
+
+It is not a speedup over XGBoost beyond a single row: each level costs a
+few NumPy passes over a (rows x trees) array, while XGBoost walks the trees
+in compiled code. On the shipped model (130 trees, depth 9),
+``python -m benchmarks.tree_engine`` measures 0.17 ms against 0.20 ms for
+XGBoost on one row, 1.9 ms against 1.2 ms on 100 rows and 175 ms against
+67 ms on 10,000 rows.
+
+It is meant for the split artifact format, where the arrays are
+memory-mapped: a worker loads the model in milliseconds and shares it with
+the other workers.
+"""
+import json
+
+import numpy as np
+
+# Rows evaluated per traversal, keeps the (rows x trees) work arrays small
+CHUNK_SIZE = 4096
+
+
+class TreeEnsemble:
+    """Flat-array representation of a gradient boosted tree ensemble.
+
+    The right child of a split is the node after its left child, so a step
+    is ``left[node] + go_right``. Leaves point to themselves and have a NaN
+    threshold, which no value passes, so every row can be walked for
+    ``max_depth`` steps without tracking which rows already reached a leaf.
+    The node indices are ``np.intp``, which ``take`` uses without a copy.
+    """
+
+    def __init__(self, feature, threshold, left, default_left, value, roots, base_score, max_depth):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.base_score = np.float32(base_score)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Compiles an ``xgboost.Booster`` (or a fitted ``XGBRegressor``)."""
+        if hasattr(booster, "get_booster"):
+            booster = booster.get_booster()
+        return cls.from_json(json.loads(booster.save_raw("json")))
+
+    @classmethod
+    def from_json(cls, model):
+        """Compiles a booster from its parsed JSON model document."""
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree" or objective != "reg:squarederror":
+            raise ValueError(f"Unsupported model: {booster['name']} booster with {objective} objective")
+
+        feature, threshold, left, default_left, value, roots = [], [], [], [], [], []
+        max_depth = 0
+        for tree in booster["model"]["trees"]:
+            if tree["split_type"] and any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+
+            offset = len(feature)
+            roots.append(offset)
+            depth = [0] * len(tree["left_children"])
+            for node, (lo, hi) in enumerate(zip(tree["left_children"], tree["right_children"])):
+                if lo == -1:
+                    # Leaf: its value is stored in split_conditions
+                    feature.append(0)
+                    threshold.append(np.nan)
+                    left.append(offset + node)
+                    default_left.append(True)
+                    value.append(tree["split_conditions"][node])
+                else:
+                    if hi != lo + 1:
+                        raise ValueError("The children of a split are not consecutive nodes")
+                    feature.append(tree["split_indices"][node])
+                    threshold.append(tree["split_conditions"][node])
+                    left.append(offset + lo)
+                    default_left.append(bool(tree["default_left"][node]))
+                    value.append(0.0)
+                    depth[lo] = depth[hi] = depth[node] + 1
+            max_depth = max(max_depth, max(depth))
+
+        base_score = float(learner["learner_model_param"]["base_score"])
+        return cls(feature, threshold, left, default_left, value, roots, base_score, max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        """Predicts a 1-d float32 array for a 2-d feature matrix."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2-d feature matrix, got {X.ndim} dimensions")
+        if len(X) <= CHUNK_SIZE:
+            return self._predict_chunk(X)
+        return np.concatenate(
+            [self._predict_chunk(X[start:start + CHUNK_SIZE]) for start in range(0, len(X), CHUNK_SIZE)]
+        )
+
+    def _predict_chunk(self, X):
+        n_rows, n_features = X.shape
+        # Flat indices so a single take() gathers one feature value per (row, tree)
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        flat_X = X.ravel()
+        node = np.tile(self.roots, (n_rows, 1))
+        has_missing = np.isnan(flat_X).any()
+
+        for _ in range(self.max_depth):
+            index = self.feature.take(node)
+            index += row_offsets
+            fvalue = flat_X.take(index)
+            # XGBoost goes left when the value is below the threshold; NaN compares false
+            go_right = fvalue >= self.threshold.take(node)
+            if has_missing:
+                go_right |= np.isnan(fvalue) & ~self.default_left.take(node)
+            node = self.left.take(node)
+            node += go_right
+
+        # cumsum adds sequentially in float32, in the same order as XGBoost
+        leaves = np.empty((n_rows, self.n_trees + 1), dtype=np.float32)
+        leaves[:, 0] = self.base_score
+        self.value.take(node, out=leaves[:, 1:])
+        return np.cumsum(leaves, axis=1, dtype=np.float32)[:, -1]
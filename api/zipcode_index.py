@@ -0,0 +1,134 @@
+"""Indexed lookup of the Belgian zip codes listed in ``streamlit/zipcodes.csv``.
+
+``ZipcodeIndex`` reads the file once into a dict of ``ZipcodeRecord``
+tuples, so the region, province and coordinates of a zip code come back
+together in one O(1) lookup. The same data is also kept as NumPy columns
+sorted by zip code, so that many zip codes can be looked up at once with
+``np.searchsorted`` (``lookup_many``), e.g. to enrich the rows of a batch.
+
+``get_index()`` returns the index of a file, loading it on first use only,
+for the API and the Streamlit app alike.
+"""
+import csv
+import functools
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from api import config
+
+# Fields filled in by ``ZipcodeIndex.lookup_many`` and ``fill_missing``
+FIELDS = ("region", "province", "latitude", "longitude")
+
+
+class ZipcodeRecord(NamedTuple):
+    zip_code: int
+    region: str
+    province: str
+    latitude: float  # NaN when unknown
+    longitude: float  # NaN when unknown
+
+
+def _to_float(value):
+    return float(value) if value else math.nan
+
+
+def _as_zip_code(value):
+    """Converts an int or a string of digits to a zip code, anything else to -1 (never found)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+class ZipcodeIndex:
+    """Zip code records indexed by zip code."""
+
+    def __init__(self, records):
+        self._records = {}
+        for record in records:
+            # Keep the first row of a duplicated zip code, like the former DataFrame scans
+            self._records.setdefault(record.zip_code, record)
+
+        ordered = sorted(self._records.values())
+        self.zip_codes = np.array([record.zip_code for record in ordered], dtype=np.int64)
+        self.columns = {
+            "region": np.array([record.region for record in ordered], dtype=object),
+            "province": np.array([record.province for record in ordered], dtype=object),
+            "latitude": np.array([record.latitude for record in ordered], dtype=np.float64),
+            "longitude": np.array([record.longitude for record in ordered], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(
+                ZipcodeRecord(
+                    zip_code=int(row["zip_code"]),
+                    region=row["region"],
+                    province=row["province"],
+                    latitude=_to_float(row["latitude"]),
+                    longitude=_to_float(row["longitude"]),
+                )
+                for row in csv.DictReader(f)
+            )
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, zip_code):
+        return self.get(zip_code) is not None
+
+    def __getitem__(self, zip_code):
+        record = self.get(zip_code)
+        if record is None:
+            raise KeyError(zip_code)
+        return record
+
+    def get(self, zip_code, default=None):
+        """Returns the record of a zip code given as an int or a string of digits, or ``default``."""
+        return self._records.get(_as_zip_code(zip_code), default)
+
+    def lookup_many(self, zip_codes):
+        """Looks up a sequence of zip codes at once.
+
+        Returns a dict holding a boolean ``found`` array and one array per
+        field of ``FIELDS``, aligned with ``zip_codes``; zip codes that are
+        not found get None as region and province and NaN coordinates.
+        """
+        codes = np.asarray(zip_codes, dtype=np.int64)
+        positions = np.searchsorted(self.zip_codes, codes)
+        positions = np.minimum(positions, len(self.zip_codes) - 1)
+        found = self.zip_codes[positions] == codes
+
+        result = {"found": found}
+        for name, column in self.columns.items():
+            values = column[positions]
+            values[~found] = None if values.dtype == object else np.nan
+            result[name] = values
+        return result
+
+    def fill_missing(self, columns, zip_codes):
+        """Fills the None, empty or NaN values of the ``FIELDS`` lists in ``columns`` from the rows' zip codes.
+
+        ``columns`` maps field names to lists of values, as in
+        ``FeatureAssembler.assemble_columns``; missing fields are added. Rows
+        whose zip code is unknown are left as they are.
+        """
+        n_rows = len(zip_codes)
+        matches = self.lookup_many([_as_zip_code(code) for code in zip_codes])
+        for name in FIELDS:
+            values = columns.setdefault(name, [None] * n_rows)
+            looked_up = matches[name].tolist()
+            for index in np.flatnonzero(matches["found"]).tolist():
+                value = values[index]
+                if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+                    values[index] = looked_up[index]
+        return columns
+
+
+@functools.lru_cache(maxsize=None)
+def get_index(path=None):
+    """Returns the index of ``path`` (``ZIPCODES_PATH`` by default), loaded once per process."""
+    return ZipcodeIndex.from_csv(path or config.ZIPCODES_PATH)
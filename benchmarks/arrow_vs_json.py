@@ -0,0 +1,93 @@
+"""Compares the Arrow IPC path with the JSON batch path.
+
+Both paths score the same items, from serialized request body to serialized
+response, and are also timed end to end through the in-process test client:
+
+- json: ``json.loads`` -> ``Item`` validation -> pandas preprocessing -> model -> JSON
+- arrow: IPC stream -> ``score_arrow`` -> IPC stream
+
+Memory is the peak traced by ``tracemalloc`` (Python and NumPy allocations)
+plus the peak of Arrow's memory pool, during one call.
+
+Usage:
+    python -m benchmarks.arrow_vs_json --items 10000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import api.app
+from api.arrow_io import STREAM_MEDIA_TYPE, read_ipc, score_arrow, write_ipc
+from benchmarks.common import make_items
+
+
+def json_path(body, bundle):
+    rows = [api.app.validate_item(raw_item, bundle)[0] for raw_item in json.loads(body)]
+    prediction = bundle.predict_rows(rows)
+    return json.dumps(api.app.format_price_ranges(prediction)).encode()
+
+
+def arrow_path(body, bundle):
+    return write_ipc(score_arrow(bundle, read_ipc(body))).to_pybytes()
+
+
+def measure(fn, body, bundle, repeat):
+    fn(body, bundle)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(body, bundle)
+        best = min(best, time.perf_counter() - start)
+
+    pool = pa.default_memory_pool()
+    pool_before = pool.max_memory() or 0
+    tracemalloc.start()
+    fn(body, bundle)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The pool only reports its all-time peak: count what this call added to it
+    pool_peak = max(0, (pool.max_memory() or 0) - pool_before)
+    return best, traced_peak + pool_peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    bundle = api.app.load_model()
+    json_body = json.dumps(items).encode()
+    arrow_body = write_ipc(pa.RecordBatch.from_pylist(items)).to_pybytes()
+
+    print(f"{args.items} items, request body: {len(json_body) / 1e6:.1f} MB JSON, {len(arrow_body) / 1e6:.1f} MB Arrow")
+    print(f"{'path':<8} {'seconds':>8} {'items/s':>10} {'peak MB':>8}")
+    for name, fn, body in (("json", json_path, json_body), ("arrow", arrow_path, arrow_body)):
+        seconds, peak = measure(fn, body, bundle, args.repeat)
+        print(f"{name:<8} {seconds:8.4f} {args.items / seconds:10,.0f} {peak / 2**20:8.1f}")
+
+    # End to end through the endpoints, capped at the batch endpoint's limit
+    n = min(args.items, api.app.MAX_BATCH_SIZE)
+    client = TestClient(api.app.app)
+    arrow_body = write_ipc(pa.RecordBatch.from_pylist(items[:n])).to_pybytes()
+    requests = {
+        "json": lambda: client.post("/predict/batch", json=items[:n]),
+        "arrow": lambda: client.post("/predict/arrow", content=arrow_body, headers={"Content-Type": STREAM_MEDIA_TYPE}),
+    }
+    print(f"\nEnd to end, {n} items per request")
+    for name, send in requests.items():
+        send().raise_for_status()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            send()
+        seconds = (time.perf_counter() - start) / args.repeat
+        print(f"{name:<8} {seconds:8.4f} {n / seconds:10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
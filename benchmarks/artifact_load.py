@@ -0,0 +1,93 @@
+"""Compares loading the joblib bundle and the split artifact directory.
+
+Every measurement is made in fresh Python processes, after the imports the
+API needs anyway (numpy, pandas, scikit-learn, xgboost), for both engines:
+
+- load ms: ``ModelBundle.load`` of the artifacts, with the page cache warm
+- rss MB: growth of the resident set during the load
+- private MB: growth of the unique set (USS), the memory no other process
+  can share; with the split format the memory-mapped arrays are not part
+  of it, they live in the page cache
+- workers: ``--workers`` processes loading the same artifacts at once, and
+  the sum of their private memory growth
+
+The split directory is created with ``python -m api.split_artifacts`` when
+it does not exist.
+
+Usage:
+    python -m benchmarks.artifact_load --runs 5 --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.common import ARTIFACTS_PATH
+
+SPLIT_PATH = str(Path(ARTIFACTS_PATH).with_suffix(".split"))
+
+CHILD = """
+import json, sys, time
+import psutil
+import numpy, pandas, sklearn.impute, sklearn.preprocessing, xgboost
+from api.bundle import ModelBundle
+
+process = psutil.Process()
+before = process.memory_full_info()
+start = time.perf_counter()
+bundle = ModelBundle.load(sys.argv[1], engine=sys.argv[2])
+elapsed = time.perf_counter() - start
+bundle.predict_features(bundle.assembler.assemble(bundle.sample_record()))
+after = process.memory_full_info()
+print(json.dumps({"load": elapsed, "rss": after.rss - before.rss, "uss": after.uss - before.uss}))
+sys.stdout.flush()
+# Keep the memory mapped while the other workers measure
+sys.stdin.read()
+"""
+
+
+def measure(path, engine, workers=1):
+    """Starts ``workers`` processes loading ``path`` at once; returns their measurements."""
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", CHILD, path, engine],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    results = [json.loads(process.stdout.readline()) for process in processes]
+    for process in processes:
+        process.communicate("")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not os.path.isdir(SPLIT_PATH):
+        subprocess.run([sys.executable, "-m", "api.split_artifacts", ARTIFACTS_PATH, "--out", SPLIT_PATH], check=True)
+
+    print(f"{'format':<8} {'engine':<8} {'load ms':>8} {'rss MB':>7} {'private MB':>10} "
+          f"{'private MB x' + str(args.workers):>15}")
+    for engine in ("xgboost", "numpy"):
+        for name, path in (("joblib", ARTIFACTS_PATH), ("split", SPLIT_PATH)):
+            runs = [measure(path, engine)[0] for _ in range(args.runs)]
+            workers = measure(path, engine, args.workers)
+            print(
+                f"{name:<8} {engine:<8} {statistics.median(run['load'] for run in runs) * 1e3:8.1f} "
+                f"{statistics.median(run['rss'] for run in runs) / 2**20:7.2f} "
+                f"{statistics.median(run['uss'] for run in runs) / 2**20:10.2f} "
+                f"{sum(worker['uss'] for worker in workers) / 2**20:15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
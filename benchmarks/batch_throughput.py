@@ -0,0 +1,52 @@
+"""Compares N single /predict calls against one /predict/batch call.
+
+Usage:
+    python -m benchmarks.batch_throughput --items 1000
+"""
+import argparse
+
+from fastapi.testclient import TestClient
+
+from api.app import app, load_model
+from benchmarks.common import make_items, timed
+
+
+def run_single(client, items):
+    return [client.post("/predict", json=item).json()["price_range"] for item in items]
+
+
+def run_batch(client, items, batch_size):
+    price_ranges = []
+    for start in range(0, len(items), batch_size):
+        response = client.post("/predict/batch", json=items[start:start + batch_size]).json()
+        price_ranges.extend(result["price_range"] for result in response["results"])
+    return price_ranges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000, help="number of synthetic items to score")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="items per /predict/batch call")
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    load_model()
+    client = TestClient(app)
+
+    # Warm up both code paths before measuring
+    run_single(client, items[:10])
+    run_batch(client, items[:10], args.batch_size)
+
+    single, single_time = timed(run_single, client, items)
+    batch, batch_time = timed(run_batch, client, items, args.batch_size)
+
+    assert single == batch, "batch and single predictions differ"
+
+    print(f"items:          {args.items}")
+    print(f"single calls:   {single_time:8.3f} s  {args.items / single_time:10.1f} items/s")
+    print(f"batch calls:    {batch_time:8.3f} s  {args.items / batch_time:10.1f} items/s")
+    print(f"speedup:        {single_time / batch_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
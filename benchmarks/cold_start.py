@@ -0,0 +1,82 @@
+"""Measures the cold start of the API: time until it is alive, ready and has served a prediction.
+
+A fresh uvicorn process is started for each run. The script polls /healthz
+and /readyz and then sends one /predict request, recording the time from
+process launch to each milestone, and prints the server's own timing
+breakdown (imports, artifact load, warm-up) from /readyz.
+
+Usage:
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import make_items
+from benchmarks.server import free_port
+
+
+def wait_for(url, deadline):
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code == 200:
+                return response
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer in time")
+
+
+def cold_start(item, env, timeout=120):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.monotonic()
+    deadline = start + timeout
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.app:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    try:
+        wait_for(url + "/healthz", deadline)
+        alive = time.monotonic() - start
+        ready_response = wait_for(url + "/readyz", deadline)
+        ready = time.monotonic() - start
+        response = httpx.post(url + "/predict", json=item, timeout=30)
+        response.raise_for_status()
+        first_prediction = time.monotonic() - start
+        return alive, ready, first_prediction, ready_response.json()["startup_timings"]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--engine", default="xgboost", choices=["xgboost", "numpy"])
+    args = parser.parse_args()
+
+    item = make_items(1)[0]
+    env = {"INFERENCE_ENGINE": args.engine}
+    runs = [cold_start(item, env) for _ in range(args.runs)]
+
+    def median(values):
+        return statistics.median(values)
+
+    print(f"median over {args.runs} runs ({args.engine} engine):")
+    print(f"  alive (/healthz):          {median([run[0] for run in runs]):6.2f} s")
+    print(f"  ready (/readyz):           {median([run[1] for run in runs]):6.2f} s")
+    print(f"  first successful predict:  {median([run[2] for run in runs]):6.2f} s")
+    print("  server-side breakdown:")
+    for name in runs[0][3]:
+        print(f"    {name:<26} {median([run[3][name] for run in runs]):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Shared helpers for the benchmark scripts.
+
+All scripts are meant to be run from the repository root, e.g.
+``python -m benchmarks.batch_throughput``, because the API loads its
+artifacts from a path relative to the working directory.
+"""
+import json
+import random
+import time
+
+import joblib
+
+ARTIFACTS_PATH = "api/models/artifacts_xg.joblib"
+UNIQUES_PATH = "streamlit/uniques.json"
+
+
+def make_items(n, seed=0):
+    """Generates ``n`` synthetic, valid ``Item`` payloads."""
+    artifacts = joblib.load(ARTIFACTS_PATH)
+    enc = artifacts["enc"]
+    categories = dict(zip(artifacts["features"]["cat_features"], enc.categories_))
+
+    rng = random.Random(seed)
+    items = []
+    for _ in range(n):
+        item = {
+            "nbr_frontages": float(rng.randint(1, 4)),
+            "nbr_bedrooms": float(rng.randint(1, 6)),
+            "latitude": rng.uniform(49.5, 51.5),
+            "longitude": rng.uniform(2.5, 6.4),
+            "total_area_sqm": float(rng.randint(30, 400)),
+            "surface_land_sqm": float(rng.randint(0, 2000)),
+            "terrace_sqm": float(rng.randint(0, 40)),
+            "garden_sqm": float(rng.randint(0, 500)),
+            "fl_terrace": rng.randint(0, 1),
+            "fl_garden": rng.randint(0, 1),
+            "fl_swimming_pool": rng.randint(0, 1),
+        }
+        for feature, values in categories.items():
+            item[feature] = str(rng.choice(values))
+        items.append(item)
+    return items
+
+
+def make_catalog_items(n, seed=0):
+    """Generates ``n`` ``Item`` payloads from the value domains the app offers.
+
+    Unlike ``make_items``, every item is consistent: the categories come from
+    ``streamlit/uniques.json``, the subproperty type matches the property
+    type, and the region, province, locality and coordinates are those of a
+    zip code of ``zipcodes.csv``. The surfaces stay within the limits of
+    the app's inputs.
+    """
+    from api.geocoding import get_locator
+
+    with open(UNIQUES_PATH) as f:
+        uniques = json.load(f)
+    locator = get_locator()
+    index = locator.index
+    zip_codes = [
+        zip_code
+        for zip_code in index.zip_codes.tolist()
+        if index[zip_code].region is not None and index[zip_code].latitude == index[zip_code].latitude
+    ]
+    house_subtypes = set(uniques["house_subtypes"])
+    subtypes = {
+        "HOUSE": sorted(house_subtypes),
+        "APARTMENT": sorted(set(uniques["subproperty_type"]) - house_subtypes),
+    }
+
+    rng = random.Random(seed)
+    items = []
+    for _ in range(n):
+        record = index[rng.choice(zip_codes)]
+        property_type = rng.choice(uniques["property_type"])
+        house = property_type == "HOUSE"
+        garden = rng.random() < (0.7 if house else 0.1)
+        terrace = rng.random() < 0.6
+        swimming_pool = house and rng.random() < 0.05
+        items.append({
+            "nbr_frontages": float(rng.randint(2, 4) if house else rng.randint(1, 3)),
+            "nbr_bedrooms": float(rng.randint(1, min(8, int(uniques["nbr_bedrooms"])))),
+            "latitude": record.latitude + rng.gauss(0, 0.01),
+            "longitude": record.longitude + rng.gauss(0, 0.01),
+            "total_area_sqm": float(rng.randint(30, 400 if house else 200)),
+            "surface_land_sqm": float(rng.randint(100, 3000)) if house else 0.0,
+            "terrace_sqm": float(rng.randint(5, 40)) if terrace else 0.0,
+            "garden_sqm": float(rng.randint(20, 1000)) if garden else 0.0,
+            "fl_terrace": int(terrace),
+            "fl_garden": int(garden),
+            "fl_swimming_pool": int(swimming_pool),
+            "province": record.province,
+            "heating_type": rng.choice(uniques["heating_type"]),
+            "state_building": rng.choice(uniques["state_building"]),
+            "property_type": property_type,
+            "epc": rng.choice(uniques["epc"]),
+            "locality": locator.localities[record.zip_code],
+            "subproperty_type": rng.choice(subtypes[property_type]),
+            "region": record.region,
+            "equipped_kitchen": rng.choice(uniques["equipped_kitchen"]),
+        })
+    return items
+
+
+def timed(fn, *args, **kwargs):
+    """Runs ``fn`` once and returns ``(result, elapsed_seconds)``."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,54 @@
+"""Checks the NumPy feature assembler against the pandas preprocessing path.
+
+Every synthetic item is preprocessed both ways; the feature rows and the
+model predictions must be bit-identical. Timings of both paths are printed.
+
+Usage:
+    python -m benchmarks.feature_parity --items 2000
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from api.bundle import ModelBundle
+from benchmarks.common import ARTIFACTS_PATH, make_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000, help="number of synthetic items to check")
+    args = parser.parse_args()
+
+    bundle = ModelBundle.load(ARTIFACTS_PATH)
+    assembler, model, preprocess = bundle.assembler, bundle.model, bundle.preprocess
+    items = make_items(args.items)
+    # Exercise the imputation branch as well
+    for item in items[::7]:
+        item["surface_land_sqm"] = math.nan
+        item["nbr_frontages"] = math.nan
+
+    pandas_time = numpy_time = 0.0
+    row = assembler.new_row()
+    for item in items:
+        start = time.perf_counter()
+        expected = preprocess(pd.DataFrame([item]))
+        pandas_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = assembler.assemble(item, out=row)
+        numpy_time += time.perf_counter() - start
+
+        assert list(expected.columns) == assembler.feature_names
+        np.testing.assert_array_equal(actual, expected.to_numpy())
+        assert model.predict(actual).tobytes() == model.predict(expected).tobytes()
+
+    print(f"items checked:   {args.items} (features and predictions bit-identical)")
+    print(f"pandas path:     {pandas_time / args.items * 1e6:8.1f} us/item")
+    print(f"assembler path:  {numpy_time / args.items * 1e6:8.1f} us/item")
+
+
+if __name__ == "__main__":
+    main()
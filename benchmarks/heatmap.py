@@ -0,0 +1,111 @@
+"""Times building and serving the precomputed price heatmaps.
+
+Building, into a temporary directory:
+- records: the heatmap of one profile scored one record per zip code with
+  ``ModelBundle.score``, as a per-request loop would
+- full: ``build_heatmap`` of every profile from scratch
+- unchanged: a rebuild with nothing to do
+- one profile: a rebuild after one profile changed
+- new model: a rebuild after the model checksum changed
+
+Serving:
+- layer cold: ``HeatmapStore.layer`` of a profile right after a rebuild
+- layer warm: the same layer again
+- endpoint: ``GET /heatmap/{profile}`` through the in-process test client
+
+Usage:
+    python -m benchmarks.heatmap --grid-step 0.05
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+# The API serves the heatmap built by the benchmark
+os.environ["HEATMAP_DIR"] = tempfile.mkdtemp(prefix="heatmap-")
+
+import numpy as np  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api.app  # noqa: E402
+from api import heatmap  # noqa: E402
+from api.geocoding import get_locator  # noqa: E402
+
+
+def best_of(fn, repeat, setup=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid-step", type=float, default=0.0, help="also build a lat/lon grid with this step")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    directory = os.environ["HEATMAP_DIR"]
+    bundle = api.app.load_model()
+    locator = get_locator()
+    index = locator.index
+    profiles = copy.deepcopy(heatmap.PROFILES)
+
+    def build(profiles=profiles):
+        return heatmap.build_heatmap(bundle, directory, profiles, args.grid_step, locator)
+
+    def clear():
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+    profile = profiles["apartment"]
+    records = [
+        {**profile, **record._asdict(), "locality": locator.localities.get(record.zip_code)}
+        for record in map(index.__getitem__, index.zip_codes.tolist())
+        if not np.isnan(record.latitude)
+    ]
+
+    timings = {
+        "records": best_of(lambda: bundle.score(records), args.repeat),
+        "full": best_of(build, args.repeat, setup=clear),
+        "unchanged": best_of(build, args.repeat),
+    }
+    edited = {**profiles, "apartment": {**profile, "nbr_bedrooms": 1.0}}
+    timings["one profile"] = best_of(lambda: build(edited), args.repeat, setup=build)
+
+    timings["new model"] = best_of(build, args.repeat, setup=lambda: _age(bundle, build))
+
+    build()
+    store = heatmap.HeatmapStore(directory, locator)
+    timings["layer cold"] = best_of(lambda: store.layer("apartment"), args.repeat, setup=lambda: setattr(store, "_mtime", None))
+    timings["layer warm"] = best_of(lambda: store.layer("apartment"), args.repeat)
+
+    with TestClient(api.app.app) as client:
+        assert client.get("/heatmap/apartment").status_code == 200
+        timings["endpoint"] = best_of(lambda: client.get("/heatmap/apartment").raise_for_status(), args.repeat * 20)
+
+    n_points = len(store.layer("apartment"))
+    if args.grid_step:
+        n_points += len(store.layer("apartment", grid=True))
+    print(f"{len(profiles)} profiles, {n_points} points per profile")
+    for name, seconds in timings.items():
+        print(f"{name:<12} {seconds * 1e3:9.2f} ms")
+
+
+def _age(bundle, build):
+    """Rewrites the heatmap as scored by another model, so that the next build recomputes everything."""
+    checksum = bundle.checksum
+    try:
+        bundle.checksum = "previous model"
+        build()
+    finally:
+        bundle.checksum = checksum
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Load test of /predict with and without micro-batching.
+
+For each server configuration a uvicorn process is started, and N
+concurrent clients send distinct items (the cache is disabled) for a fixed
+number of requests per client. Latency percentiles and throughput are
+printed per concurrency level.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1 16 128 --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.common import make_items
+from benchmarks.server import running_server
+
+CONFIGURATIONS = {
+    "per-request": {"MICRO_BATCH_MAX_SIZE": "0"},
+    "micro-batching": {"MICRO_BATCH_MAX_SIZE": "64", "MICRO_BATCH_MAX_WAIT_MS": "2"},
+}
+
+
+async def drive(url, items, concurrency):
+    """Sends every item with ``concurrency`` parallel clients; returns latencies and errors."""
+    latencies, errors = [], 0
+    queue = iter(items)
+
+    async def client(session):
+        nonlocal errors
+        for item in queue:
+            start = time.perf_counter()
+            response = await session.post("/predict", json=item)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128], help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--config", choices=sorted(CONFIGURATIONS), nargs="+", default=list(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    items = make_items(args.requests)
+    print(f"{'configuration':<16} {'clients':>7} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>6}")
+    for name in args.config:
+        env = {"CACHE_SIZE": "0", **CONFIGURATIONS[name]}
+        with running_server(env) as url:
+            asyncio.run(drive(url, items[:50], 4))  # warm-up
+            for concurrency in args.concurrency:
+                latencies, errors, elapsed = asyncio.run(drive(url, items, concurrency))
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+                print(f"{name:<16} {concurrency:>7} {p50:>8.2f} {p99:>8.2f} {len(latencies) / elapsed:>8.0f} {errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measures the overhead of the request metrics on /predict.
+
+The same items are sent through the in-process test client with metrics
+disabled, enabled, and enabled with the Server-Timing header; the cache is
+bypassed so every request runs the full pipeline.
+
+Usage:
+    python -m benchmarks.metrics_overhead --items 2000
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+import api.app
+from api.metrics import metrics
+from benchmarks.common import make_items
+
+SETTINGS = {
+    "disabled": (False, False),
+    "enabled": (True, False),
+    "enabled + Server-Timing": (True, True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3, help="alternating rounds per setting, the best is kept")
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    api.app.load_model()
+    api.app.prediction_cache = None
+    client = TestClient(api.app.app)
+    for item in items[:50]:
+        client.post("/predict", json=item)
+
+    best = {name: float("inf") for name in SETTINGS}
+    for _ in range(args.rounds):
+        for name, (enabled, server_timing) in SETTINGS.items():
+            metrics.enabled, metrics.server_timing = enabled, server_timing
+            start = time.perf_counter()
+            for item in items:
+                client.post("/predict", json=item)
+            best[name] = min(best[name], (time.perf_counter() - start) / args.items)
+
+    baseline = best["disabled"]
+    for name, seconds in best.items():
+        print(f"{name:<24} {seconds * 1e6:8.1f} us/request  {(seconds / baseline - 1) * 100:+6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Exercises the Streamlit prediction client against a local stand-in server.
+
+The stand-in answers ``POST /predict`` like the API, with a canned price
+range, and can be told to fail. Each scenario sends ``--requests``
+sequential predictions and reports the client's counts, /predict breaker openings and
+client-side latency percentiles per source (api or in-process fallback):
+
+- fresh: ``requests.post`` with a new connection per call, as the predict
+  page used to do (latencies only)
+- pooled: the client against a healthy server
+- flaky: 30% of the answers are 503 with Retry-After: 0
+- slow: every answer takes longer than the read timeout
+- down: nothing listens on the port; the breaker opens after
+  ``BREAKER_FAILURES`` failures and requests are scored in-process
+- recovery: the server comes back after the breaker opened
+
+``--api`` also runs the fresh and pooled scenarios against the real API.
+
+Usage:
+    python -m benchmarks.prediction_client --requests 200
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.common import make_items
+from benchmarks.server import free_port, running_server
+
+sys.path.insert(0, os.path.abspath("streamlit"))
+
+from prediction_client import CircuitBreaker, LocalScorer, PredictionClient, _percentiles  # noqa: E402
+
+RESPONSE = json.dumps(
+    {"price_range": {"lower_bound": "536,059", "upper_bound": "592,486"}, "model_version": "stand-in"}
+).encode()
+
+
+class StandIn(ThreadingHTTPServer):
+    """Stand-in of the API: ``mode`` is "ok", "flaky" or "slow"."""
+
+    daemon_threads = True
+
+    def __init__(self, port):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.mode = "ok"
+        self.delay = 0.0
+        self.connections = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Like uvicorn: without it, the body written after the headers waits for a delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, body, headers = 200, RESPONSE, {}
+        if self.server.mode == "flaky" and random.random() < 0.3:
+            status, body, headers = 503, b'{"detail":"overloaded"}', {"Retry-After": "0"}
+        elif self.server.mode == "slow":
+            time.sleep(self.server.delay)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up waiting
+            pass
+
+
+def run_fresh(url, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        requests.post(url, json=item).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return {"api": len(items), "latency_ms": {"api": _percentiles(latencies)}}
+
+
+def run_client(client, items):
+    for item in items:
+        client.predict(item)
+    return client.stats()
+
+
+def report(name, stats, connections=None):
+    counts = " ".join(f"{key}={stats[key]}" for key in ("api", "local", "retries", "failures") if key in stats)
+    if "breaker_opened" in stats:
+        counts += f" breaker_opened={stats['breaker_opened']['predict']}"
+    if connections is not None:
+        counts += f" connections={connections}"
+    print(f"{name:<10} {counts}")
+    for source, percentiles in stats["latency_ms"].items():
+        if percentiles:
+            print(f"{'':<10}   {source:<6} " + "  ".join(f"{q} {ms:8.2f} ms" for q, ms in percentiles.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--api", action="store_true", help="also run against the real API")
+    args = parser.parse_args()
+
+    random.seed(0)
+    items = [{**item, "equipped_kitchen": "INSTALLED"} for item in make_items(args.requests)]
+    local = LocalScorer()
+    local.predict(items[0])
+
+    def new_client(url, **kwargs):
+        kwargs.setdefault("breaker_factory", lambda: CircuitBreaker(failure_threshold=3, reset_timeout=0.5))
+        kwargs.setdefault("read_timeout", 1.0)
+        return PredictionClient(url, backoff_base=0.01, backoff_max=0.05, fallback=local, **kwargs)
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/predict"
+    with StandIn(port) as server:
+        report("fresh", run_fresh(url, items), server.connections)
+
+        server.connections = 0
+        report("pooled", run_client(new_client(url), items), server.connections)
+
+        server.mode = "flaky"
+        report("flaky", run_client(new_client(url), items))
+
+        server.mode, server.delay = "slow", 0.3
+        report("slow", run_client(new_client(url, read_timeout=0.1), items[:20]))
+        server.mode = "ok"
+
+    client = new_client(url, connect_timeout=0.2)
+    report("down", run_client(client, items))
+    # The breaker lets a trial request through once the reset timeout has passed
+    time.sleep(0.6)
+    with StandIn(port):
+        report("recovery", run_client(client, items))
+
+    if args.api:
+        with running_server({"METRICS_ENABLED": "0"}) as base_url:
+            report("api fresh", run_fresh(base_url + "/predict", items))
+            client = new_client(base_url + "/predict")
+            report("api pooled", run_client(client, items))
+            # The in-process fallback must give the same answers as the API
+            for item in items[:20]:
+                assert client.predict(item).price_range == local.predict(item)["price_range"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Replays captured requests against the API.
+
+Reads JSONL captures (see ``api/capture.py``): every line is an envelope
+``{"request_id": ..., "body": {...}, "path": "/predict", "ts": ...}``;
+lines without a ``path`` go to ``/predict``, and lines that are plain items
+are sent as ``/predict`` bodies. Requests are sent with asyncio and httpx in
+one of three modes:
+
+- ``--concurrency N`` (default): N clients send the requests back to back
+- ``--rate R``: R requests per second on a fixed schedule, whatever the
+  server's latency (open loop)
+- ``--preserve-timing``: the original inter-arrival times, from the ``ts``
+  of the captures, divided by ``--speed``
+
+Without ``--url`` a local server is started with the cache disabled. The
+report gives the throughput, the latency percentiles per path (next to the
+latencies recorded in the captures), how late the open-loop modes sent
+their requests, and the errors by status code or exception.
+
+Usage:
+    CAPTURE_DIR=captures uvicorn api.app:app   # then send traffic
+    python -m benchmarks.replay captures/*.jsonl --preserve-timing --speed 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+import httpx
+import numpy as np
+
+from benchmarks.server import running_server
+
+QUANTILES = (50, 90, 99, 100)
+
+
+def read_captures(paths, limit=None):
+    """Returns the requests of the capture files as ``(ts, method, path, body, latency_ms)``, oldest first."""
+    requests = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, dict) and "body" in record:
+                    requests.append((
+                        record.get("ts"),
+                        record.get("method", "POST"),
+                        record.get("path", "/predict"),
+                        record["body"],
+                        record.get("latency_ms"),
+                    ))
+                else:
+                    requests.append((None, "POST", "/predict", record, None))
+    if all(request[0] is not None for request in requests):
+        requests.sort(key=lambda request: request[0])
+    return requests[:limit]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.lags = []
+        self.errors = Counter()
+        self.sent = 0
+
+    def record(self, path, latency, status=None, error=None):
+        self.sent += 1
+        self.latencies[path].append(latency)
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+        elif status != 200:
+            self.errors[f"HTTP {status}"] += 1
+
+
+async def send(session, results, method, path, body):
+    start = time.perf_counter()
+    try:
+        response = await session.request(method, path, json=body)
+    except httpx.HTTPError as e:
+        results.record(path, time.perf_counter() - start, error=e)
+    else:
+        results.record(path, time.perf_counter() - start, status=response.status_code)
+
+
+async def replay(url, requests, concurrency=None, offsets=None, timeout=30.0, max_connections=256):
+    """Sends ``requests`` with ``concurrency`` clients, or each at its offset in seconds from the start."""
+    results = Results()
+    connections = concurrency or max_connections
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as session:
+        start = time.perf_counter()
+        if offsets is None:
+            pending = iter(requests)
+
+            async def client():
+                for _, method, path, body, _ in pending:
+                    await send(session, results, method, path, body)
+
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+        else:
+            tasks = []
+            for offset, (_, method, path, body, _) in zip(offsets, requests):
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                results.lags.append(time.perf_counter() - start - offset)
+                tasks.append(asyncio.create_task(send(session, results, method, path, body)))
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def percentiles(values):
+    return "  ".join(f"p{q} {value:8.2f}" for q, value in zip(QUANTILES, np.percentile(values, QUANTILES)))
+
+
+def report(requests, results, elapsed):
+    print(f"sent {results.sent} requests in {elapsed:.2f} s: {results.sent / elapsed:.1f} req/s")
+    captured = defaultdict(list)
+    for _, _, path, _, latency_ms in requests:
+        if latency_ms is not None:
+            captured[path].append(latency_ms)
+    for path, latencies in sorted(results.latencies.items()):
+        print(f"{path:<22} n={len(latencies):<6} replay   ms  {percentiles(np.array(latencies) * 1e3)}")
+        if captured[path]:
+            print(f"{'':<22} {'':<8} captured ms  {percentiles(captured[path])}")
+    if results.lags:
+        print(f"{'send lag':<31} ms  {percentiles(np.array(results.lags) * 1e3)}")
+    errors = sum(results.errors.values())
+    print(f"errors: {errors} ({errors / max(results.sent, 1):.1%})")
+    for error, count in results.errors.most_common():
+        print(f"  {error:<20} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="JSONL capture files")
+    parser.add_argument("--url", help="API base URL (default: start a local server)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="concurrent clients sending back to back (default 8)")
+    mode.add_argument("--rate", type=float, help="requests per second, on a fixed schedule")
+    mode.add_argument("--preserve-timing", action="store_true", help="keep the captured inter-arrival times")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed-up of --preserve-timing")
+    parser.add_argument("--limit", type=int, help="replay at most this many requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    requests = read_captures(args.captures, args.limit)
+    if not requests:
+        parser.error("the captures hold no requests")
+    offsets = None
+    if args.rate:
+        offsets = [index / args.rate for index in range(len(requests))]
+    elif args.preserve_timing:
+        if any(request[0] is None for request in requests):
+            parser.error("--preserve-timing needs the ts of every request")
+        first = requests[0][0]
+        offsets = [(ts - first) / args.speed for ts, *_ in requests]
+    concurrency = None if offsets is not None else args.concurrency or 8
+
+    def run(url):
+        results, elapsed = asyncio.run(replay(url, requests, concurrency, offsets, args.timeout))
+        report(requests, results, elapsed)
+
+    if args.url:
+        run(args.url)
+    else:
+        with running_server({"CACHE_SIZE": "0", "METRICS_ENABLED": "0"}) as url:
+            run(url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Times nearest zip code queries against a brute-force scan.
+
+- scan: haversine distance from the point to every zip code centroid, argmin
+- tree: ``ZipcodeLocator``, a KD-tree over the projected centroids
+
+Points are drawn uniformly over Belgium's bounding box. The scan also
+checks how often the projected KD-tree finds the same zip code as the
+exact great-circle distance.
+
+Usage:
+    python -m benchmarks.reverse_geocoding --points 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from api.geocoding import ZipcodeLocator
+from api.zipcode_index import get_index
+
+def haversine_nearest(latitudes, longitudes, centroid_lat, centroid_lon):
+    lat1, lon1 = np.radians(latitudes)[:, None], np.radians(longitudes)[:, None]
+    lat2, lon2 = np.radians(centroid_lat)[None, :], np.radians(centroid_lon)[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return np.argmin(a, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--single", type=int, default=2000, help="single-point queries")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    locator = ZipcodeLocator(get_index())
+    print(f"Build: {(time.perf_counter() - start) * 1e3:.1f} ms for {len(locator)} centroids")
+
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(49.5, 51.5, args.points)
+    longitudes = rng.uniform(2.5, 6.4, args.points)
+    centroids = locator.index.lookup_many(locator.zip_codes)
+    centroid_lat, centroid_lon = centroids["latitude"], centroids["longitude"]
+
+    print(f"\nSingle points, {args.single} queries")
+    points = list(zip(latitudes[: args.single].tolist(), longitudes[: args.single].tolist()))
+    timings = {}
+    start = time.perf_counter()
+    for lat, lon in points:
+        haversine_nearest(np.array([lat]), np.array([lon]), centroid_lat, centroid_lon)
+    timings["scan"] = (time.perf_counter() - start) / len(points)
+    start = time.perf_counter()
+    for lat, lon in points:
+        locator.nearest(lat, lon)
+    timings["tree"] = (time.perf_counter() - start) / len(points)
+    for name, seconds in timings.items():
+        print(f"{name:<6} {seconds * 1e6:9.1f} us")
+
+    print(f"\nVectorized, {args.points} points")
+    # The scan builds a points x centroids matrix: run it in blocks
+    start = time.perf_counter()
+    exact = np.concatenate([
+        haversine_nearest(latitudes[i:i + 1000], longitudes[i:i + 1000], centroid_lat, centroid_lon)
+        for i in range(0, args.points, 1000)
+    ])
+    scan_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    zip_codes, _ = locator.query(latitudes, longitudes)
+    tree_seconds = time.perf_counter() - start
+    for name, seconds in (("scan", scan_seconds), ("tree", tree_seconds)):
+        print(f"{name:<6} {seconds * 1e3:9.1f} ms  {args.points / seconds:12,.0f} points/s")
+
+    agreement = np.mean(zip_codes == locator.zip_codes[exact])
+    print(f"\nSame zip code as the great-circle nearest: {agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares ways of scoring the variants of a what-if grid.
+
+A base item is varied over ``total_area_sqm`` x ``epc`` x ``state_building``
+and every variant is scored:
+
+In-process, from the variant dicts to prices:
+- records: ``ModelBundle.score`` on one record per variant (assembled row by row)
+- grid: ``ModelBundle.score_grid``, the base row broadcast and only the varied columns rewritten
+
+End to end through the in-process test client, with the prediction cache off:
+- predict: one ``/predict`` call per variant, as when a user tweaks a field and resubmits
+- batch: one ``/predict/batch`` call with all the variants
+- sensitivity: one ``/predict/sensitivity`` call
+
+Usage:
+    python -m benchmarks.sensitivity --areas 40
+"""
+import argparse
+import itertools
+import os
+import time
+
+os.environ["CACHE_SIZE"] = "0"
+
+import numpy as np  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api.app  # noqa: E402
+from benchmarks.common import make_items  # noqa: E402
+
+
+def best_of(fn, repeat):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--areas", type=int, default=40, help="values of total_area_sqm")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bundle = api.app.load_model()
+    item = make_items(1)[0]
+    categories = dict(zip(bundle.cat_features, bundle.enc.categories_))
+    variations = [
+        {"field": "total_area_sqm", "range": {"start": 40, "stop": 40 + 10 * (args.areas - 1), "step": 10}},
+        {"field": "epc", "values": [str(value) for value in categories["epc"]]},
+        {"field": "state_building", "values": [str(value) for value in categories["state_building"]]},
+    ]
+    pairs, _ = api.app.variation_values([api.app.Variation(**variation) for variation in variations], bundle)
+    fields = [field for field, _ in pairs]
+    records = [{**item, **dict(zip(fields, combination))} for combination in itertools.product(*(values for _, values in pairs))]
+    n = len(records)
+
+    # The broadcast grid must score exactly like the variants one by one
+    _, grid_prices = bundle.score_grid(item, pairs)
+    record_prices, _ = bundle.score(records)
+    assert np.array_equal(grid_prices, record_prices)
+
+    print(f"{n} variants")
+    print(f"{'path':<12} {'ms':>9} {'variants/s':>12}")
+    timings = {
+        "records": best_of(lambda: bundle.score(records), args.repeat),
+        "grid": best_of(lambda: bundle.score_grid(item, pairs), args.repeat),
+    }
+    with TestClient(api.app.app) as client:
+        body = {"item": item, "variations": variations}
+        timings["predict"] = best_of(lambda: [client.post("/predict", json=record) for record in records], 1)
+        timings["batch"] = best_of(lambda: client.post("/predict/batch", json=records), args.repeat)
+        timings["sensitivity"] = best_of(lambda: client.post("/predict/sensitivity", json=body), args.repeat)
+    for name, seconds in timings.items():
+        print(f"{name:<12} {seconds * 1e3:9.2f} {n / seconds:12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
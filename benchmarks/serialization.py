@@ -0,0 +1,79 @@
+"""Measures the parse + validate + encode cost of /predict with and without FAST_JSON.
+
+Micro-benchmark, per request and without scoring:
+
+- pydantic: ``json.loads`` -> ``Item`` -> ``.dict()`` -> ``jsonable_encoder`` -> ``json.dumps``,
+  the work FastAPI does around the default ``/predict``
+- fast: ``ItemDecoder.decode`` -> ``fast_json.dumps``, the FAST_JSON path
+
+Then end to end, against a server started with each setting. The same item
+is sent every time, so responses come from the prediction cache and the
+difference between the two servers is the request and response handling.
+
+Usage:
+    python -m benchmarks.serialization --requests 2000
+"""
+import argparse
+import json
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+from api import fast_json
+from api.app import Item, item_decoder
+from benchmarks.common import make_items
+from benchmarks.server import running_server
+
+RESPONSE = {"price_range": {"lower_bound": "536,059", "upper_bound": "592,486"}, "model_version": "artifacts_xg"}
+
+
+def pydantic_path(body):
+    record = Item.model_validate(json.loads(body)).dict()
+    encoded = json.dumps(jsonable_encoder(RESPONSE), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    return record, encoded.encode()
+
+
+def fast_path(body):
+    return item_decoder.decode(body), fast_json.dumps(RESPONSE)
+
+
+def per_call(fn, body, n):
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn(body)
+        best = min(best, (time.perf_counter() - start) / n)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    item = make_items(1)[0]
+    # The Streamlit client also sends equipped_kitchen, which Item ignores
+    body = json.dumps({**item, "equipped_kitchen": 1}).encode()
+    assert pydantic_path(body)[0] == fast_path(body)[0]
+
+    print("Parse + validate + encode, per request")
+    timings = {name: per_call(fn, body, 20_000) for name, fn in (("pydantic", pydantic_path), ("fast", fast_path))}
+    for name, seconds in timings.items():
+        print(f"{name:<10} {seconds * 1e6:7.2f} us  x{timings['pydantic'] / seconds:.1f}")
+
+    print(f"\nEnd to end, {args.requests} sequential cached requests")
+    for name, fast in (("pydantic", "0"), ("fast", "1")):
+        with running_server({"FAST_JSON": fast, "METRICS_ENABLED": "0"}) as url:
+            with httpx.Client(base_url=url) as client:
+                client.post("/predict", content=body).raise_for_status()
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    client.post("/predict", content=body)
+                seconds = (time.perf_counter() - start) / args.requests
+        print(f"{name:<10} {seconds * 1e6:7.0f} us/request")
+
+
+if __name__ == "__main__":
+    main()
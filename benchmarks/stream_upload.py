@@ -0,0 +1,121 @@
+"""Streams a long NDJSON upload through /predict/stream and watches server memory.
+
+The items are generated lazily and the results are consumed while the
+upload is still being sent, so neither side ever holds the whole stream. The
+server's RSS is sampled during the upload; with flow control it stays flat
+however many lines are sent.
+
+Common HTTP clients (requests, httpx) send the whole request body before
+reading the response, which stalls on long streams once the server stops
+reading the upload. This script therefore speaks HTTP/1.1 directly over an
+asyncio connection, writing and reading at the same time like ``curl -T``.
+
+Usage:
+    python -m benchmarks.stream_upload --lines 200000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import psutil
+
+from benchmarks.common import make_items
+from benchmarks.server import running_server
+
+
+def generate_upload(items, n_lines, lines_per_chunk=200):
+    """Yields the upload in byte chunks, every line wrapped in a request_id envelope."""
+    lines = (
+        json.dumps({"request_id": f"r-{index}", "body": item}) + "\n"
+        for index, item in zip(range(n_lines), itertools.cycle(items))
+    )
+    while True:
+        chunk = "".join(itertools.islice(lines, lines_per_chunk))
+        if not chunk:
+            return
+        yield chunk.encode()
+
+
+async def stream_predictions(url, chunks):
+    """Uploads ``chunks`` with chunked transfer encoding and yields the result lines as they arrive."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    writer.write(
+        f"POST {parts.path} HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/x-ndjson\r\n"
+        "Transfer-Encoding: chunked\r\n\r\n".encode()
+    )
+
+    async def upload():
+        for chunk in chunks:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    upload_task = asyncio.create_task(upload())
+    try:
+        status_line = await reader.readline()
+        if b" 200 " not in status_line:
+            raise RuntimeError(f"Unexpected response: {status_line.decode().strip()}")
+        while (await reader.readline()) != b"\r\n":
+            pass
+
+        # Chunked response body
+        buffer = b""
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if size == 0:
+                break
+            buffer += await reader.readexactly(size)
+            await reader.readexactly(2)
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+        await upload_task
+    finally:
+        upload_task.cancel()
+        writer.close()
+
+
+async def consume(url, chunks):
+    n_results = n_errors = 0
+    async for line in stream_predictions(url, chunks):
+        n_results += 1
+        n_errors += b'"error"' in line
+    return n_results, n_errors
+
+
+def sample_rss(process, samples, stop):
+    while not stop.wait(0.1):
+        samples.append(process.memory_info().rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=200_000)
+    args = parser.parse_args()
+
+    items = make_items(1000)
+    with running_server({"CACHE_SIZE": "0"}) as url:
+        server = psutil.Process().children()[-1]
+        samples, stop = [], threading.Event()
+        sampler = threading.Thread(target=sample_rss, args=(server, samples, stop), daemon=True)
+        rss_before = server.memory_info().rss
+        sampler.start()
+
+        start = time.perf_counter()
+        n_results, n_errors = asyncio.run(consume(url + "/predict/stream", generate_upload(items, args.lines)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+
+    print(f"{n_results:,} results ({n_errors} errors) in {elapsed:.1f} s: {n_results / elapsed:,.0f} lines/s")
+    print(f"Server RSS: {rss_before / 2**20:.0f} MB before, {max(samples) / 2**20:.0f} MB peak during the upload")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Times the reruns of every page of the Streamlit app.
+
+Streamlit executes the whole page script again on every widget
+interaction, in the server process, for every session. Each page is run
+headless with ``streamlit.testing.v1.AppTest``, with the session state the
+previous pages would have left, then rerun ``--repeat`` times. Each rerun
+reports its median wall time and its median CPU time. The CPU time is
+what every interaction of every concurrent session costs the server.
+
+``--root`` runs the pages of another checkout, e.g. to compare with the
+previous commit:
+
+    git worktree add /tmp/before HEAD~1
+    python -m benchmarks.streamlit_reruns --root /tmp/before
+    python -m benchmarks.streamlit_reruns
+
+Requires the Streamlit packages of requirements.txt.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+PAGES = {
+    "welcome": "streamlit/01_welcome.py",
+    "location": "streamlit/pages/02_location.py",
+    "exterior": "streamlit/pages/03_exterior.py",
+    "interior": "streamlit/pages/04_interior.py",
+    "energy": "streamlit/pages/05_energy.py",
+    "predict": "streamlit/pages/06_predict.py",
+}
+
+# Session state left by the location to energy pages, read by the predict page
+SESSION_STATE = {
+    "subproperty_type": "APARTMENT",
+    "zip_code": 1000,
+    "locality": "Brussels",
+    "property_type": "APARTMENT",
+    "lat": 50.8503,
+    "lon": 4.3517,
+    "total_area_sqm": 150,
+    "surface_land_sqm": 200,
+    "nbr_frontages": 2,
+    "fl_terrace": "Yes",
+    "terrace_sqm": 20,
+    "garden_sqm": 0,
+    "fl_swimming_pool": "No",
+    "fl_terrace_int": 1,
+    "fl_garden_int": 0,
+    "fl_swimming_pool_int": 0,
+    "nbr_bedrooms": 3,
+    "equipped_kitchen": "INSTALLED",
+    "state_building": "GOOD",
+    "epc": "C",
+    "heating_type": "GAS",
+}
+
+
+def time_page(path, repeat):
+    app = AppTest.from_file(path, default_timeout=60)
+    for key, value in SESSION_STATE.items():
+        app.session_state[key] = value
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"{path} failed: {app.exception[0].message}")
+
+    wall, cpu = [], []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        app.run()
+        wall.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+    return statistics.median(wall), statistics.median(cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=".", help="checkout whose pages are run")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("pages", nargs="*", metavar="PAGE", help=f"pages to time, among {', '.join(PAGES)}")
+    args = parser.parse_args()
+    unknown = set(args.pages) - set(PAGES)
+    if unknown:
+        parser.error(f"unknown pages: {', '.join(sorted(unknown))}")
+
+    # The pages use paths relative to the repository root and import the
+    # modules next to the main script
+    os.chdir(args.root)
+    sys.path.insert(0, os.path.abspath("streamlit"))
+
+    print(f"{'page':<10} {'wall ms':>8} {'cpu ms':>8}")
+    total = 0.0
+    for name in args.pages or PAGES:
+        wall, cpu = time_page(PAGES[name], args.repeat)
+        total += cpu
+        print(f"{name:<10} {wall * 1e3:8.2f} {cpu * 1e3:8.2f}")
+    print(f"{'total':<10} {'':>8} {total * 1e3:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""Benchmark suite of the inference pipeline, with baselines and a regression gate.
+
+Every case times one operation on synthetic items from
+``make_catalog_items`` (value domains of ``streamlit/uniques.json`` and
+zip codes of ``zipcodes.csv``):
+
+- preprocess: NumPy feature assembly and the pandas pipeline, one row and
+  a batch of 1000 rows
+- inference: the model call on an assembled feature matrix
+- score: records to prices in-process, one row and a batch
+- http: ``/predict`` and ``/predict/batch`` through the in-process test
+  client, with the prediction cache off
+- zipcode: the lookups of ``streamlit/zipcodes.py`` and of the API, one zip
+  code, a vector of zip codes, and the nearest zip code of coordinates
+
+Each case is called in a loop long enough to be timed, ``--repeat`` times;
+the time per call of every repeat is kept. Comparisons use the fastest
+repeat by default, the least disturbed by the rest of the machine.
+
+The speed of shared and virtual machines drifts from one process to the
+next and within a run, often by more than the regressions worth
+catching. Every repeat of a case is therefore preceded by a short loop of
+fixed Python and NumPy work (``calibration_work``), and the case is also
+recorded relative to it. ``compare`` uses these relative timings, unless
+``--no-normalize`` is given.
+
+Commands:
+    python -m benchmarks.suite run [--out results.json] [CASE_PREFIX ...]
+    python -m benchmarks.suite baseline              # writes BASELINE_PATH
+    python -m benchmarks.suite compare [--current results.json] [--threshold 0.25]
+
+``compare`` runs the cases of the baseline (unless ``--current`` is given),
+prints the ratio of every case to its baseline, and exits with status 1
+when a case is slower than the baseline by more than the threshold. Cases
+over the threshold are measured again (``--confirm`` times) and keep their
+best timings, so that a burst of background load does not fail the gate.
+Baselines only compare meaningfully on the machine that recorded them;
+differences of environment are printed.
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# The HTTP cases measure the pipeline, not the prediction cache
+os.environ["CACHE_SIZE"] = "0"
+os.environ["METRICS_ENABLED"] = "0"
+
+import numpy as np  # noqa: E402
+
+from benchmarks.common import make_catalog_items  # noqa: E402
+
+BASELINE_PATH = "benchmarks/baselines/baseline.json"
+BATCH_SIZE = 1000
+# Minimum duration of the loop of one repeat, in seconds, for the cases and the calibration
+MIN_LOOP_TIME = 0.1
+CALIBRATION_LOOP_TIME = 0.02
+
+CASES = {}
+
+
+def case(name, items=1):
+    """Registers a case: a function of the fixtures returning the operation to time."""
+    def register(setup):
+        CASES[name] = (setup, items)
+        return setup
+    return register
+
+
+class Fixtures:
+    """Objects shared by the cases, created on first use."""
+
+    @functools.cached_property
+    def items(self):
+        return make_catalog_items(BATCH_SIZE)
+
+    @functools.cached_property
+    def columns(self):
+        return {field: [item[field] for item in self.items] for field in self.items[0]}
+
+    @functools.cached_property
+    def bundle(self):
+        from api.bundle import ModelBundle
+        from api.config import ARTIFACTS_PATH
+
+        return ModelBundle.load(ARTIFACTS_PATH)
+
+    @functools.cached_property
+    def client(self):
+        from fastapi.testclient import TestClient
+
+        import api.app
+
+        api.app.load_model()
+        client = TestClient(api.app.app)
+        client.__enter__()
+        return client
+
+    @functools.cached_property
+    def zip_codes(self):
+        return np.random.default_rng(0).choice(self.index.zip_codes, 10_000)
+
+    @functools.cached_property
+    def index(self):
+        from api.zipcode_index import get_index
+
+        return get_index()
+
+    @functools.cached_property
+    def locator(self):
+        from api.geocoding import get_locator
+
+        return get_locator()
+
+    def close(self):
+        if "client" in self.__dict__:
+            self.client.__exit__(None, None, None)
+
+
+def cycle(values):
+    """Returns a function giving the next value of ``values`` on every call."""
+    values = list(values)
+    position = -1
+
+    def next_value():
+        nonlocal position
+        position = (position + 1) % len(values)
+        return values[position]
+    return next_value
+
+
+@case("preprocess.assemble.single")
+def _(f):
+    assemble, item = f.bundle.assembler.assemble, f.items[0]
+    return lambda: assemble(item)
+
+
+@case("preprocess.assemble.batch", items=BATCH_SIZE)
+def _(f):
+    assemble_columns, columns = f.bundle.assembler.assemble_columns, f.columns
+    return lambda: assemble_columns(columns, BATCH_SIZE)
+
+
+@case("preprocess.pandas.single")
+def _(f):
+    import pandas as pd
+
+    preprocess, item = f.bundle.preprocess, f.items[0]
+    return lambda: preprocess(pd.DataFrame([item]))
+
+
+@case("preprocess.pandas.batch", items=BATCH_SIZE)
+def _(f):
+    import pandas as pd
+
+    preprocess, items = f.bundle.preprocess, f.items
+    return lambda: preprocess(pd.DataFrame(items))
+
+
+@case("inference.single")
+def _(f):
+    predict, features = f.bundle.predict_features, f.bundle.assembler.assemble(f.items[0])
+    return lambda: predict(features)
+
+
+@case("inference.batch", items=BATCH_SIZE)
+def _(f):
+    predict, (features, _) = f.bundle.predict_features, f.bundle.assembler.assemble_columns(f.columns, BATCH_SIZE)
+    return lambda: predict(features)
+
+
+@case("score.single")
+def _(f):
+    score, records = f.bundle.score, [f.items[0]]
+    return lambda: score(records)
+
+
+@case("score.batch", items=BATCH_SIZE)
+def _(f):
+    score_columns, columns = f.bundle.score_columns, f.columns
+    return lambda: score_columns(columns, BATCH_SIZE)
+
+
+@case("http.predict")
+def _(f):
+    post, item = f.client.post, cycle(f.items)
+    return lambda: post("/predict", json=item()).raise_for_status()
+
+
+@case("http.predict_batch", items=100)
+def _(f):
+    post, items = f.client.post, f.items[:100]
+    return lambda: post("/predict/batch", json=items).raise_for_status()
+
+
+@case("zipcode.streamlit")
+def _(f):
+    sys.path.insert(0, os.path.abspath("streamlit"))
+    import zipcodes
+
+    zip_code = cycle(f.zip_codes[:1000].tolist())
+
+    def lookup():
+        code = zip_code()
+        return zipcodes.get_lat(code), zipcodes.get_long(code), zipcodes.get_province(code), zipcodes.get_region(code)
+    return lookup
+
+
+@case("zipcode.record")
+def _(f):
+    index, zip_code = f.index, cycle(f.zip_codes[:1000].tolist())
+    return lambda: index[zip_code()]
+
+
+@case("zipcode.lookup_many", items=10_000)
+def _(f):
+    lookup_many, zip_codes = f.index.lookup_many, f.zip_codes
+    return lambda: lookup_many(zip_codes)
+
+
+@case("zipcode.nearest")
+def _(f):
+    nearest, item = f.locator.nearest, cycle(f.items)
+
+    def lookup():
+        point = item()
+        return nearest(point["latitude"], point["longitude"])
+    return lookup
+
+
+@case("zipcode.nearest_many", items=BATCH_SIZE)
+def _(f):
+    query = f.locator.query
+    latitudes = np.array([item["latitude"] for item in f.items])
+    longitudes = np.array([item["longitude"] for item in f.items])
+    return lambda: query(latitudes, longitudes)
+
+
+_calibration_data = np.random.default_rng(0).random(5000)
+
+
+def calibration_work():
+    """Fixed work of the same kind as the cases: dicts and floats in Python, small NumPy calls."""
+    record = {}
+    for index in range(300):
+        record[f"field_{index % 20}"] = float(index) * 1.5
+    return np.sort(_calibration_data)[::100].sum() + sum(record.values())
+
+
+def calls_per_loop(operation, min_loop_time):
+    """Returns how many calls of ``operation`` take at least ``min_loop_time``."""
+    operation()
+    number = 1
+    while True:
+        elapsed = time_loop(operation, number)
+        if elapsed >= min_loop_time:
+            return number
+        number = max(number * 2, int(number * min_loop_time / max(elapsed, 1e-9) * 1.2))
+
+
+def time_loop(operation, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        operation()
+    return time.perf_counter() - start
+
+
+def measure(operation, repeat):
+    """Times ``repeat`` loops of ``operation``, each right after a loop of ``calibration_work``.
+
+    Returns the seconds per call of the operation and of the calibration in
+    every repeat, and the calls of the operation per loop.
+    """
+    number = calls_per_loop(operation, MIN_LOOP_TIME)
+    calibration_number = calls_per_loop(calibration_work, CALIBRATION_LOOP_TIME)
+    timings, calibrations = [], []
+    for _ in range(repeat):
+        calibrations.append(time_loop(calibration_work, calibration_number) / calibration_number)
+        timings.append(time_loop(operation, number) / number)
+    return timings, calibrations, number
+
+
+def environment():
+    import xgboost
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "xgboost": xgboost.__version__,
+    }
+
+
+def run(names, repeat, fixtures=None):
+    """Runs the cases ``names`` and returns their results, in the format of the baselines."""
+    owned = fixtures is None
+    fixtures = fixtures or Fixtures()
+    results = {}
+    print(f"{'case':<28} {'items':>6} {'min':>11} {'median':>11} {'per item':>11}")
+    try:
+        for name in names:
+            setup, items = CASES[name]
+            timings, calibrations, number = measure(setup(fixtures), repeat)
+            relative = [timing / calibration for timing, calibration in zip(timings, calibrations)]
+            results[name] = {
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "max": max(timings),
+                "items": items,
+                "calls": number,
+                "repeat": repeat,
+                "calibration": statistics.median(calibrations),
+                # Timings in units of calibration_work
+                "relative_min": min(relative),
+                "relative_median": statistics.median(relative),
+            }
+            print(f"{name:<28} {items:>6} {format_seconds(min(timings))} {format_seconds(statistics.median(timings))} "
+                  f"{format_seconds(min(timings) / items)}")
+    finally:
+        if owned:
+            fixtures.close()
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "cases": results,
+    }
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit:<2}"
+    return f"{seconds / 1e-9:8.1f} ns"
+
+
+def select(prefixes):
+    names = [name for name in CASES if not prefixes or any(name.startswith(prefix) for prefix in prefixes)]
+    if not names:
+        sys.exit(f"No case matches {' '.join(prefixes)}; cases: {', '.join(CASES)}")
+    return names
+
+
+def write(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {path}")
+
+
+def ratio(before, after, stat, normalize=True):
+    """Returns how many times slower ``after`` is than ``before``, corrected for the machine speed."""
+    if normalize:
+        return after["relative_" + stat] / before["relative_" + stat]
+    return after[stat] / before[stat]
+
+
+def compare(baseline, current, threshold, stat, normalize=True):
+    """Prints the ratio of every case to its baseline; returns the names of the regressed cases."""
+    for key, value in baseline["environment"].items():
+        if current["environment"].get(key) != value:
+            print(f"warning: {key} differs from the baseline: {current['environment'].get(key)} != {value}")
+
+    regressions = []
+    print(f"{'case':<28} {'baseline':>11} {'current':>11} {'machine':>7} {'ratio':>7}")
+    for name in sorted(set(baseline["cases"]) | set(current["cases"])):
+        before, after = baseline["cases"].get(name), current["cases"].get(name)
+        if before is None or after is None:
+            print(f"{name:<28} {'new case' if before is None else 'not run'}")
+            continue
+        value = ratio(before, after, stat, normalize)
+        status = ""
+        if value > 1 + threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif value < 1 - threshold:
+            status = "faster"
+        machine = after["calibration"] / before["calibration"]
+        print(f"{name:<28} {format_seconds(before[stat])} {format_seconds(after[stat])} {machine:7.2f} {value:7.2f} {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the cases and print their timings")
+    run_parser.add_argument("--out", help="also write the results to this JSON file")
+    baseline_parser = commands.add_parser("baseline", help="run the cases and write them as the baseline")
+    baseline_parser.add_argument("--out", default=BASELINE_PATH)
+    compare_parser = commands.add_parser("compare", help="compare with the baseline; fails on regressions")
+    compare_parser.add_argument("--baseline", default=BASELINE_PATH)
+    compare_parser.add_argument("--current", help="results to compare (default: run the cases of the baseline)")
+    compare_parser.add_argument("--threshold", type=float, default=0.25,
+                                help="slowdown tolerated before a case counts as a regression (0.25: 25%%)")
+    compare_parser.add_argument("--stat", choices=("min", "median"), default="min")
+    compare_parser.add_argument("--confirm", type=int, default=2, help="measurements of a regressed case before it fails")
+    compare_parser.add_argument("--no-normalize", dest="normalize", action="store_false",
+                                help="compare raw timings, without correcting for the machine speed")
+    for command in (run_parser, baseline_parser, compare_parser):
+        command.add_argument("--repeat", type=int, default=7)
+        command.add_argument("cases", nargs="*", metavar="CASE_PREFIX", help="only run the cases starting with these")
+    args = parser.parse_args()
+
+    if args.command in ("run", "baseline"):
+        results = run(select(args.cases), args.repeat)
+        if args.out:
+            write(results, args.out)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        names = [name for name in select(args.cases) if name in baseline["cases"]]
+        fixtures = Fixtures()
+        try:
+            current = run(names, args.repeat, fixtures)
+            for _ in range(args.confirm):
+                suspects = [
+                    name for name in names
+                    if ratio(baseline["cases"][name], current["cases"][name], args.stat, args.normalize) > 1 + args.threshold
+                ]
+                if not suspects:
+                    break
+                print(f"\nMeasuring again: {', '.join(suspects)}")
+                for name, result in run(suspects, args.repeat, fixtures)["cases"].items():
+                    before = baseline["cases"][name]
+                    if ratio(before, result, args.stat, args.normalize) < ratio(before, current["cases"][name], args.stat, args.normalize):
+                        current["cases"][name] = result
+        finally:
+            fixtures.close()
+        print()
+    regressions = compare(baseline, current, args.threshold, args.stat, args.normalize)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"No regression above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Checks the NumPy tree evaluator against XGBoost and times both.
+
+Predictions of ``api.tree_engine.TreeEnsemble`` are compared to
+``model.predict`` on a generated feature matrix (including missing values),
+then both engines are timed at several batch sizes.
+
+Usage:
+    python -m benchmarks.tree_engine --sizes 1 100 10000
+"""
+import argparse
+import math
+import time
+
+import joblib
+import numpy as np
+
+from api.features import FeatureAssembler
+from api.tree_engine import TreeEnsemble
+from benchmarks.common import ARTIFACTS_PATH, make_items
+
+
+def best_time(fn, X, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000], help="batch sizes to time")
+    parser.add_argument("--repeat", type=int, default=20, help="timed repetitions per batch size")
+    args = parser.parse_args()
+
+    artifacts = joblib.load(ARTIFACTS_PATH)
+    model = artifacts["model"]
+    assembler = FeatureAssembler.from_artifacts(artifacts)
+
+    start = time.perf_counter()
+    engine = TreeEnsemble.from_booster(model)
+    compile_time = time.perf_counter() - start
+
+    items = make_items(max(args.sizes))
+    X = np.vstack([assembler.assemble(item) for item in items])
+    # Missing values follow each node's default direction
+    X[::5, 5] = np.nan
+    X[::11, 0] = np.nan
+
+    expected = model.predict(X)
+    actual = engine.predict(X)
+    max_error = float(np.max(np.abs(expected - actual)))
+    assert np.allclose(expected, actual, rtol=1e-6), f"max abs difference {max_error}"
+
+    print(f"trees: {engine.n_trees}, nodes: {len(engine.feature)}, max depth: {engine.max_depth}, "
+          f"compiled in {compile_time * 1e3:.1f} ms")
+    print(f"parity on {len(X)} rows: max abs difference {max_error}, "
+          f"{np.mean(expected == actual):.2%} bit-identical")
+    print(f"{'batch size':>10} {'xgboost':>12} {'numpy':>12}")
+    for size in args.sizes:
+        batch = X[:size]
+        xgb_time = best_time(model.predict, batch, args.repeat)
+        numpy_time = best_time(engine.predict, batch, args.repeat)
+        print(f"{size:>10} {xgb_time * 1e3:>9.3f} ms {numpy_time * 1e3:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Memory and throughput of the forking server for several worker counts.
+
+For each worker count, ``python -m api.serve`` is started, loaded with
+concurrent /predict requests, and the resident (RSS), unique (USS) and
+proportional (PSS) memory of every worker is reported. USS is the memory a
+worker does not share; with copy-on-write preloading it stays well below RSS.
+
+Usage:
+    python -m benchmarks.workers --workers 1 2 4 8 --requests 4000
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import psutil
+
+from benchmarks.common import make_items
+from benchmarks.load_test import drive
+from benchmarks.server import running_server
+
+MB = 1024 * 1024
+
+
+def server_processes(port):
+    """Finds the api.serve parent listening on ``port`` and its worker children."""
+    for process in psutil.process_iter(["cmdline"]):
+        cmdline = process.info["cmdline"] or []
+        if "api.serve" in cmdline and str(port) in cmdline:
+            return process, process.children()
+    raise RuntimeError("api.serve process not found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=4000, help="requests sent per worker count")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    items = make_items(args.requests)
+    print(f"{'workers':>7} {'RSS/worker':>11} {'USS/worker':>11} {'PSS total':>10} {'req/s':>8}")
+    for workers in args.workers:
+        command = [sys.executable, "-m", "api.serve", "--port", "{port}", "--workers", str(workers)]
+        with running_server({"CACHE_SIZE": "0"}, command=command) as url:
+            port = int(url.rsplit(":", 1)[1])
+            # Give every worker time to finish starting before measuring
+            time.sleep(1 + workers * 0.2)
+            latencies, errors, elapsed = asyncio.run(drive(url, items, args.concurrency))
+
+            _, children = server_processes(port)
+            memory = [child.memory_full_info() for child in children]
+            rss = sum(m.rss for m in memory) / len(memory) / MB
+            uss = sum(m.uss for m in memory) / len(memory) / MB
+            pss = sum(m.pss for m in memory) / MB
+            print(f"{workers:>7} {rss:>8.1f} MB {uss:>8.1f} MB {pss:>7.1f} MB {len(latencies) / elapsed:>8.0f}"
+                  + (f"  ({errors} errors)" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compares zip code lookups: DataFrame scans against the zip code index.
+
+Single lookups, all four fields of one zip code as ``06_predict.py`` and
+``02_location.py`` need them:
+
+- scan: the former ``streamlit/zipcodes.py``, one boolean mask over the
+  whole DataFrame per field
+- index: one ``ZipcodeIndex`` lookup returning the whole record
+
+Bulk lookups, the region and coordinates of a vector of zip codes:
+
+- scan: one DataFrame scan per zip code
+- merge: ``pandas.merge`` against the zip code table
+- index: ``ZipcodeIndex.lookup_many``
+
+Usage:
+    python -m benchmarks.zipcode_lookup --rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from api import config
+from api.zipcode_index import ZipcodeIndex
+
+
+def scan_record(zipcodes, zip_code):
+    return tuple(
+        zipcodes[zipcodes["zip_code"] == zip_code][name].values[0]
+        for name in ("latitude", "longitude", "province", "region")
+    )
+
+
+def index_record(index, zip_code):
+    record = index[zip_code]
+    return record.latitude, record.longitude, record.province, record.region
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=1000, help="single lookups per timing")
+    parser.add_argument("--rows", type=int, default=100_000, help="zip codes per bulk lookup")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    zipcodes = pd.read_csv(config.ZIPCODES_PATH)
+    read_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index = ZipcodeIndex.from_csv(config.ZIPCODES_PATH)
+    build_seconds = time.perf_counter() - start
+    print(f"Load: read_csv {read_seconds * 1e3:.1f} ms, index {build_seconds * 1e3:.1f} ms ({len(index)} zip codes)")
+
+    rng = np.random.default_rng(0)
+    codes = rng.choice(index.zip_codes, size=args.rows)
+    single = codes[: args.lookups].tolist()
+    for zip_code in single[:50]:
+        np.testing.assert_equal(scan_record(zipcodes, zip_code), index_record(index, zip_code))
+
+    print("\nSingle lookups, all fields of one zip code")
+    timings = {
+        "scan": best_of(lambda: [scan_record(zipcodes, zip_code) for zip_code in single], repeat=3),
+        "index": best_of(lambda: [index_record(index, zip_code) for zip_code in single]),
+    }
+    for name, seconds in timings.items():
+        print(f"{name:<8} {seconds / len(single) * 1e6:9.2f} us  x{timings['scan'] / seconds:,.0f}")
+
+    print(f"\nBulk lookups, {args.rows} zip codes")
+    table = zipcodes.drop_duplicates("zip_code")[["zip_code", "region", "latitude", "longitude"]]
+    # A DataFrame scan per row is far too slow for the whole vector: time a sample and extrapolate
+    sample = codes[:200].tolist()
+    scan_seconds = best_of(lambda: [scan_record(zipcodes, zip_code) for zip_code in sample], repeat=1)
+    timings = {
+        "scan": scan_seconds * args.rows / len(sample),
+        "merge": best_of(lambda: pd.DataFrame({"zip_code": codes}).merge(table, on="zip_code", how="left")),
+        "index": best_of(lambda: index.lookup_many(codes)),
+    }
+    merged = pd.DataFrame({"zip_code": codes}).merge(table, on="zip_code", how="left")
+    np.testing.assert_array_equal(merged["latitude"].to_numpy(), index.lookup_many(codes)["latitude"])
+    for name, seconds in timings.items():
+        print(f"{name:<8} {seconds * 1e3:9.2f} ms  {args.rows / seconds:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
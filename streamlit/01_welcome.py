@@ -1,15 +1,14 @@
 import streamlit as st
-from PIL import Image
 from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.app_logo import add_logo
+from reference_data import add_logo, load_reference_data
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
 
 # Configure Streamlit page settings
 st.set_page_config(
     page_title="Welcome",
-    page_icon=page_icon_image,
+    page_icon=reference.page_icon,
     layout='wide'
 )
 
@@ -35,7 +34,7 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 # Display header text
 st.write("# Welcome to PRICE Real Estate Predictor 👋")
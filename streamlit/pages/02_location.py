@@ -1,22 +1,31 @@
-import json
-
 import folium
-from PIL import Image
+from folium.plugins import HeatMap
 from streamlit_extras.switch_page_button import switch_page
 from streamlit_folium import st_folium
-from zipcodes import get_lat, get_long
-from streamlit_extras.app_logo import add_logo
+from zipcodes import get_lat, get_long, get_nearest
+from reference_data import add_logo, load_reference_data
+from prediction_client import PredictionError, get_client
 
 import streamlit as st
 
 lat, lon = "50.4564", "4.1851"
 coords = [lat, lon]
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_heatmap(profile):
+    """Returns the ``[lat, lon, price]`` points of the price heatmap of a profile, or None."""
+    try:
+        return get_client().heatmap(profile)[0]["points"]
+    except PredictionError:
+        return None
+
 
 # Configure Streamlit page settings
-st.set_page_config(layout="wide", page_title="Location", page_icon=page_icon_image)
+st.set_page_config(layout="wide", page_title="Location", page_icon=reference.page_icon)
 
 # Sidebar header
 st.sidebar.header("Location")
@@ -24,16 +33,6 @@ st.sidebar.header("Location")
 # Main title
 st.title("Location")
 
-# Load unique property data from JSON files
-with open('streamlit/uniques.json', 'r') as f:
-    unique_properties = json.load(f)
-
-with open('streamlit/uniques_formatted.json','r') as f2:
-    unique_properties_formatted = json.load(f2)  
-
-with open('streamlit/localities.json','r') as f3:
-    localities2 = json.load(f3) 
-
 # Hide default Streamlit format for cleaner UI
 hide_default_format = """
        <style>
@@ -56,7 +55,7 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 # Define the layout in two columns
 left_column, right_column = st.columns([1, 1])  # Adjust the column widths as needed
@@ -64,24 +63,30 @@ left_column, right_column = st.columns([1, 1])  # Adjust the column widths as ne
 # Left column for the image
 with left_column:
     # Select property type
-    display_subproperty_types = sorted(unique_properties_formatted['subproperty_type'])
+    display_subproperty_types = reference.options['subproperty_type']
     selected_subproperty_type = st.selectbox('Select the type of property', display_subproperty_types)
     st.session_state.subproperty_type = selected_subproperty_type.upper().replace(' ', '_')
 
     # Select locality
-    localities = sorted(unique_properties['locality'])
+    localities = reference.localities
     selected_locality = st.selectbox('Select the locality', localities)
     st.session_state.locality = selected_locality
 
     # Select zip code
-    zip_codes = localities2[selected_locality]
-    selected_zip_code = st.selectbox("Enter the zip code", sorted(zip_codes))
+    zip_codes = reference.locality_zip_codes[selected_locality]
+    selected_zip_code = st.selectbox("Enter the zip code", zip_codes)
     st.session_state.zip_code = selected_zip_code
     
     if selected_zip_code:
         lat, lon = get_lat(selected_zip_code), get_long(selected_zip_code)
         coords = [lat, lon]
 
+    # Determine property type based on subproperty type
+    if st.session_state.subproperty_type in reference.house_subtypes:
+        st.session_state.property_type = 'HOUSE'
+    else:
+        st.session_state.property_type = 'APARTMENT'
+
 # Right column for the input fields and prediction result
 with right_column:
     
@@ -95,23 +100,42 @@ with right_column:
     # Add LatLngPopup plugin
     folium.LatLngPopup().add_to(m)
 
+    # Estimated price of a typical property of the selected type, per zip code
+    points = load_heatmap(st.session_state.property_type.lower())
+    if points:
+        prices = [price for _, _, price in points]
+        low, high = min(prices), max(prices)
+        spread = (high - low) or 1.0
+        heat = [[point_lat, point_lon, (price - low) / spread] for point_lat, point_lon, price in points]
+        layer = folium.FeatureGroup(name='Estimated prices', show=True)
+        HeatMap(heat, radius=18, blur=15, min_opacity=0.3).add_to(layer)
+        layer.add_to(m)
+        folium.LayerControl(collapsed=True).add_to(m)
+
     # Call to render Folium map in Streamlit
     osm_data = st_folium(m, width=750, height=400)
 
     if osm_data["last_clicked"]:
         lat, lon = osm_data["last_clicked"]["lat"], osm_data["last_clicked"]["lng"]
+
+        # Take the zip code and locality of the clicked point, so that the
+        # province and region sent for prediction match the coordinates
+        nearest = get_nearest(lat, lon)
+        if nearest is not None:
+            st.session_state.zip_code = nearest.record.zip_code
+            if nearest.locality:
+                st.session_state.locality = nearest.locality
+            st.markdown(f'Selected location: {nearest.record.zip_code} {nearest.locality or ""} '
+                        f'({nearest.record.province}, {nearest.record.region})')
     
     st.session_state["lat"] = lat
     st.session_state["lon"] = lon
 
     st.markdown('The algorithm estimates the coordinates based on the provided zip code.')
     st.markdown('If you want to use more accurate coordinates, select the position on the map.')
-
-    # Determine property type based on subproperty type
-    if st.session_state.subproperty_type in unique_properties['house_subtypes']:
-        st.session_state.property_type = 'HOUSE'
-    else:
-        st.session_state.property_type = 'APARTMENT'
+    if points:
+        st.caption(f'Zoom out to see the estimated price of a typical {st.session_state.property_type.lower()} '
+                   f'across Belgium, from {low:,.0f} € (blue) to {high:,.0f} € (red).')
 
 # Button to proceed to the next step
 next_button = st.button("Next")
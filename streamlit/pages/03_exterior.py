@@ -1,15 +1,13 @@
 import streamlit as st
-import json
-from PIL import Image
 from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.app_logo import add_logo
+from reference_data import add_logo, load_reference_data
 
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
 
 # Configure Streamlit page settings
-st.set_page_config(page_title="Exterior", page_icon=page_icon_image)
+st.set_page_config(page_title="Exterior", page_icon=reference.page_icon)
 
 # Sidebar header
 st.sidebar.header("Exterior")
@@ -17,12 +15,8 @@ st.sidebar.header("Exterior")
 # Main title
 st.title("Exterior")
 
-# Load unique property data from JSON files
-with open('streamlit/uniques.json', 'r') as f:
-    unique_properties = json.load(f)
-
-with open('streamlit/uniques_formatted.json', 'r') as f2:
-    unique_properties_formatted = json.load(f2)
+# Unique property values
+unique_properties = reference.uniques
 
 # Hide default Streamlit format for cleaner UI
 hide_default_format = """
@@ -46,7 +40,7 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 
 # Take user inputs for exterior features
@@ -1,15 +1,13 @@
 import streamlit as st
-import json
-from PIL import Image
 from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.app_logo import add_logo
+from reference_data import add_logo, load_reference_data
 
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
 
 # Configure Streamlit page settings
-st.set_page_config(page_title="Interior", page_icon=page_icon_image)
+st.set_page_config(page_title="Interior", page_icon=reference.page_icon)
 
 # Sidebar header
 st.sidebar.header("Interior")
@@ -17,12 +15,8 @@ st.sidebar.header("Interior")
 # Main title
 st.title("Interior")
 
-# Load unique property data from JSON files
-with open('streamlit/uniques.json', 'r') as f:
-    unique_properties = json.load(f)
-
-with open('streamlit/uniques_formatted.json', 'r') as f2:
-    unique_properties_formatted = json.load(f2)  
+# Unique property values
+unique_properties = reference.uniques
 
 # Hide default Streamlit format for cleaner UI
 hide_default_format = """
@@ -46,19 +40,19 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 
 # Take user inputs for interior features
 nbr_bedrooms = st.number_input('Number of bedrooms', min_value=1, max_value=int(unique_properties['nbr_bedrooms']), step=1)
 st.session_state.nbr_bedrooms = nbr_bedrooms
 
-equipped_kitchen_display = sorted(unique_properties_formatted['equipped_kitchen'])
+equipped_kitchen_display = reference.options['equipped_kitchen']
 equipped_kitchen_selected = st.selectbox('Select the most appropriate description of the kitchen equipment', equipped_kitchen_display)
 equipped_kitchen = equipped_kitchen_selected.upper().replace(' ', '_')    
 st.session_state.equipped_kitchen = equipped_kitchen
 
-state_building_display = sorted(unique_properties_formatted['state_building'])
+state_building_display = reference.options['state_building']
 state_building_selected = st.selectbox('Select the most appropriate description of the building condition', state_building_display)
 state_building = state_building_selected.upper().replace(' ', '_')
 st.session_state.state_building = state_building
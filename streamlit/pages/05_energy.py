@@ -1,15 +1,13 @@
 import streamlit as st
-import json
-from PIL import Image
 from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.app_logo import add_logo
+from reference_data import add_logo, load_reference_data
 
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
 
 # Configure Streamlit page settings
-st.set_page_config(page_title="Energy", page_icon=page_icon_image)
+st.set_page_config(page_title="Energy", page_icon=reference.page_icon)
 
 # Sidebar header
 st.sidebar.header("Energy")
@@ -17,13 +15,6 @@ st.sidebar.header("Energy")
 # Main title
 st.title("Energy")
 
-# Load unique property data from JSON files
-with open('streamlit/uniques.json', 'r') as f:
-    unique_properties = json.load(f)
-
-with open('streamlit/uniques_formatted.json', 'r') as f2:
-    unique_properties_formatted = json.load(f2)  
-
 # Hide default Streamlit format for cleaner UI
 hide_default_format = """
        <style>
@@ -46,16 +37,16 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 
 # Take user inputs for energy features
-epc_display = sorted(unique_properties_formatted['epc'])
+epc_display = reference.options['epc']
 epc_selected = st.radio("In which EPC class is the property?", epc_display, horizontal=True)
 epc = epc_selected.upper().replace(' ', '_')
 st.session_state.epc = epc
 
-heating_type_display = sorted(unique_properties_formatted['heating_type'])
+heating_type_display = reference.options['heating_type']
 heating_type_selected = st.radio("Which type of heating is used?", heating_type_display, horizontal=True)
 heating_type = heating_type_selected.upper().replace(' ', '_')
 st.session_state.heating_type = heating_type
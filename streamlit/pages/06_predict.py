@@ -1,21 +1,19 @@
 import streamlit as st
-import json
-from PIL import Image
 from zipcodes import  get_province, get_region
 from pydantic import BaseModel
-import requests
 import pandas as pd
 from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.app_logo import add_logo
+from reference_data import add_logo, load_reference_data
+from prediction_client import PredictionError, get_client
 
 
-# Load the image for the page icon
-page_icon_image = Image.open('streamlit/images/Price_Real_Estate_Logo.png')
+# Load the reference data shared by all pages (once per server process)
+reference = load_reference_data()
 
 # Configure Streamlit page settings
 st.set_page_config(
     page_title="Hello Streamlit",
-    page_icon=page_icon_image,
+    page_icon=reference.page_icon,
     layout='wide'
 )
 
@@ -42,7 +40,7 @@ background_image = """
 
 st.markdown(background_image, unsafe_allow_html=True)
 
-add_logo('streamlit/images/Price_Real_Estate_Logo_small.png', height=200)
+add_logo(height=200)
 
 
 
@@ -56,13 +54,6 @@ st.markdown("Review your selected values before proceeding.")
 st.markdown("When all data is correct, click on 'Predict!' to estimate a price or 'Another one!' to start a new prediction")
 
 
-# Load unique property data from JSON files
-with open('streamlit/uniques.json', 'r') as f:
-    unique_properties = json.load(f)
-
-with open('streamlit/uniques_formatted.json', 'r') as f2:
-    unique_properties_formatted = json.load(f2)  
-
 # Hide default Streamlit format for cleaner UI
 hide_default_format = """
        <style>
@@ -185,6 +176,36 @@ df2 = df.iloc[9:]
 
 
 
+def what_if_variations(inputs):
+    """Variations charted under the prediction, by tab label: one sensitivity call each."""
+    area = inputs['total_area_sqm']
+    bedrooms = inputs['nbr_bedrooms']
+    return {
+        'Living area (m²)': {'field': 'total_area_sqm', 'range': {'start': max(10, round(area * 0.5)), 'stop': round(area * 1.5) + 1, 'step': max(1, round(area / 20))}},
+        'Bedrooms': {'field': 'nbr_bedrooms', 'range': {'start': 1, 'stop': max(6, bedrooms + 2), 'step': 1}},
+        'EPC': {'field': 'epc', 'values': [epc for epc in reference.uniques['epc'] if epc != 'MISSING']},
+        'Building condition': {'field': 'state_building', 'values': [state for state in reference.uniques['state_building'] if state != 'MISSING']},
+    }
+
+
+def show_what_if(inputs):
+    """Charts how the predicted price changes with a few features."""
+    st.markdown('What if? See how the price changes when one feature changes.')
+    variations = what_if_variations(inputs)
+    for tab, (label, variation) in zip(st.tabs(list(variations)), variations.items()):
+        with tab:
+            result, _ = get_client().sensitivity(inputs, [variation])
+            field = variation['field']
+            curve = pd.DataFrame(
+                {label: [row[field] for row in result['results']], 'Price (€)': [row['price'] for row in result['results']]}
+            ).set_index(label)
+            if 'range' in variation:
+                st.line_chart(curve)
+            else:
+                curve.index = curve.index.str.replace('_', ' ').str.capitalize()
+                st.bar_chart(curve)
+
+
 # Display the DataFrames
 with left_column:
     st.table(df1)
@@ -203,16 +224,17 @@ with right_column:
     if st.button('Predict!'):
         with st.spinner('Wait for it...'):
             try:
-                r = requests.post('https://immoelizapredictor.onrender.com/predict', json=inputs)
-                if r.status_code == 200:
-                    response_data = r.json()
-                    lower_bound = response_data['price_range']['lower_bound'].replace(',', '')
-                    upper_bound = response_data['price_range']['upper_bound'].replace(',', '')
-                    formatted_lower_bound = "€{:,.0f}".format(round(int(lower_bound) / 1000) * 1000)
-                    formatted_upper_bound = "€{:,.0f}".format(round(int(upper_bound) / 1000) * 1000)
-                    st.subheader(f"Predicted price range: {formatted_lower_bound} - {formatted_upper_bound}")
-                else:
-                    st.error(f"Error: {r.text}")
+                prediction = get_client().predict(inputs)
+                lower_bound = prediction.price_range['lower_bound'].replace(',', '')
+                upper_bound = prediction.price_range['upper_bound'].replace(',', '')
+                formatted_lower_bound = "€{:,.0f}".format(round(int(lower_bound) / 1000) * 1000)
+                formatted_upper_bound = "€{:,.0f}".format(round(int(upper_bound) / 1000) * 1000)
+                st.subheader(f"Predicted price range: {formatted_lower_bound} - {formatted_upper_bound}")
+                if prediction.source == 'local':
+                    st.caption('The prediction service is unavailable: this estimate was computed by the app itself.')
+                show_what_if(inputs)
+            except PredictionError as e:
+                st.error(f"Error: {e}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 
@@ -0,0 +1,385 @@
+"""Client of the prediction API used by the location and predict pages.
+
+``PredictionClient`` keeps a pooled keep-alive ``requests.Session``, so a
+click reuses the connection (and TLS session) of the previous one, and
+bounds every attempt with connect and read timeouts. Connection errors,
+timeouts and 429, 502, 503 and 504 answers are retried with jittered
+exponential backoff; other 5xx answers fail over at once.
+
+Each endpoint has its own circuit breaker. It counts a failure when a
+request ends in a connection error, a timeout or a 5xx answer, except the
+503 of a heatmap that is still being built; after ``BREAKER_FAILURES``
+failures in a row it opens and requests to that endpoint skip the API for
+``BREAKER_RESET_SECONDS``, then one trial request is let through.
+
+Requests that cannot be served by the API are scored in-process with the
+same artifact bundle (``LocalScorer``), loaded on first use. Inputs the API
+rejects (422) are not retried nor scored locally.
+
+Settings are read from environment variables, see below. ``get_client()``
+returns the client shared by all sessions of the server process.
+"""
+import functools
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# The local fallback uses the API package, at the root of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_URL = os.environ.get("PREDICT_API_URL", "https://immoelizapredictor.onrender.com/predict")
+CONNECT_TIMEOUT = float(os.environ.get("PREDICT_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("PREDICT_READ_TIMEOUT", "10"))
+# Retries after the first attempt, and the bounds of the backoff in seconds
+RETRIES = int(os.environ.get("PREDICT_RETRIES", "2"))
+BACKOFF_BASE = float(os.environ.get("PREDICT_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.environ.get("PREDICT_BACKOFF_MAX", "2"))
+BREAKER_FAILURES = int(os.environ.get("PREDICT_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("PREDICT_BREAKER_RESET_SECONDS", "30"))
+# PREDICT_LOCAL_FALLBACK=0 shows an error instead of scoring in-process
+LOCAL_FALLBACK = os.environ.get("PREDICT_LOCAL_FALLBACK", "1") == "1"
+
+# Answers worth retrying: rate limited, or the backend is restarting or overloaded.
+# Other 5xx answers make the request fail over without retries.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Detail of the 503 answered by /heatmap while the heatmap is built: the API is up
+HEATMAP_BUILDING = "The heatmap is being built"
+
+# Latencies kept per source for the percentiles
+LATENCY_WINDOW = 1000
+
+
+class PredictionError(Exception):
+    """The inputs were rejected, or no prediction could be made."""
+
+
+class ApiUnavailable(Exception):
+    """The API could not serve a request, after retries.
+
+    ``failure`` tells whether the API itself failed (connection error,
+    timeout or 5xx answer), as opposed to it being busy.
+    """
+
+    def __init__(self, reason, failure=True):
+        super().__init__(reason)
+        self.failure = failure
+
+
+class Prediction(NamedTuple):
+    price_range: dict  # {"lower_bound": "498,827", "upper_bound": "551,336"}
+    model_version: str
+    source: str  # "api" or "local"
+    latency: float  # seconds, retries and backoff included
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed, open, then half-open for one trial request."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0  # times the breaker opened
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Tells whether a request may go to the API now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = self.clock()
+
+
+class LocalScorer:
+    """Scores inputs in-process with the API's artifact bundle, loaded on first use."""
+
+    def __init__(self, artifacts_path=None):
+        self.artifacts_path = artifacts_path
+        self._bundle = None
+        self._heatmaps = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._bundle is None:
+                from api import config
+                from api.bundle import ModelBundle
+
+                self._bundle = ModelBundle.load(self.artifacts_path or config.ARTIFACTS_PATH, engine=config.INFERENCE_ENGINE)
+                self._bundle.warm_up()
+            return self._bundle
+
+    def predict(self, inputs):
+        """Returns the response the API would give for ``inputs``."""
+        from api.scoring import score_records, validate_item
+
+        bundle = self._load()
+        row, errors = validate_item(inputs, bundle)
+        if errors:
+            raise PredictionError(_describe(errors))
+        result = score_records([row], bundle)[0]
+        if isinstance(result, Exception):
+            raise PredictionError(str(result))
+        return result
+
+    def sensitivity(self, payload):
+        """Returns the response ``/predict/sensitivity`` would give for ``payload``."""
+        from pydantic import ValidationError
+
+        from api.scoring import SensitivityRequest, score_sensitivity, variation_values
+
+        bundle = self._load()
+        try:
+            request = SensitivityRequest.model_validate(payload)
+        except ValidationError as e:
+            raise PredictionError(_describe(e.errors())) from e
+        record = request.item.dict()
+        pairs, errors = variation_values(request.variations, bundle)
+        errors = bundle.unknown_category_errors(record) + (errors or [])
+        if errors:
+            raise PredictionError(_describe(errors))
+        return score_sensitivity(record, pairs, bundle)
+
+    def heatmap(self, profile):
+        """Returns the response ``/heatmap/{profile}`` would give, building the heatmap if needed."""
+        from api.heatmap import PROFILES, HeatmapStore, build_heatmap
+
+        if profile not in PROFILES:
+            raise PredictionError(f"Unknown profile {profile!r}")
+        bundle = self._load()
+        with self._lock:
+            if self._heatmaps is None:
+                self._heatmaps = HeatmapStore()
+            if not self._heatmaps.is_current(bundle.checksum):
+                build_heatmap(bundle, self._heatmaps.directory)
+        points = self._heatmaps.layer(profile)
+        return {"profile": profile, "model_version": bundle.version, "stale": False, "points": points}
+
+
+def _describe(errors):
+    """Joins validation errors in the pydantic format into one message."""
+    return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in errors)
+
+
+def _percentiles(values, quantiles=(50, 90, 99)):
+    """Nearest-rank percentiles of ``values``, in milliseconds."""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {f"p{q}": round(ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)] * 1e3, 2) for q in quantiles}
+
+
+def _is_failure(response):
+    """Tells whether an answer means the API failed, rather than being busy or building a heatmap."""
+    if response.status_code < 500:
+        return False
+    try:
+        return response.json().get("detail") != HEATMAP_BUILDING
+    except (ValueError, AttributeError):
+        return True
+
+
+# Endpoints of the client, each with its own circuit breaker
+ENDPOINTS = ("predict", "sensitivity", "heatmap")
+
+
+class PredictionClient:
+    """Resilient client of ``POST /predict``, with an optional in-process fallback.
+
+    ``breaker_factory`` makes the circuit breaker of each endpoint.
+    """
+
+    def __init__(
+        self,
+        url=API_URL,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries=RETRIES,
+        backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+        breaker_factory=CircuitBreaker,
+        fallback=None,
+        pool_size=10,
+    ):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breakers = {endpoint: breaker_factory() for endpoint in ENDPOINTS}
+        self.fallback = fallback
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._latencies = {"api": deque(maxlen=LATENCY_WINDOW), "local": deque(maxlen=LATENCY_WINDOW)}
+        self._counts = {"api": 0, "local": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    def close(self):
+        self.session.close()
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, or the server's Retry-After when it is shorter than the cap."""
+        if retry_after is not None and 0 <= retry_after <= self.backoff_max:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _request(self, url, payload=None):
+        """Posts ``payload``, or gets ``url`` without one, retrying transient failures.
+
+        Raises ApiUnavailable when out of retries.
+        """
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            failure = True
+            try:
+                if payload is None:
+                    response = self.session.get(url, timeout=self.timeout)
+                else:
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = e
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code >= 500 and response.status_code not in RETRY_STATUSES:
+                    raise ApiUnavailable(f"HTTP {response.status_code}")
+                if response.status_code not in RETRY_STATUSES:
+                    self._count("rejected")
+                    raise PredictionError(response.text)
+                reason = f"HTTP {response.status_code}"
+                failure = _is_failure(response)
+                try:
+                    retry_after = float(response.headers.get("Retry-After"))
+                except (TypeError, ValueError):
+                    pass
+
+            if attempt < self.retries:
+                self._count("retries")
+                time.sleep(self._backoff(attempt, retry_after))
+        raise ApiUnavailable(reason, failure)
+
+    def _call(self, url, payload, endpoint, local_argument=None):
+        """Returns ``(response, source, latency)`` from the API or, when it is unavailable, from the fallback.
+
+        ``endpoint`` names the breaker and the fallback method, which is
+        called with ``local_argument``, by default the payload.
+        """
+        start = time.perf_counter()
+        breaker = self.breakers[endpoint]
+        if breaker.allow():
+            try:
+                result = self._request(url, payload)
+            except ApiUnavailable as e:
+                if e.failure:
+                    breaker.record_failure()
+                else:
+                    # The API answered: it is up, but busy
+                    breaker.record_success()
+                self._count("failures")
+                if self.fallback is None:
+                    raise PredictionError(f"The prediction API is unavailable: {e}") from e
+            except PredictionError:
+                # The API answered: it is up, the inputs are wrong
+                breaker.record_success()
+                raise
+            else:
+                breaker.record_success()
+                return result, "api", self._record("api", start)
+        elif self.fallback is None:
+            raise PredictionError("The prediction API is unavailable")
+
+        result = getattr(self.fallback, endpoint)(payload if local_argument is None else local_argument)
+        return result, "local", self._record("local", start)
+
+    def _record(self, source, start):
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._counts[source] += 1
+            self._latencies[source].append(latency)
+        return latency
+
+    def predict(self, inputs):
+        """Returns the ``Prediction`` of ``inputs``, from the API or, when it is unavailable, in-process.
+
+        Raises PredictionError if the inputs are rejected, or if the API is
+        unavailable and there is no fallback.
+        """
+        result, source, latency = self._call(self.url, inputs, "predict")
+        return Prediction(result["price_range"], result.get("model_version"), source, latency)
+
+    def sensitivity(self, inputs, variations):
+        """Returns the ``/predict/sensitivity`` response for ``inputs`` and ``variations``, and its source.
+
+        ``variations`` is a list of dicts as in the API, e.g.
+        ``{"field": "epc", "values": ["A", "B"]}``. Errors are raised as by ``predict``.
+        """
+        result, source, _ = self._call(self.url + "/sensitivity", {"item": inputs, "variations": variations}, "sensitivity")
+        return result, source
+
+    def heatmap(self, profile):
+        """Returns the ``/heatmap/{profile}`` response, and its source.
+
+        Errors are raised as by ``predict``; a heatmap that is still being
+        built counts as the API being unavailable.
+        """
+        url = self.url.rsplit("/predict", 1)[0] + f"/heatmap/{profile}"
+        result, source, _ = self._call(url, None, "heatmap", profile)
+        return result, source
+
+    def stats(self):
+        """Request counts, breaker states per endpoint and client-side latency percentiles (ms) per source."""
+        with self._lock:
+            return {
+                **self._counts,
+                "breaker": {endpoint: breaker.state for endpoint, breaker in self.breakers.items()},
+                "breaker_opened": {endpoint: breaker.opened for endpoint, breaker in self.breakers.items()},
+                "latency_ms": {source: _percentiles(values) for source, values in self._latencies.items()},
+            }
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """Returns the client configured by the environment, shared by the whole process."""
+    return PredictionClient(fallback=LocalScorer() if LOCAL_FALLBACK else None)
@@ -0,0 +1,119 @@
+"""Static reference data of the app, loaded once per server process.
+
+Streamlit reruns a whole page on every widget interaction, for every
+session. Reading and parsing the JSON files and encoding the logo images
+on every rerun used to make up most of the server time of a rerun.
+``load_reference_data`` does it once, with ``st.cache_resource``. It checks
+that the files agree with each other and hands every session the same
+read-only ``ReferenceData``, with the options already sorted.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+import streamlit as st
+
+UNIQUES_PATH = 'streamlit/uniques.json'
+UNIQUES_FORMATTED_PATH = 'streamlit/uniques_formatted.json'
+LOCALITIES_PATH = 'streamlit/localities.json'
+PAGE_ICON_PATH = 'streamlit/images/Price_Real_Estate_Logo.png'
+LOGO_PATH = 'streamlit/images/Price_Real_Estate_Logo_small.png'
+
+# Fields selected by their formatted label, converted back to a value with
+# label.upper().replace(' ', '_') ('Not available' stands for 'MISSING')
+LABELLED_FIELDS = ('subproperty_type', 'equipped_kitchen', 'state_building', 'epc', 'heating_type')
+
+# Maximum values of the number inputs
+LIMIT_FIELDS = ('max_frontages', 'total_area_sqm', 'surface_land_sqm', 'nbr_bedrooms', 'terrace_sqm', 'garden_sqm')
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    uniques: Mapping[str, object]  # uniques.json, with tuples instead of lists
+    options: Mapping[str, Tuple[str, ...]]  # sorted labels of uniques_formatted.json
+    localities: Tuple[str, ...]  # sorted locality names
+    locality_zip_codes: Mapping[str, Tuple[int, ...]]  # sorted zip codes of each locality
+    house_subtypes: frozenset
+    page_icon: bytes  # PNG file, passed as is to st.set_page_config
+    logo_url: str  # data URL of the sidebar logo
+
+
+def _freeze(value):
+    """Returns a read-only copy of decoded JSON: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _validate(uniques, uniques_formatted, localities):
+    """Raises a ValueError if the JSON files are incomplete or disagree with each other."""
+    problems = []
+    for field in LABELLED_FIELDS:
+        labels = uniques_formatted.get(field)
+        if not labels:
+            problems.append(f"{UNIQUES_FORMATTED_PATH} has no {field} labels")
+            continue
+        values = set(uniques.get(field, ())) | {'NOT_AVAILABLE'}
+        unknown = [label for label in labels if label.upper().replace(' ', '_') not in values]
+        if unknown:
+            problems.append(f"{field} labels without a value in {UNIQUES_PATH}: {unknown}")
+    for field in LIMIT_FIELDS:
+        if not isinstance(uniques.get(field), (int, float)):
+            problems.append(f"{UNIQUES_PATH} has no numeric {field}")
+    if set(localities) != set(uniques.get('locality', ())):
+        problems.append(f"the localities of {LOCALITIES_PATH} and {UNIQUES_PATH} differ")
+    if not all(isinstance(zip_code, int) for zip_codes in localities.values() for zip_code in zip_codes):
+        problems.append(f"{LOCALITIES_PATH} has zip codes that are not integers")
+    if problems:
+        raise ValueError('Invalid reference data: ' + '; '.join(problems))
+
+
+@st.cache_resource(show_spinner=False)
+def load_reference_data() -> ReferenceData:
+    uniques = _load_json(UNIQUES_PATH)
+    uniques_formatted = _load_json(UNIQUES_FORMATTED_PATH)
+    localities = _load_json(LOCALITIES_PATH)
+    _validate(uniques, uniques_formatted, localities)
+
+    with open(PAGE_ICON_PATH, 'rb') as f:
+        page_icon = f.read()
+    with open(LOGO_PATH, 'rb') as f:
+        logo_url = 'data:image/png;base64,' + base64.b64encode(f.read()).decode()
+
+    return ReferenceData(
+        uniques=_freeze(uniques),
+        options=MappingProxyType({field: tuple(sorted(labels)) for field, labels in uniques_formatted.items()}),
+        localities=tuple(sorted(localities)),
+        locality_zip_codes=MappingProxyType(
+            {locality: tuple(sorted(zip_codes)) for locality, zip_codes in localities.items()}
+        ),
+        house_subtypes=frozenset(uniques['house_subtypes']),
+        page_icon=page_icon,
+        logo_url=logo_url,
+    )
+
+
+def add_logo(height=200):
+    """Adds the logo on top of the sidebar navigation, like streamlit_extras' add_logo."""
+    st.markdown(
+        f"""
+        <style>
+            [data-testid="stSidebarNav"] {{
+                background-image: url({load_reference_data().logo_url});
+                background-repeat: no-repeat;
+                padding-top: {height - 40}px;
+                background-position: 20px 20px;
+            }}
+        </style>
+        """,
+        unsafe_allow_html=True,
+    )
@@ -1,21 +1,27 @@
-import pandas as pd
+import os
+import sys
 
+# The zip code index and locator live in the API package, at the root of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-zipcodes = pd.read_csv('streamlit/zipcodes.csv')
-zip = zipcodes.drop(zipcodes.columns[0], axis=1).reindex()
+from api.geocoding import get_locator
+from api.zipcode_index import get_index
+
+
+def get_record(zipcode):
+    return get_index()[zipcode]
 
 def get_lat(zipcode):
-    lat = zipcodes[zipcodes['zip_code'] == zipcode]['latitude']
-    return lat.values[0]
+    return get_record(zipcode).latitude
 
 def get_long(zipcode):
-    long = zipcodes[zipcodes['zip_code'] == zipcode]['longitude']
-    return long.values[0]
+    return get_record(zipcode).longitude
 
 def get_province(zipcode):
-    province = zipcodes[zipcodes['zip_code'] == zipcode]['province']
-    return province.values[0]
+    return get_record(zipcode).province
 
 def get_region(zipcode):
-    region = zipcodes[zipcodes['zip_code'] == zipcode]['region']
-    return region.values[0]
+    return get_record(zipcode).region
+
+def get_nearest(lat, lon):
+    return get_locator().nearest(lat, lon)
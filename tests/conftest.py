@@ -0,0 +1,21 @@
+import math
+
+import pytest
+
+from api.bundle import ModelBundle
+from benchmarks.common import ARTIFACTS_PATH, make_items
+
+
+@pytest.fixture(scope="session")
+def bundle():
+    return ModelBundle.load(ARTIFACTS_PATH)
+
+
+@pytest.fixture(scope="session")
+def items():
+    """A handful of valid items, some with missing numbers to impute."""
+    items = make_items(12, seed=1)
+    for item in items[::3]:
+        item["surface_land_sqm"] = math.nan
+        item["nbr_frontages"] = math.nan
+    return items
@@ -0,0 +1,42 @@
+"""The NumPy ``FeatureAssembler`` against the pandas/scikit-learn preprocessing."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.features import UnknownCategoryError
+
+
+def test_rows_match_preprocessing(bundle, items):
+    for item in items:
+        expected = bundle.preprocess(pd.DataFrame([item]))
+        actual = bundle.assembler.assemble(item)
+
+        assert list(expected.columns) == bundle.assembler.feature_names
+        np.testing.assert_array_equal(actual, expected.to_numpy())
+        assert bundle.model.predict(actual).tobytes() == bundle.model.predict(expected).tobytes()
+
+
+def test_columns_match_rows(bundle, items):
+    columns = {feature: [item[feature] for item in items] for feature in items[0]}
+    matrix, errors = bundle.assembler.assemble_columns(columns, len(items))
+
+    assert errors == [None] * len(items)
+    np.testing.assert_array_equal(matrix, np.vstack([bundle.assembler.assemble(item) for item in items]))
+
+
+def test_unknown_category_is_rejected_by_both(bundle, items):
+    item = {**items[0], "epc": "not a label"}
+    with pytest.raises(ValueError):
+        bundle.preprocess(pd.DataFrame([item]))
+    with pytest.raises(UnknownCategoryError):
+        bundle.assembler.assemble(item)
+
+
+def test_unknown_category_is_a_row_error_in_columns(bundle, items):
+    rows = [items[0], {**items[1], "epc": "not a label"}, items[2]]
+    columns = {feature: [row[feature] for row in rows] for feature in rows[0]}
+    matrix, errors = bundle.assembler.assemble_columns(columns, len(rows))
+
+    assert isinstance(errors[1], UnknownCategoryError) and errors[0] is None and errors[2] is None
+    assert not matrix[1].any()
+    np.testing.assert_array_equal(matrix[2:], bundle.assembler.assemble(items[2]))
@@ -0,0 +1,31 @@
+"""The NumPy ``TreeEnsemble`` against ``XGBRegressor.predict``."""
+import numpy as np
+
+from api.tree_engine import TreeEnsemble
+
+
+def test_predictions_match_xgboost(bundle, items):
+    X = np.vstack([bundle.assembler.assemble(item) for item in items])
+    ensemble = TreeEnsemble.from_booster(bundle.model)
+
+    assert ensemble.predict(X).tobytes() == bundle.model.predict(X).tobytes()
+
+
+def test_missing_values_follow_the_default_direction(bundle, items):
+    X = np.vstack([bundle.assembler.assemble(item) for item in items])
+    X[::2, : X.shape[1] // 3] = np.nan
+    X[1::3, -5:] = np.nan
+    ensemble = TreeEnsemble.from_booster(bundle.model)
+
+    assert ensemble.predict(X).tobytes() == bundle.model.predict(X).tobytes()
+
+
+def test_chunks_match_single_pass(bundle, items, monkeypatch):
+    import api.tree_engine
+
+    X = np.vstack([bundle.assembler.assemble(item) for item in items])
+    ensemble = TreeEnsemble.from_booster(bundle.model)
+    expected = ensemble.predict(X)
+    monkeypatch.setattr(api.tree_engine, "CHUNK_SIZE", 5)
+
+    assert ensemble.predict(X).tobytes() == expected.tobytes()